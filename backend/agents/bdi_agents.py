@@ -2,15 +2,13 @@
 import os
 import asyncio
 import multiprocessing
+import threading
 import time
 from typing import Optional
 from spade.agent import Agent
 from spade.behaviour import CyclicBehaviour, OneShotBehaviour, PeriodicBehaviour
 from spade.message import Message
 from spade.template import Template
-import flwr as fl
-from backend.fl.client import IDSFlowerClient
-from backend.fl.server import IDSServerStrategy, get_eval_fn
 from slixmpp import ClientXMPP
 
 original_connect = ClientXMPP.connect
@@ -23,44 +21,97 @@ def patched_connect(self, address=None, **kwargs):
 
 ClientXMPP.connect = patched_connect
 from backend.utils.logger import setup_logger
+from backend.agents.resources import CpuBudget, apply_cpu_slot, describe_slot
 
 logger = setup_logger("MainProcess")
 
-from backend.ml.data import NSL_KDD_DataProcessor
-
 DATA_PATH = os.getenv("DATA_PATH", "/home/felipe/Desktop/anti/nsl-kdd")
-processor = NSL_KDD_DataProcessor(DATA_PATH)
-datasets = processor.get_datasets()
+# Rows per chunk for streaming ingestion of large captures; 0 loads files whole.
+DATA_CHUNKSIZE = int(os.getenv("DATA_CHUNKSIZE", "0"))
+
+FL_NUM_CLIENTS = int(os.getenv("FL_NUM_CLIENTS", "5"))
+# contiguous | iid | dirichlet | attack_family | size_skewed
+FL_PARTITION = os.getenv("FL_PARTITION", "contiguous")
+FL_PARTITION_SEED = int(os.getenv("FL_PARTITION_SEED", "42"))
+FL_PARTITION_ALPHA = float(os.getenv("FL_PARTITION_ALPHA", "0.5"))
+FL_PARTITION_SIGMA = float(os.getenv("FL_PARTITION_SIGMA", "1.0"))
+# Server-side aggregation for fedavg/fedprox: buffered (Flower default), mean, trimmed_mean, median.
+FL_AGGREGATOR = os.getenv("FL_AGGREGATOR", "buffered")
+
+# Splits the host's cores between the server evaluator and the clients so
+# co-located FL processes don't oversubscribe the CPU. FL_CPU_BUDGET=0 keeps
+# PyTorch's defaults; FL_PIN_CPUS=1 also pins each process to its cores.
+FL_CPU_BUDGET = os.getenv("FL_CPU_BUDGET", "1") == "1"
+cpu_budget = CpuBudget(FL_NUM_CLIENTS, pin=os.getenv("FL_PIN_CPUS", "0") == "1") if FL_CPU_BUDGET else None
+
+# Spawned FL processes re-import this module, and the API imports it too, so
+# nothing heavy (torch, flwr, sklearn, the dataset) is loaded at import time.
+# The parent materializes the preprocessed arrays once, on first use, and hands
+# children the cache entry path; they map it copy-on-write and share the pages.
+_dataset_handle: Optional[str] = None
+_partition_file: Optional[str] = None
+_dataset_lock = threading.RLock()
+
+def get_dataset_handle() -> str:
+    global _dataset_handle
+    with _dataset_lock:
+        if _dataset_handle is None:
+            from backend.ml.data import NSL_KDD_DataProcessor
+            processor = NSL_KDD_DataProcessor(DATA_PATH)
+            _dataset_handle = processor.materialize(chunksize=DATA_CHUNKSIZE or None)
+            logger.info(f"Datasets materialized at {_dataset_handle}")
+    return _dataset_handle
+
+def get_partition_file() -> str:
+    """
+    Per-client index arrays for the training set, computed once by the parent
+    and persisted next to the dataset cache entry.
+    """
+    global _partition_file
+    with _dataset_lock:
+        if _partition_file is None:
+            from backend.ml.partition import ensure_partitions
+
+            def attack_names():
+                from backend.ml.data import NSL_KDD_DataProcessor
+                return NSL_KDD_DataProcessor(DATA_PATH).load_attack_names("train")
+
+            _partition_file = ensure_partitions(get_dataset_handle(), FL_PARTITION, FL_NUM_CLIENTS, FL_PARTITION_SEED,
+                                                alpha=FL_PARTITION_ALPHA, sigma=FL_PARTITION_SIGMA,
+                                                attack_names_fn=attack_names)
+            logger.info(f"Partitions ({FL_PARTITION}, {FL_NUM_CLIENTS} clients): {_partition_file}")
+    return _partition_file
+
+def datasets_ready() -> bool:
+    return _dataset_handle is not None
 
 try:
     multiprocessing.set_start_method('spawn')
 except RuntimeError:
     pass
 
-def run_flower_client(cid, server_address):
+def run_flower_client(cid, server_address, dataset_handle, partition_file, cpu_slot=None):
     proc_logger = setup_logger(f"ClientProcess-{cid}", log_prefix=f"Client-{cid}")
     try:
-        full_train_data = datasets["train"]
-        X, y = full_train_data
-        total_len = len(X)
-        cid_int = int(cid)
-        num_clients = 5
-        part_size = total_len // num_clients
-        start = (cid_int - 1) * part_size
-        end = start + part_size
-        
-        if cid_int == num_clients:
-            end = total_len
+        apply_cpu_slot(cpu_slot)
+        proc_logger.info(f"[{cid}] CPU budget: {describe_slot(cpu_slot)}")
+
+        import flwr as fl
+        from backend.fl.client import IDSFlowerClient
+        from backend.ml.data import attach_datasets
+        from backend.ml.partition import load_partition
 
-        my_data = (X[start:end], y[start:end])
+        datasets = attach_datasets(dataset_handle)
+        train_indices = load_partition(partition_file, cid)
         
-        proc_logger.info(f"[{cid}] Training Data Partition: {len(my_data[0])} samples.")
+        proc_logger.info(f"[{cid}] Training Data Partition: {len(train_indices)} samples.")
 
         import torch
         device = "cuda" if torch.cuda.is_available() else "cpu"
         proc_logger.info(f"[{cid}] Using Device: {device}")
         
-        client = IDSFlowerClient(cid=cid, train_data=my_data, test_data=datasets["test"], device=device)
+        client = IDSFlowerClient(cid=cid, train_data=datasets["train"], test_data=datasets["test"], device=device,
+                                 train_indices=train_indices, logger=proc_logger)
         
         fl.client.start_client(
             server_address=server_address,
@@ -98,11 +149,11 @@ class IDSClientAgent(Agent):
             if msg:
                 logger.info(f"[{self.agent.cid}] Received message: {msg.body}")
                 if msg.body == "START_FL":
-                    self.agent.start_fl()
+                    await self.agent.start_fl()
                 elif msg.body == "STOP_FL":
                     self.agent.stop_fl()
 
-    def start_fl(self):
+    async def start_fl(self):
         logger.info(f"[{self.cid}] Starting Federated Learning Client...")
         
         if self.fl_client_process and self.fl_client_process.is_alive():
@@ -113,7 +164,12 @@ class IDSClientAgent(Agent):
         self.is_training = True
         self.stop_event.clear()
         
-        self.fl_client_process = multiprocessing.Process(target=run_flower_client, args=(self.cid, self.server_address))
+        cpu_slot = cpu_budget.client_slot(self.cid) if cpu_budget else None
+        logger.info(f"[{self.cid}] CPU budget for FL process: {describe_slot(cpu_slot)}")
+        # Preprocessing and partitioning can take minutes on a cold cache; keep them off the agent's event loop.
+        dataset_handle = await asyncio.to_thread(get_dataset_handle)
+        partition_file = await asyncio.to_thread(get_partition_file)
+        self.fl_client_process = multiprocessing.Process(target=run_flower_client, args=(self.cid, self.server_address, dataset_handle, partition_file, cpu_slot))
         self.fl_client_process.start()
 
     def stop_fl(self):
@@ -122,70 +178,117 @@ class IDSClientAgent(Agent):
         self.stop_event.set()
 
 
-def run_flower_server(port, algorithm="fedprox"):
+def run_flower_server(port, algorithm="fedprox", dataset_handle=None, cpu_slot=None):
     srv_logger = setup_logger("ServerProcess", log_prefix="Server")
     try:
         srv_logger.info(f"Flower Server process starting in PID: {os.getpid()}")
+        apply_cpu_slot(cpu_slot)
+        srv_logger.info(f"CPU budget: {describe_slot(cpu_slot)}")
         import torch
+        import flwr as fl
+        from backend.fl.server import get_eval_fn
+        from backend.ml.data import attach_datasets
+
+        datasets = attach_datasets(dataset_handle)
         
         device = "cuda" if torch.cuda.is_available() else "cpu"
         srv_logger.info(f"[Server] Global Evaluation Device: {device}, Algorithm: {algorithm}")
         
-        from backend.fl.server import get_fit_config_fn
-        fit_config_fn = get_fit_config_fn(algorithm)
-        
-        eval_fn = get_eval_fn(datasets["test"], device=device, algorithm=algorithm)
-        
-        import glob
-        import re
-        from backend.ml.model import IDSModel
+        from backend.ml.model import DEFAULT_MODEL, build_model, infer_model_name
+        model_name = DEFAULT_MODEL
+        srv_logger.info(f"[Server] Model architecture: {model_name}")
+
+        from backend.fl.server import get_fit_config_fn, get_initial_parameters
         from backend.fl.server import IDSFedProxStrategy, IDSServerStrategy
+        from backend.fl.fedbuff import AsyncBufferedServer, IDSFedBuffStrategy
+        from backend.ml.checkpoints import CHECKPOINT_ROOT, CheckpointManager
         
+        checkpoints = CheckpointManager(os.path.join(CHECKPOINT_ROOT, algorithm))
         initial_parameters = None
-        ckpts = glob.glob(f"backend/checkpoints/{algorithm}/model_round_*.pth")
+        round_offset = 0
+        latest = checkpoints.latest()
         
-        if ckpts:
-            latest_ckpt = max(ckpts, key=os.path.getctime)
-            srv_logger.info(f"Found checkpoint: {latest_ckpt}")
+        if latest is not None:
+            srv_logger.info(f"Found checkpoint: {checkpoints.path(latest)}")
             try:
-                match = re.search(r"model_round_(\d+).pth", latest_ckpt)
-                if match:
-                    srv_logger.info(f"Resuming from Round {match.group(1)}...")
-
-                model = IDSModel().to(device)
-                model.load_state_dict(torch.load(latest_ckpt, map_location=device))
-                weights = [val.cpu().numpy() for _, val in model.state_dict().items()]
-                initial_parameters = fl.common.ndarrays_to_parameters(weights)
-                srv_logger.info("Checkpoint loaded successfully.")
+                state = checkpoints.load(latest, map_location=device)
+                ckpt_model = infer_model_name(state)
+                if ckpt_model != model_name:
+                    raise ValueError(f"checkpoint is a '{ckpt_model}' model, this run uses '{model_name}'")
+                from backend.ml.parameters import FlatParameters
+                layout = FlatParameters(build_model(model_name))
+                layout.load_state_dict(state)
+                initial_parameters = fl.common.ndarrays_to_parameters(layout.to_ndarrays())
+                round_offset = latest["round"]
+                srv_logger.info(f"Checkpoint loaded successfully. Resuming from Round {round_offset}...")
             except Exception as e:
                 srv_logger.error(f"Failed to load checkpoint: {e}")
         
-        if algorithm == "fedprox":
-            strategy = IDSFedProxStrategy(
+        if initial_parameters is None:
+            initial_parameters = get_initial_parameters(model_name)
+        
+        fit_config_fn = get_fit_config_fn(algorithm, model_name, round_offset=round_offset)
+        
+        # Filled by the strategy (bytes on the wire per round), saved by eval_fn with the metrics.
+        round_stats = {}
+        num_rounds = 50
+        eval_fn = get_eval_fn(datasets["test"], device=device, algorithm=algorithm, model_name=model_name,
+                              round_stats=round_stats, num_rounds=num_rounds,
+                              checkpoints=checkpoints, round_offset=round_offset)
+        
+        server = None
+        # FL_AGGREGATOR != "buffered" folds fedavg/fedprox updates into a fixed-size aggregate as they arrive.
+        fedavg_cls, fedprox_cls, streaming_kwargs = IDSServerStrategy, IDSFedProxStrategy, {}
+        streaming = algorithm != "fedbuff" and FL_AGGREGATOR != "buffered"
+        if streaming:
+            from backend.fl.streaming import IDSStreamingFedProxStrategy, IDSStreamingStrategy, StreamingServer
+            fedavg_cls, fedprox_cls = IDSStreamingStrategy, IDSStreamingFedProxStrategy
+            streaming_kwargs = {"aggregator": FL_AGGREGATOR}
+            srv_logger.info(f"[Server] Streaming aggregation: {FL_AGGREGATOR}")
+        if algorithm == "fedbuff":
+            strategy = IDSFedBuffStrategy(
+                eval_fn=eval_fn,
+                fit_config_fn=fit_config_fn,
+                initial_parameters=initial_parameters,
+                round_stats=round_stats,
+                min_available_clients=3,
+            )
+            server = AsyncBufferedServer(client_manager=fl.server.SimpleClientManager(), strategy=strategy,
+                                         min_clients=3)
+        elif algorithm == "fedprox":
+            strategy = fedprox_cls(
                 eval_fn=eval_fn,
                 fit_config_fn=fit_config_fn,
                 initial_parameters=initial_parameters,
+                round_stats=round_stats,
                 proximal_mu=0.01,
                 min_fit_clients=3,
                 min_evaluate_clients=3,
                 min_available_clients=3,
+                **streaming_kwargs,
             )
         else:
-            strategy = IDSServerStrategy(
+            strategy = fedavg_cls(
                 eval_fn=eval_fn,
                 fit_config_fn=fit_config_fn,
                 initial_parameters=initial_parameters,
+                round_stats=round_stats,
                 min_fit_clients=3,
                 min_evaluate_clients=3,
                 min_available_clients=3,
+                **streaming_kwargs,
             )
+        if streaming:
+            server = StreamingServer(client_manager=fl.server.SimpleClientManager(), strategy=strategy)
             
         fl.server.start_server(
             server_address=f"0.0.0.0:{port}",
-            config=fl.server.ServerConfig(num_rounds=50),
+            config=fl.server.ServerConfig(num_rounds=num_rounds),
+            server=server,
             strategy=strategy,
         )
-        srv_logger.info("Flower Server stopped.")
+        srv_logger.info("Flower Server stopped. Waiting for pending evaluations...")
+        eval_fn.flush()
         
         try:
             from backend.analytics.plotter import generate_graphs
@@ -215,7 +318,7 @@ class IDSServerAgent(Agent):
             if msg:
                 logger.info(f"[Server Agent] Received XMPP Message: {msg.body}")
                 if msg.body == "START_SERVER":
-                    self.agent.start_server()
+                    await self.agent.start_server()
                 elif msg.body == "START_FL":
                     pass
 
@@ -233,7 +336,7 @@ class IDSServerAgent(Agent):
 
         self.add_behaviour(Broadcaster())
 
-    def start_server(self, algorithm="fedprox"):
+    async def start_server(self, algorithm="fedprox"):
         logger.info(f"Starting Flower Server with algorithm: {algorithm}...")
         
         if self.fl_server_process and self.fl_server_process.is_alive():
@@ -247,7 +350,9 @@ class IDSServerAgent(Agent):
         except FileNotFoundError:
             pass 
             
-        self.fl_server_process = multiprocessing.Process(target=run_flower_server, args=(self.port, algorithm))
+        cpu_slot = cpu_budget.server_slot() if cpu_budget else None
+        dataset_handle = await asyncio.to_thread(get_dataset_handle)
+        self.fl_server_process = multiprocessing.Process(target=run_flower_server, args=(self.port, algorithm, dataset_handle, cpu_slot))
         self.fl_server_process.start()
 
     async def stop(self):
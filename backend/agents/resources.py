@@ -0,0 +1,69 @@
+import os
+from typing import Dict, List, Optional
+
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+
+def available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuBudget:
+    """
+    Divides the host's cores among co-located FL processes.
+
+    Slot 0 is the Flower server (global evaluation), slots 1..num_clients
+    are the clients, matching their cid. Each slot gets an equal, contiguous
+    share of cores; when there are more processes than cores, slots wrap
+    around and get a single core each.
+    """
+
+    def __init__(self, num_clients: int, pin: bool = False, cpus: Optional[List[int]] = None):
+        self.num_clients = num_clients
+        self.pin = pin
+        self.cpus = cpus if cpus is not None else available_cpus()
+
+    def slot(self, index: int) -> Dict:
+        n_slots = self.num_clients + 1
+        per_slot = max(1, len(self.cpus) // n_slots)
+        start = (index * per_slot) % len(self.cpus)
+        cpus = [self.cpus[(start + i) % len(self.cpus)] for i in range(per_slot)]
+        return {"slot": index, "threads": per_slot, "cpus": cpus if self.pin else None}
+
+    def server_slot(self) -> Dict:
+        return self.slot(0)
+
+    def client_slot(self, cid: str) -> Dict:
+        return self.slot(int(cid))
+
+
+def apply_cpu_slot(slot: Optional[Dict]) -> Optional[Dict]:
+    """
+    Applies a slot inside the FL process. Must run before torch is imported so
+    the OpenMP/MKL pools are created at the right size.
+    """
+    if not slot:
+        return None
+    threads = str(slot["threads"])
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = threads
+    if slot.get("cpus") and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, slot["cpus"])
+
+    import torch
+    torch.set_num_threads(slot["threads"])
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already set, or parallel work already started in this process.
+        pass
+    return slot
+
+
+def describe_slot(slot: Optional[Dict]) -> str:
+    if not slot:
+        return "default threads"
+    pinned = f", pinned to {slot['cpus']}" if slot.get("cpus") else ""
+    return f"{slot['threads']} threads{pinned}"
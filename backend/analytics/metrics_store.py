@@ -0,0 +1,93 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+METRICS_DIR = os.getenv("METRICS_DIR", ".")
+
+
+class MetricsStore:
+    """
+    Append-only per-algorithm metrics log, one JSON object per line
+    (metrics_<algorithm>.jsonl).
+
+    Each append is a single write() on an O_APPEND descriptor, so a reader
+    never sees half an entry as long as it only consumes lines ending in a
+    newline. A resumed run that re-evaluates round r supersedes every
+    earlier entry with round >= r; readers apply that rule, so nothing is
+    ever rewritten in place. reset() starts a fresh experiment by atomically
+    replacing the file with an empty one.
+    """
+
+    def __init__(self, algorithm: str, root: str = METRICS_DIR):
+        self.algorithm = algorithm
+        self.path = os.path.join(root, f"metrics_{algorithm}.jsonl")
+        # Pre-JSONL format, still read when no .jsonl exists.
+        self.legacy_path = os.path.join(root, f"metrics_{algorithm}.json")
+        self._inode: Optional[int] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) or os.path.exists(self.legacy_path)
+
+    def append(self, entry: Dict):
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def reset(self):
+        tmp = f"{self.path}.tmp"
+        open(tmp, "w").close()
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def merge(entries: List[Dict], new: List[Dict]) -> List[Dict]:
+        """Applies appended entries to a view (kept sorted by round): each one supersedes rounds >= its own."""
+        entries = list(entries)
+        for entry in new:
+            while entries and entries[-1]["round"] >= entry["round"]:
+                entries.pop()
+            entries.append(entry)
+        return entries
+
+    def read_from(self, offset: int = 0) -> Tuple[List[Dict], int, bool]:
+        """
+        Complete entries after byte offset -> (entries, next offset, reset).
+        reset is True when a new experiment replaced the file since the last
+        call on this store, in which case entries are read from the beginning.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return [], 0, offset > 0
+        size = st.st_size
+        reset = size < offset or (self._inode is not None and st.st_ino != self._inode)
+        self._inode = st.st_ino
+        if reset:
+            offset = 0
+        if size == offset:
+            return [], offset, reset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read(size - offset)
+        end = chunk.rfind(b"\n") + 1
+        entries = [json.loads(line) for line in chunk[:end].splitlines() if line.strip()]
+        return entries, offset + end, reset
+
+    def read(self, since_round: Optional[int] = None) -> List[Dict]:
+        """Current view of the experiment (superseded rounds removed), optionally only rounds > since_round."""
+        if os.path.exists(self.path):
+            entries, _, _ = self.read_from(0)
+            entries = self.merge([], entries)
+        elif os.path.exists(self.legacy_path):
+            with open(self.legacy_path) as f:
+                entries = json.load(f)
+        else:
+            entries = []
+        if since_round is not None:
+            entries = [e for e in entries if e["round"] > since_round]
+        return entries
+
+    def files(self) -> List[str]:
+        return [p for p in (self.path, self.legacy_path) if os.path.exists(p)]
@@ -1,4 +1,3 @@
-import json
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
@@ -6,8 +5,10 @@ import os
 import shutil
 import numpy as np
 
+from backend.analytics.metrics_store import MetricsStore
+
 def generate_graphs(base_output_dir: str):
-    """Generates rigorous plots comparing FedAvg vs FedProx."""
+    """Generates rigorous plots comparing FedAvg vs FedProx (and FedBuff, when present)."""
     
     if os.path.exists(base_output_dir):
         shutil.rmtree(base_output_dir)
@@ -16,26 +17,29 @@ def generate_graphs(base_output_dir: str):
     dirs = {
         "fedavg": os.path.join(base_output_dir, "fedavg"),
         "fedprox": os.path.join(base_output_dir, "fedprox"),
+        "fedbuff": os.path.join(base_output_dir, "fedbuff"),
         "comparison": os.path.join(base_output_dir, "comparison")
     }
 
     files = [
-        ("metrics_fedavg.json", "FedAvg", "tab:red", "--"),
-        ("metrics_fedprox.json", "FedProx", "tab:blue", "-")
+        ("fedavg", "FedAvg", "tab:red", "--"),
+        ("fedprox", "FedProx", "tab:blue", "-"),
+        ("fedbuff", "FedBuff", "tab:green", ":")
     ]
     
     dfs = []
-    for fname, label, color, style in files:
-        if os.path.exists(fname):
+    for algo_key, label, color, style in files:
+        store = MetricsStore(algo_key)
+        fname = store.path
+        if store.exists():
             try:
-                with open(fname, "r") as f:
-                    data = json.load(f)
+                data = store.read()
                 if data:
                     df = pd.DataFrame(data)
                     df['Experiment'] = label
                     df['Color'] = color
                     df['Style'] = style
-                    df['algo_key'] = "fedavg" if "FedAvg" in label else "fedprox"
+                    df['algo_key'] = algo_key
                     dfs.append(df)
                 else:
                      print(f"[Plotter] {fname} is empty.")
@@ -106,7 +110,7 @@ def generate_graphs(base_output_dir: str):
              plt.savefig(os.path.join(comp_dir, f"compare_{metric}.png"), dpi=300)
              plt.close()
     else:
-        print("[Plotter] Skipping comparison graphs: Need data from both FedAvg and FedProx.")
+        print("[Plotter] Skipping comparison graphs: Need data from at least two algorithms.")
 
     print("[Plotter] All graphs generated successfully.")
 
@@ -3,12 +3,11 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 import os
 import uvicorn
 from contextlib import asynccontextmanager
 import json
-import aiofiles
 import multiprocessing
 import shutil
 from datetime import datetime
@@ -18,7 +17,8 @@ try:
 except RuntimeError:
     pass 
 
-from backend.agents.bdi_agents import IDSClientAgent, IDSServerAgent
+from backend.agents.bdi_agents import IDSClientAgent, IDSServerAgent, get_dataset_handle, datasets_ready
+from backend.analytics.metrics_store import MetricsStore
 from backend.utils.logger import setup_logger, LOG_FILE
 
 logger = setup_logger("API")
@@ -82,6 +82,8 @@ async def lifespan(app: FastAPI):
     yield
     print("System Shutting down...")
     await manager.stop_all()
+    for service in list(inference_services.values()):
+        await service.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -95,14 +97,28 @@ app.add_middleware(
 class StatusResponse(BaseModel):
     status: str
     active_agents: int
+    datasets_ready: bool
 
 @app.get("/api/status", response_model=StatusResponse)
 async def get_status():
     return {
         "status": "running",
-        "active_agents": len(manager.clients)
+        "active_agents": len(manager.clients),
+        "datasets_ready": datasets_ready()
     }
 
+async def warm_up_datasets() -> str:
+    """Preprocesses NSL-KDD (or maps the cache) off the event loop."""
+    return await asyncio.to_thread(get_dataset_handle)
+
+@app.post("/api/warmup")
+async def warmup():
+    try:
+        handle = await warm_up_datasets()
+    except Exception as e:
+        return {"error": str(e)}
+    return {"message": "Datasets ready", "path": handle}
+
 @app.post("/api/start_infrastructure")
 async def start_infrastructure():
     if not manager.server_agent:
@@ -117,6 +133,7 @@ async def add_agent():
     return {"message": f"Agent {cid} Added", "cid": cid}
 
 CURRENT_ALGORITHM = "fedprox"
+ALGORITHMS = ["fedavg", "fedprox", "fedbuff"]
 
 class AlgorithmUpdate(BaseModel):
     algorithm: str
@@ -128,7 +145,7 @@ async def get_algorithm():
 @app.post("/api/set_algorithm")
 async def set_algorithm(update: AlgorithmUpdate):
     global CURRENT_ALGORITHM
-    if update.algorithm not in ["fedavg", "fedprox"]:
+    if update.algorithm not in ALGORITHMS:
         return {"error": "Invalid algorithm"}
         
     if CURRENT_ALGORITHM != update.algorithm:
@@ -137,14 +154,16 @@ async def set_algorithm(update: AlgorithmUpdate):
         
         if manager.server_agent:
             print("[API] Restarting Server with new algorithm...")
-            manager.server_agent.start_server(algorithm=CURRENT_ALGORITHM)
+            await warm_up_datasets()
+            await manager.server_agent.start_server(algorithm=CURRENT_ALGORITHM)
             
     return {"message": f"Algorithm set to {CURRENT_ALGORITHM}", "algorithm": CURRENT_ALGORITHM}
 
 @app.post("/api/start_federation")
 async def start_federation():
+    await warm_up_datasets()
     if manager.server_agent:
-        manager.server_agent.start_server(algorithm=CURRENT_ALGORITHM) 
+        await manager.server_agent.start_server(algorithm=CURRENT_ALGORITHM)
         
     await asyncio.sleep(5)
         
@@ -178,11 +197,10 @@ async def reset_system():
         except Exception as e:
             print(f"[Reset] Error archiving plots: {e}")
 
-    for algo in ["fedavg", "fedprox"]:
-        fname = f"metrics_{algo}.json"
-        if os.path.exists(fname):
+    for algo in ALGORITHMS:
+        for fname in MetricsStore(algo).files():
             try:
-                shutil.move(fname, f"{backup_dir}/{fname}")
+                shutil.move(fname, f"{backup_dir}/{os.path.basename(fname)}")
                 print(f"[Reset] {fname} archived.")
             except Exception as e:
                 print(f"[Reset] Error archiving {fname}: {e}")
@@ -190,10 +208,111 @@ async def reset_system():
     return {"message": f"System Reset Complete. Previous experiment data archived to: {backup_dir}"}
 
 
+class PredictRequest(BaseModel):
+    records: List[Any]
+    algorithm: Optional[str] = None
+
+# One persistent service per algorithm, so traffic for different algorithms never
+# closes another algorithm's batcher; a reload swaps in a new service and drains the old one.
+inference_services: Dict[str, Any] = {}
+inference_lock = asyncio.Lock()
+
+async def get_inference_service(algorithm: Optional[str] = None, reload: bool = False):
+    """Loads the latest checkpoint into a persistent predictor on first use (or on reload)."""
+    algorithm = algorithm or CURRENT_ALGORITHM
+    previous = None
+    async with inference_lock:
+        service = inference_services.get(algorithm)
+        if service is None or reload:
+            from backend.ml.data import load_pipeline
+            from backend.ml.inference import IDSPredictor, InferenceService
+
+            handle = await warm_up_datasets()
+            predictor = await asyncio.to_thread(lambda: IDSPredictor.from_latest(algorithm, load_pipeline(handle)))
+            previous = service
+            service = InferenceService(algorithm, predictor)
+            inference_services[algorithm] = service
+            print(f"[API] Inference model for {algorithm} loaded from {predictor.checkpoint_path}")
+    if previous is not None:
+        # Requests already queued on the old service still complete before it shuts down.
+        await previous.close()
+    return service
+
+async def run_prediction(records: List[Any], algorithm: Optional[str] = None) -> Dict:
+    from backend.ml.inference import BatcherClosed
+
+    try:
+        service = await get_inference_service(algorithm)
+        try:
+            predictions = await service.predict(records)
+        except BatcherClosed:
+            # Replaced by a reload between lookup and submit: use the new service.
+            service = await get_inference_service(algorithm)
+            predictions = await service.predict(records)
+    except asyncio.QueueFull:
+        return {"error": "Inference queue is full, retry later"}
+    except Exception as e:
+        return {"error": str(e)}
+    return {"algorithm": service.algorithm, "predictions": predictions}
+
+@app.post("/api/predict")
+async def predict(request: PredictRequest):
+    return await run_prediction(request.records, request.algorithm)
+
+@app.get("/api/predict/stats")
+async def predict_stats(algorithm: Optional[str] = None):
+    service = inference_services.get(algorithm or CURRENT_ALGORITHM)
+    if service is None:
+        return {"error": "Inference model not loaded"}
+    return service.stats()
+
+@app.post("/api/predict/reload")
+async def predict_reload(algorithm: Optional[str] = None):
+    try:
+        service = await get_inference_service(algorithm, reload=True)
+    except Exception as e:
+        return {"error": str(e)}
+    return {"message": "Inference model reloaded", "checkpoint": service.predictor.checkpoint_path}
+
+@app.websocket("/ws/predict")
+async def predict_stream(websocket: WebSocket):
+    """
+    Streaming scoring: each message is {"id": ..., "records": [...]} (or a bare
+    list of records); replies carry the same id. Messages are scored
+    concurrently so they can share micro-batches.
+    """
+    await websocket.accept()
+    pending = set()
+
+    async def score(message):
+        if isinstance(message, dict):
+            msg_id, records = message.get("id"), message.get("records", [])
+        else:
+            msg_id, records = None, message
+        result = await run_prediction(records)
+        result["id"] = msg_id
+        await websocket.send_text(json.dumps(result))
+
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            task = asyncio.create_task(score(message))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Predict WS Error: {e}")
+    finally:
+        for task in pending:
+            task.cancel()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await ws_manager.connect(websocket)
-    last_mtime_metrics = 0
+    # The full history is sent once ("metrics_update"), then only new entries ("metrics_append").
+    metrics_store = None
+    metrics_offset = 0
 
     f_log = None
     if os.path.exists(LOG_FILE):
@@ -202,19 +321,23 @@ async def websocket_endpoint(websocket: WebSocket):
     
     try:
         while True:
-            METRICS_FILE = f"metrics_{CURRENT_ALGORITHM}.json"
-            if os.path.exists(METRICS_FILE):
-                mtime = os.path.getmtime(METRICS_FILE)
-                if mtime > last_mtime_metrics:
-                    last_mtime_metrics = mtime
-                    try:
-                        async with aiofiles.open(METRICS_FILE, "r") as f:
-                            content = await f.read()
-                            data = json.loads(content)
-                            payload = json.dumps({"type": "metrics_update", "data": data})
-                            await websocket.send_text(payload)
-                    except Exception as e:
-                        print(f"Error reading metrics: {e}")
+            try:
+                if metrics_store is None or metrics_store.algorithm != CURRENT_ALGORITHM:
+                    metrics_store = MetricsStore(CURRENT_ALGORITHM)
+                    entries, metrics_offset, _ = await asyncio.to_thread(metrics_store.read_from, 0)
+                    snapshot = MetricsStore.merge([], entries) if entries else await asyncio.to_thread(metrics_store.read)
+                    if metrics_store.exists():
+                        await websocket.send_text(json.dumps({"type": "metrics_update", "data": snapshot}))
+                else:
+                    entries, metrics_offset, reset = await asyncio.to_thread(metrics_store.read_from, metrics_offset)
+                    if reset:
+                        await websocket.send_text(json.dumps({"type": "metrics_update", "data": MetricsStore.merge([], entries)}))
+                    elif entries:
+                        await websocket.send_text(json.dumps({"type": "metrics_append", "data": entries}))
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                print(f"Error reading metrics: {e}")
 
             if f_log:
                 line = f_log.readline()
@@ -247,13 +370,21 @@ app.mount("/plots", StaticFiles(directory="backend/plots"), name="plots")
 
 @app.get("/api/analytics/status")
 async def get_analytics_status():
-    status = {
-        "fedavg": os.path.exists("metrics_fedavg.json"),
-        "fedprox": os.path.exists("metrics_fedprox.json"),
-        "comparison": os.path.exists("metrics_fedavg.json") and os.path.exists("metrics_fedprox.json")
-    }
+    status = {algo: MetricsStore(algo).exists() for algo in ALGORITHMS}
+    status["comparison"] = sum(status.values()) > 1
     return status
 
+@app.get("/api/metrics")
+async def get_metrics(algorithm: Optional[str] = None, since_round: Optional[int] = None):
+    algorithm = algorithm or CURRENT_ALGORITHM
+    if algorithm not in ALGORITHMS:
+        return {"error": "Invalid algorithm"}
+    try:
+        entries = await asyncio.to_thread(MetricsStore(algorithm).read, since_round)
+        return {"algorithm": algorithm, "metrics": entries}
+    except Exception as e:
+        return {"error": str(e)}
+
 @app.post("/api/generate_plots")
 async def trigger_plots():
     from backend.analytics.plotter import generate_graphs
@@ -0,0 +1,56 @@
+"""
+Per-epoch wall time and accuracy of backend.ml.model.train/test in eager
+float32 versus the opt-in acceleration modes (torch.compile, bfloat16
+autocast, both), on one client's share of the NSL-KDD train set.
+
+    python -m backend.benchmarks.acceleration --epochs 3 --partition 5
+
+Compilation happens on the first step, so the first epoch of a compiled
+run is reported separately from the steady-state epochs.
+"""
+import argparse
+
+import torch
+
+from backend.benchmarks.common import load_datasets, print_table
+from backend.ml.acceleration import Accelerator, bf16_supported
+from backend.ml.data import get_dataloader
+from backend.ml.model import IDSModel, test, train
+
+
+def main():
+    parser = argparse.ArgumentParser(description="torch.compile / bfloat16 training benchmark")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--partition", type=int, default=5, help="Use 1/N of the train set, like one client")
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+
+    datasets = load_datasets()
+    X, y = datasets["train"]
+    indices = torch.arange(0, len(X) // args.partition)
+    test_loader = get_dataloader(datasets["test"], batch_size=1024, shuffle=False)
+    print(f"[Benchmark] bfloat16 autocast supported on {args.device}: {bf16_supported(args.device)}")
+
+    variants = [("eager fp32", set()), ("bf16", {"bf16"}), ("compile", {"compile"}), ("compile+bf16", {"compile", "bf16"})]
+    rows = []
+    for name, modes in variants:
+        torch.manual_seed(0)
+        model = IDSModel().to(args.device)
+        accelerator = Accelerator(model, modes, device=args.device) if modes else None
+        loader = get_dataloader((X, y), batch_size=args.batch_size, shuffle=True, indices=indices)
+
+        first = train(model, loader, epochs=1, device=args.device, accelerator=accelerator)
+        rest = train(model, loader, epochs=args.epochs - 1, device=args.device, accelerator=accelerator) \
+            if args.epochs > 1 else first
+        metrics = test(model, test_loader, device=args.device, accelerator=accelerator)
+
+        active = "+".join(sorted(accelerator.active_modes)) if accelerator else "-"
+        rows.append([name, active or "-", f"{first['epoch_time']:.2f}", f"{rest['epoch_time']:.2f}",
+                     f"{rest['samples_per_sec']:,.0f}", f"{metrics['accuracy']:.4f}", f"{metrics['f1']:.4f}"])
+
+    print_table(rows, ["mode", "active", "s/epoch (1st)", "s/epoch", "samples/s", "test acc", "test f1"])
+
+
+if __name__ == "__main__":
+    main()
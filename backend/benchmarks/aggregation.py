@@ -0,0 +1,74 @@
+"""
+Server aggregation time and peak memory for N client updates of a
+registered model: Flower's aggregate() over the full list of updates
+(what FedAvg/FedProx do after the round) versus the streaming aggregates
+of backend/fl/streaming.py, which fold updates one at a time.
+
+    python -m backend.benchmarks.aggregation --clients 10,100,500 --model mlp
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from flwr.server.strategy.aggregate import aggregate
+
+from backend.benchmarks.common import print_table
+from backend.fl.streaming import MEDIAN_SKETCH, TRIM_K, make_aggregate
+from backend.ml.model import build_model
+from backend.ml.parameters import FlatParameters
+
+
+def client_update(global_weights, rng):
+    return [(w + rng.normal(0, 0.01, w.shape)).astype(w.dtype) for w in global_weights]
+
+
+def run_buffered(global_weights, num_clients, seed):
+    rng = np.random.default_rng(seed)
+    results = [(client_update(global_weights, rng), int(rng.integers(100, 1000))) for _ in range(num_clients)]
+    return aggregate(results)
+
+
+def run_streaming(name, global_weights, num_clients, seed, trim_k, sketch_size):
+    rng = np.random.default_rng(seed)
+    acc = make_aggregate(name, sum(w.size for w in global_weights), trim_k, sketch_size)
+    for _ in range(num_clients):
+        update = client_update(global_weights, rng)
+        acc.add(np.concatenate([w.astype(np.float64).ravel() for w in update]), float(rng.integers(100, 1000)))
+    return acc.result()
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming aggregation benchmark")
+    parser.add_argument("--clients", type=str, default="10,100,500")
+    parser.add_argument("--model", type=str, default="mlp")
+    parser.add_argument("--trim-k", type=int, default=TRIM_K)
+    parser.add_argument("--sketch-size", type=int, default=MEDIAN_SKETCH)
+    args = parser.parse_args()
+
+    global_weights = [w.copy() for w in FlatParameters(build_model(args.model)).to_ndarrays()]
+    rows = []
+    for num_clients in [int(n) for n in args.clients.split(",")]:
+        modes = [("buffered", lambda: run_buffered(global_weights, num_clients, 0))]
+        for name in ("mean", "trimmed_mean", "median"):
+            modes.append((name, lambda name=name: run_streaming(name, global_weights, num_clients, 0,
+                                                                args.trim_k, args.sketch_size)))
+        for name, fn in modes:
+            elapsed, peak = measure(fn)
+            rows.append([num_clients, name, f"{elapsed:.3f}", f"{peak / 2 ** 20:.1f}"])
+
+    print_table(rows, ["clients", "aggregator", "seconds", "peak MiB"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Samples/sec of the TensorDataset + DataLoader path versus TensorBatchIterator.
+
+    python -m backend.benchmarks.batching --batch-sizes 32 256 --epochs 1
+"""
+import argparse
+
+import torch
+
+from backend.benchmarks.common import load_datasets, print_table, timed
+from backend.ml.data import get_dataloader, get_torch_dataloader
+from backend.ml.model import IDSModel, train
+
+LOADERS = {
+    "DataLoader": get_torch_dataloader,
+    "TensorBatchIterator": get_dataloader,
+}
+
+
+def iterate(loader):
+    for data, target in loader:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch iterator benchmark")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 256])
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--partition", type=int, default=5, help="Use 1/N of the train set, like one client")
+    parser.add_argument("--skip-train", action="store_true", help="Only time data iteration")
+    args = parser.parse_args()
+
+    datasets = load_datasets()
+    X, y = datasets["train"]
+    indices = torch.arange(0, len(X) // args.partition)
+    n = len(indices)
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        for name, make_loader in LOADERS.items():
+            loader = make_loader((X, y), batch_size=batch_size, shuffle=True, indices=indices)
+            iter_s = timed(lambda: iterate(loader), repeats=3)
+            row = [name, batch_size, f"{n / iter_s:,.0f}"]
+
+            if not args.skip_train:
+                torch.manual_seed(0)
+                model = IDSModel()
+                train_s = timed(lambda: train(model, loader, epochs=args.epochs))
+                row.append(f"{n * args.epochs / train_s:,.0f}")
+            rows.append(row)
+
+    headers = ["loader", "batch", "iter samples/s"] + ([] if args.skip_train else ["train samples/s"])
+    print_table(rows, headers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import time
+from typing import Callable, Dict, Tuple
+
+import torch
+
+DATA_PATH = os.getenv("DATA_PATH", "nsl-kdd")
+
+
+def load_datasets(data_path: str = DATA_PATH, synthetic_rows: int = 125973) -> Dict[str, Tuple[torch.Tensor, torch.Tensor]]:
+    """
+    NSL-KDD tensors through the regular cache, or random data with the same
+    shape when the dataset is not available, so benchmarks always run.
+    """
+    from backend.ml.data import NSL_KDD_DataProcessor
+
+    processor = NSL_KDD_DataProcessor(data_path)
+    if os.path.exists(processor.source_path("train")) and os.path.exists(processor.source_path("test")):
+        return processor.get_datasets()
+
+    print(f"[Benchmark] NSL-KDD not found under {data_path}, using {synthetic_rows} synthetic rows")
+    gen = torch.Generator().manual_seed(0)
+    n_test = synthetic_rows // 6
+    return {
+        "train": (torch.rand(synthetic_rows, 41, generator=gen), torch.randint(0, 2, (synthetic_rows,), generator=gen)),
+        "test": (torch.rand(n_test, 41, generator=gen), torch.randint(0, 2, (n_test,), generator=gen)),
+    }
+
+
+def timed(fn: Callable, repeats: int = 1) -> float:
+    """Best wall time of fn() over repeats, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def print_table(rows, headers):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for r in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(r, widths)))
@@ -0,0 +1,73 @@
+"""
+Bytes on the wire and accuracy of each update codec in
+backend.fl.compression, over a few in-process FedAvg rounds: every client
+trains on its contiguous share, encodes its update against the global
+weights (with error feedback), and the server decodes and averages.
+
+    python -m backend.benchmarks.compression --rounds 5 --clients 5 --model cnn
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from backend.benchmarks.common import load_datasets, print_table
+from backend.fl.compression import CODECS, UpdateEncoder, decode_update, payload_bytes
+from backend.ml.data import get_dataloader
+from backend.ml.model import build_model, test, train
+
+
+def get_weights(model):
+    return [val.cpu().numpy() for _, val in model.state_dict().items()]
+
+
+def set_weights(model, weights):
+    model.load_state_dict({k: torch.tensor(v) for k, v in zip(model.state_dict().keys(), weights)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update compression benchmark")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--model", type=str, default="cnn")
+    parser.add_argument("--topk-ratio", type=float, default=0.01)
+    parser.add_argument("--codecs", type=str, default=",".join(CODECS))
+    args = parser.parse_args()
+
+    datasets = load_datasets()
+    X, y = datasets["train"]
+    shard = len(X) // args.clients
+    loaders = [get_dataloader((X, y), batch_size=32, shuffle=True, indices=torch.arange(c * shard, (c + 1) * shard))
+               for c in range(args.clients)]
+    test_loader = get_dataloader(datasets["test"], batch_size=1024, shuffle=False)
+
+    rows = []
+    for codec in args.codecs.split(","):
+        torch.manual_seed(0)
+        model = build_model(args.model)
+        global_weights = get_weights(model)
+        full_bytes = payload_bytes(global_weights)
+        encoders = [UpdateEncoder() for _ in range(args.clients)]
+        upload = 0
+        for _ in range(args.rounds):
+            decoded = []
+            for loader, encoder in zip(loaders, encoders):
+                set_weights(model, global_weights)
+                train(model, loader, epochs=args.epochs)
+                payload = encoder.encode(global_weights, get_weights(model), codec, topk_ratio=args.topk_ratio)
+                upload += payload_bytes(payload)
+                decoded.append(decode_update(global_weights, payload, codec))
+            global_weights = [np.mean(np.stack(layers), axis=0).astype(layers[0].dtype) for layers in zip(*decoded)]
+
+        set_weights(model, global_weights)
+        metrics = test(model, test_loader)
+        per_client = upload / (args.rounds * args.clients)
+        rows.append([codec, f"{per_client / 1024:,.1f}", f"{full_bytes / per_client:.1f}x",
+                     f"{metrics['accuracy']:.4f}", f"{metrics['f1']:.4f}"])
+
+    print_table(rows, ["codec", "KiB/client/round", "reduction", "test acc", "test f1"])
+
+
+if __name__ == "__main__":
+    main()
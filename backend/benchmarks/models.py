@@ -0,0 +1,61 @@
+"""
+Size, per-round communication, aggregation cost and accuracy of every
+architecture in backend.ml.model.MODEL_REGISTRY, trained on one client's
+share of the NSL-KDD train set and evaluated on KDDTest+.
+
+    python -m backend.benchmarks.models --epochs 3 --clients 5
+
+bytes/round is what one client uploads (and downloads) per round: every
+state_dict array in float32. agg ms is a FedAvg weighted average of
+--clients such updates.
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from backend.benchmarks.common import load_datasets, print_table, timed
+from backend.ml.data import get_dataloader
+from backend.ml.model import MODEL_REGISTRY, build_model, model_summary, test, train
+
+
+def fedavg(updates, weights):
+    total = sum(weights)
+    return [sum(w * layer for w, layer in zip(weights, layers)) / total for layers in zip(*updates)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model architecture benchmark")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=5, help="Train on 1/N of the data and aggregate N updates")
+    parser.add_argument("--models", type=str, default=",".join(MODEL_REGISTRY))
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    datasets = load_datasets()
+    X, y = datasets["train"]
+    indices = torch.arange(0, len(X) // args.clients)
+    test_loader = get_dataloader(datasets["test"], batch_size=1024, shuffle=False)
+
+    rows = []
+    for name in args.models.split(","):
+        torch.manual_seed(0)
+        model = build_model(name).to(args.device)
+        summary = model_summary(model)
+        loader = get_dataloader((X, y), batch_size=args.batch_size, shuffle=True, indices=indices)
+        fit = train(model, loader, epochs=args.epochs, device=args.device)
+        metrics = test(model, test_loader, device=args.device)
+
+        update = [val.cpu().numpy() for _, val in model.state_dict().items()]
+        updates = [[layer.copy() for layer in update] for _ in range(args.clients)]
+        agg_s = timed(lambda: fedavg(updates, [len(indices)] * args.clients), repeats=5)
+
+        rows.append([name, f"{summary['params']:,}", f"{summary['bytes_per_round'] / 1024:,.1f}",
+                     f"{agg_s * 1000:.2f}", f"{fit['epoch_time']:.2f}", f"{metrics['accuracy']:.4f}", f"{metrics['f1']:.4f}"])
+
+    print_table(rows, ["model", "params", "KiB/round", "agg ms", "s/epoch", "test acc", "test f1"])
+
+
+if __name__ == "__main__":
+    main()
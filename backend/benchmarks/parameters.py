@@ -0,0 +1,52 @@
+"""
+Cost of moving weights between a model and Flower NDArrays: the original
+per-tensor path (OrderedDict of torch.tensor copies + load_state_dict, and
+.cpu().numpy() per tensor) versus FlatParameters views.
+
+    python -m backend.benchmarks.parameters --model cnn
+"""
+import argparse
+from collections import OrderedDict
+
+import torch
+
+from backend.benchmarks.common import print_table, timed
+from backend.ml.model import MODEL_REGISTRY, build_model
+from backend.ml.parameters import FlatParameters
+
+
+def legacy_get(model):
+    return [val.cpu().numpy() for _, val in model.state_dict().items()]
+
+
+def legacy_set(model, parameters):
+    params_dict = zip(model.state_dict().keys(), parameters)
+    state_dict = OrderedDict({k: torch.tensor(v) for k, v in params_dict})
+    model.load_state_dict(state_dict, strict=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter exchange benchmark")
+    parser.add_argument("--models", type=str, default=",".join(MODEL_REGISTRY))
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    rows = []
+    for name in args.models.split(","):
+        legacy = build_model(name).to(args.device)
+        weights = [w.copy() for w in legacy_get(legacy)]
+        get_s = timed(lambda: legacy_get(legacy), repeats=args.repeats)
+        set_s = timed(lambda: legacy_set(legacy, weights), repeats=args.repeats)
+        rows.append([name, "state_dict", f"{get_s * 1000:.3f}", f"{set_s * 1000:.3f}"])
+
+        layout = FlatParameters(build_model(name).to(args.device))
+        get_s = timed(layout.to_ndarrays, repeats=args.repeats)
+        set_s = timed(lambda: layout.from_ndarrays(weights), repeats=args.repeats)
+        rows.append([name, "flat", f"{get_s * 1000:.3f}", f"{set_s * 1000:.3f}"])
+
+    print_table(rows, ["model", "path", "get ms", "set ms"])
+
+
+if __name__ == "__main__":
+    main()
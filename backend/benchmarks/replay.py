@@ -0,0 +1,151 @@
+"""
+Streaming replay of KDDTest+/KDDTest-21 through the full detection path:
+raw record -> PreprocessingPipeline -> IDSModel checkpoint -> verdict.
+
+    python -m backend.benchmarks.replay --file KDDTest+.txt --rate 0 --window 5000
+    python -m backend.benchmarks.replay --file KDDTest-21.txt --rate 2000 --algorithm fedavg
+
+--rate 0 replays as fast as possible; otherwise records "arrive" on a fixed
+schedule and latency is measured from each record's arrival to its verdict.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from backend.ml.metrics import metrics_from_confusion
+
+
+class WindowStats:
+    def __init__(self):
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+        self.latencies: List[np.ndarray] = []
+        self.records = 0
+        self.start = time.perf_counter()
+
+    def add(self, y_true: np.ndarray, y_pred: np.ndarray, latencies_s: np.ndarray):
+        self.confusion += np.bincount(y_true * 2 + y_pred, minlength=4).reshape(2, 2)
+        self.latencies.append(latencies_s)
+        self.records += len(y_true)
+
+    def summary(self) -> Dict:
+        elapsed = time.perf_counter() - self.start
+        lat = np.concatenate(self.latencies) * 1000.0 if self.latencies else np.zeros(1)
+        metrics = metrics_from_confusion(self.confusion)
+        return {
+            "records": self.records,
+            "seconds": elapsed,
+            "records_per_sec": self.records / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p95_ms": float(np.percentile(lat, 95)),
+            "p99_ms": float(np.percentile(lat, 99)),
+            **metrics,
+        }
+
+
+def print_window(label: str, s: Dict):
+    print(f"[Replay] {label:<8} {s['records']:>7} rec  {s['records_per_sec']:>10,.0f} rec/s  "
+          f"p50={s['p50_ms']:.3f}ms p95={s['p95_ms']:.3f}ms p99={s['p99_ms']:.3f}ms  "
+          f"acc={s['accuracy']:.4f} prec={s['precision']:.4f} rec={s['recall']:.4f} f1={s['f1']:.4f}", flush=True)
+
+
+def replay(path: str, predictor, rate: float = 0.0, batch_size: int = 64, window: int = 5000,
+           limit: int = 0) -> Dict:
+    from backend.ml.data import iter_raw_chunks
+
+    pipeline = predictor.pipeline
+    windows = []
+    current = WindowStats()
+    overall = WindowStats()
+    sent = 0
+    t0 = time.perf_counter()
+
+    chunks = iter(iter_raw_chunks(path, chunksize=batch_size))
+    while True:
+        batch_start = time.perf_counter()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            break
+        if limit:
+            chunk = chunk.iloc[:max(limit - sent, 0)]
+            if chunk.empty:
+                break
+        n = len(chunk)
+
+        if rate > 0:
+            arrivals = t0 + (sent + np.arange(n)) / rate
+            # Wait for the last record of the batch to "arrive" before scoring it.
+            delay = arrivals[-1] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            arrivals = np.full(n, batch_start)
+
+        features = pipeline.transform(chunk)
+        y_pred, _ = predictor.predict(features)
+        done = time.perf_counter()
+        y_true = pipeline.transform_labels(chunk)
+
+        latencies = done - arrivals
+        current.add(y_true, y_pred, latencies)
+        overall.add(y_true, y_pred, latencies)
+        sent += n
+
+        if current.records >= window:
+            windows.append(current.summary())
+            print_window(f"w{len(windows)}", windows[-1])
+            current = WindowStats()
+
+    if current.records:
+        windows.append(current.summary())
+        print_window(f"w{len(windows)}", windows[-1])
+
+    total = overall.summary()
+    print_window("overall", total)
+    return {"file": path, "rate": rate, "batch_size": batch_size, "windows": windows, "overall": total}
+
+
+def main():
+    from backend.ml.data import NSL_KDD_DataProcessor, load_pipeline
+    from backend.ml.inference import IDSPredictor, latest_checkpoint
+
+    parser = argparse.ArgumentParser(description="Streaming detection replay benchmark")
+    parser.add_argument("--file", type=str, default="KDDTest+.txt", help="KDDTest+.txt or KDDTest-21.txt")
+    parser.add_argument("--data-path", type=str, default=os.getenv("DATA_PATH", "nsl-kdd"))
+    parser.add_argument("--algorithm", type=str, default="fedprox")
+    parser.add_argument("--checkpoint", type=str, default=None, help=".pth state dict or exported .pt; defaults to the latest")
+    parser.add_argument("--rate", type=float, default=0.0, help="Records/sec offered; 0 = as fast as possible")
+    parser.add_argument("--batch-size", type=int, default=64, help="Records scored per model call")
+    parser.add_argument("--window", type=int, default=5000, help="Records per reporting window")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--json", type=str, default=None, help="Write the full report here")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    checkpoint = args.checkpoint or latest_checkpoint(args.algorithm)
+    if checkpoint is None:
+        raise SystemExit(f"No checkpoint found for {args.algorithm}")
+
+    # The transform is the pipeline fitted on KDDTrain+, shared with training.
+    handle = NSL_KDD_DataProcessor(args.data_path).materialize()
+    predictor = IDSPredictor(checkpoint, load_pipeline(handle))
+    print(f"[Replay] {args.file} through {checkpoint} (rate={'max' if args.rate <= 0 else args.rate}, batch={args.batch_size})")
+
+    report = replay(os.path.join(args.data_path, args.file), predictor, rate=args.rate,
+                    batch_size=args.batch_size, window=args.window, limit=args.limit)
+    report["checkpoint"] = checkpoint
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
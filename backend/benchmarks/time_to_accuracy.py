@@ -0,0 +1,54 @@
+"""
+Wall-clock time and rounds to a target global accuracy, from the metrics
+the server appends (metrics_<algorithm>.jsonl, one entry per evaluation
+with a timestamp). Run a federation per algorithm first,
+e.g. via /api/set_algorithm, then:
+
+    python -m backend.benchmarks.time_to_accuracy --target 0.78 fedavg fedprox fedbuff
+
+Time is measured from the round-0 evaluation (initial model) to the first
+evaluation at or above the target. For fedbuff a "round" is one buffered
+aggregation of FL_FEDBUFF_K updates, not a full cohort.
+"""
+import argparse
+
+from backend.analytics.metrics_store import MetricsStore
+from backend.benchmarks.common import print_table
+
+
+def time_to_accuracy(entries, target: float):
+    entries = sorted((e for e in entries if "timestamp" in e), key=lambda e: e["round"])
+    if not entries:
+        return None
+    start = entries[0]["timestamp"]
+    for e in entries:
+        if e["accuracy"] >= target:
+            return {"seconds": e["timestamp"] - start, "round": e["round"]}
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-accuracy comparison between FL algorithms")
+    parser.add_argument("algorithms", nargs="*", default=["fedavg", "fedprox", "fedbuff"])
+    parser.add_argument("--target", type=float, default=0.78, help="Global test accuracy to reach")
+    parser.add_argument("--metrics-dir", type=str, default=".")
+    args = parser.parse_args()
+
+    rows = []
+    for algo in args.algorithms:
+        store = MetricsStore(algo, root=args.metrics_dir)
+        if not store.exists():
+            print(f"[Benchmark] {store.path} not found, skipping {algo}")
+            continue
+        entries = store.read()
+        reached = time_to_accuracy(entries, args.target)
+        best = max(e["accuracy"] for e in entries) if entries else 0.0
+        rows.append([algo, f"{reached['seconds']:.1f}" if reached else "-", reached["round"] if reached else "-",
+                     len(entries) - 1, f"{best:.4f}"])
+
+    if rows:
+        print_table(rows, ["algorithm", f"s to {args.target:.2f}", "rounds", "rounds run", "best acc"])
+
+
+if __name__ == "__main__":
+    main()
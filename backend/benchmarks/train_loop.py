@@ -0,0 +1,53 @@
+"""
+Per-epoch wall time of backend.ml.model.train with on-device metric
+accumulation versus forcing a host sync on every batch (log_interval=1),
+which is what the per-batch loss.item()/.sum().item() calls used to cost,
+and of a FedProx epoch (flat-buffer ProximalTerm) against plain FedAvg.
+
+    python -m backend.benchmarks.train_loop --epochs 3
+"""
+import argparse
+
+import torch
+
+from backend.benchmarks.common import load_datasets, print_table
+from backend.ml.data import get_dataloader
+from backend.ml.model import IDSModel, ProximalTerm, train
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training loop sync benchmark")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--partition", type=int, default=5, help="Use 1/N of the train set, like one client")
+    parser.add_argument("--mu", type=float, default=0.01)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    X, y = load_datasets()["train"]
+    indices = torch.arange(0, len(X) // args.partition)
+
+    def sync_every_batch(info):
+        if info["event"] == "batch":
+            info["loss"].item()
+
+    modes = [
+        ("sync every batch", sync_every_batch, 1, False),
+        ("sync per epoch", None, 0, False),
+        ("fedprox, sync per epoch", None, 0, True),
+    ]
+    rows = []
+    for name, callback, interval, fedprox in modes:
+        torch.manual_seed(0)
+        model = IDSModel().to(args.device)
+        proximal = ProximalTerm(model, args.mu) if fedprox else None
+        loader = get_dataloader((X, y), batch_size=args.batch_size, shuffle=True, indices=indices)
+        metrics = train(model, loader, epochs=args.epochs, device=args.device,
+                        progress_callback=callback, log_interval=interval, proximal=proximal)
+        rows.append([name, f"{metrics['epoch_time']:.2f}", f"{metrics['samples_per_sec']:,.0f}", f"{metrics['accuracy']:.4f}"])
+
+    print_table(rows, ["mode", "s/epoch", "samples/s", "train acc"])
+
+
+if __name__ == "__main__":
+    main()
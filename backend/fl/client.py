@@ -1,55 +1,109 @@
 
-from collections import OrderedDict
+import os
 from typing import List, Tuple, Dict
 import flwr as fl
 import torch
 import numpy as np
-from backend.ml.model import IDSModel, train, test
+from backend.ml.model import DEFAULT_MODEL, ProximalTerm, build_model, train, test, format_progress
 from backend.ml.data import get_dataloader
+from backend.ml.parameters import FlatParameters
+from backend.ml.acceleration import Accelerator, default_accel, parse_accel
+from backend.fl.compression import DEFAULT_TOPK_RATIO, UpdateEncoder, payload_bytes
 
 class IDSFlowerClient(fl.client.NumPyClient):
-    def __init__(self, cid: str, train_data, test_data, device="cpu"):
+    def __init__(self, cid: str, train_data, test_data, device="cpu", train_indices=None,
+                 batch_size: int = int(os.getenv("FL_BATCH_SIZE", "32")),
+                 eval_batch_size: int = int(os.getenv("FL_EVAL_BATCH_SIZE", "1024")), logger=None,
+                 model_name: str = DEFAULT_MODEL):
         self.cid = cid
-        self.model = IDSModel()
+        self.logger = logger
         self.device = device
-        self.train_loader = get_dataloader(train_data, batch_size=32, shuffle=True)
-        self.test_loader = get_dataloader(test_data, batch_size=32, shuffle=False)
+        self.model_name = model_name
+        self.model = build_model(model_name).to(device)
+        self.layout = FlatParameters(self.model)
+        self.train_data = train_data
+        self.train_indices = train_indices
+        self.train_loader = get_dataloader(train_data, batch_size=batch_size, shuffle=True, indices=train_indices)
+        self.test_loader = get_dataloader(test_data, batch_size=eval_batch_size, shuffle=False)
         self.local_epochs = 3
+        self.log_interval = int(os.getenv("FL_LOG_INTERVAL", "0"))
+        self.accelerator = None
+        self.encoder = UpdateEncoder()
+
+    def _set_model(self, config):
+        """Switches architecture when the server selects a different one in the config."""
+        model_name = config.get("model", self.model_name)
+        if model_name != self.model_name:
+            print(f"[Client {self.cid}] Switching model {self.model_name} -> {model_name}", flush=True)
+            self.model = build_model(model_name).to(self.device)
+            self.layout = FlatParameters(self.model)
+            self.model_name = model_name
+            self.accelerator = None
+            self.encoder.reset()
+
+    def _get_accelerator(self, config):
+        """Built once per process (compilation is reused across rounds) unless the modes change."""
+        modes = parse_accel(config["accel"]) if "accel" in config else default_accel()
+        if not modes:
+            self.accelerator = None
+        elif self.accelerator is None or self.accelerator.modes != modes:
+            self.accelerator = Accelerator(self.model, modes, device=self.device,
+                                           log=lambda msg: print(f"[Client {self.cid}] {msg}", flush=True))
+        return self.accelerator
+
+    def _progress(self, info):
+        print(f"[Client {self.cid}] {format_progress(info)}", flush=True)
 
     def get_parameters(self, config) -> List[np.ndarray]:
-        return [val.cpu().numpy() for _, val in self.model.state_dict().items()]
+        # Views of the live weights; Flower serializes them before the next fit.
+        return self.layout.to_ndarrays()
 
     def set_parameters(self, parameters: List[np.ndarray]):
-        params_dict = zip(self.model.state_dict().keys(), parameters)
-        state_dict = OrderedDict({k: torch.tensor(v) for k, v in params_dict})
-        self.model.load_state_dict(state_dict, strict=True)
+        self.layout.from_ndarrays(parameters)
 
     def fit(self, parameters, config) -> Tuple[List[np.ndarray], int, Dict]:
         print(f"[Client {self.cid}] Starting Fit...", flush=True)
+        self._set_model(config)
         self.set_parameters(parameters)
         
-        import copy
-        global_model = copy.deepcopy(self.model)
-        
         server_round = int(config.get("server_round", 1))
         lr = 0.001 * (0.9 ** ((server_round - 1) // 10))
         
         mu = float(config.get("mu", 0.01))
+        # Snapshot of the just-received global weights, taken before training moves them.
+        proximal = ProximalTerm(self.model, mu) if mu > 0.0 else None
+
+        batch_size = int(config.get("batch_size", self.train_loader.batch_size))
+        if batch_size != self.train_loader.batch_size:
+            self.train_loader = get_dataloader(self.train_data, batch_size=batch_size, shuffle=True, indices=self.train_indices)
         
         print(f"[Client {self.cid}] Round {server_round}: LR={lr:.6f}, Mu={mu}", flush=True)
 
-        metrics = train(self.model, self.train_loader, epochs=self.local_epochs, lr=lr, device=self.device, global_model=global_model, mu=mu)
-        print(f"[Client {self.cid}] Training finished. Loss: {metrics['loss']:.4f}, Accuracy: {metrics['accuracy']:.4f}", flush=True)
+        log_interval = int(config.get("log_interval", self.log_interval))
+        metrics = train(self.model, self.train_loader, epochs=self.local_epochs, lr=lr, device=self.device, proximal=proximal,
+                        progress_callback=self._progress, log_interval=log_interval,
+                        accelerator=self._get_accelerator(config))
+        print(f"[Client {self.cid}] Training finished. Loss: {metrics['loss']:.4f}, Accuracy: {metrics['accuracy']:.4f}, "
+              f"{metrics['samples_per_sec']:.0f} samples/s", flush=True)
+        if self.logger is not None:
+            self.logger.info(f"[{self.cid}] Round {server_round} throughput: {metrics['samples_per_sec']:.0f} samples/s, "
+                             f"{metrics['epoch_time']:.2f}s/epoch on {torch.get_num_threads()} threads")
         
-        return self.get_parameters(config={}), len(self.train_loader.dataset), {"loss": metrics["loss"], "accuracy": metrics["accuracy"]}
+        codec = str(config.get("compression", "none"))
+        update = self.encoder.encode(parameters, self.get_parameters(config={}), codec,
+                                     topk_ratio=float(config.get("topk_ratio", DEFAULT_TOPK_RATIO)))
+        return update, self.train_loader.num_samples, {"loss": metrics["loss"], "accuracy": metrics["accuracy"],
+                                                       "samples_per_sec": metrics["samples_per_sec"],
+                                                       "compression": codec, "update_bytes": payload_bytes(update)}
 
     def evaluate(self, parameters, config) -> Tuple[float, int, Dict]:
         print(f"[Client {self.cid}] Starting Evaluate...", flush=True)
+        self._set_model(config)
         self.set_parameters(parameters)
         
-        metrics = test(self.model, self.test_loader, device=self.device)
+        metrics = test(self.model, self.test_loader, device=self.device, accelerator=self._get_accelerator(config))
         print(f"[Client {self.cid}] Evaluation. Loss: {metrics['loss']:.4f}, Accuracy: {metrics['accuracy']:.4f}", flush=True)
         
-        return float(metrics["loss"]), len(self.test_loader.dataset), {"accuracy": float(metrics["accuracy"])}
+        return float(metrics["loss"]), self.test_loader.num_samples, {"accuracy": float(metrics["accuracy"])}
 
 import numpy as np
@@ -0,0 +1,176 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Update codecs, selected with the fit config key "compression" (env FL_COMPRESSION):
+#   none  full float32 weights (the original protocol)
+#   delta float32 difference from the global weights received this round
+#   fp16  delta cast to float16
+#   int8  delta quantized per layer to int8 with a float32 scale
+#   topk  largest |delta| entries per layer ("topk_ratio", env FL_TOPK_RATIO) as int32 index + float16 value
+CODECS = ("none", "delta", "fp16", "int8", "topk")
+DEFAULT_CODEC = os.getenv("FL_COMPRESSION", "none")
+DEFAULT_TOPK_RATIO = float(os.getenv("FL_TOPK_RATIO", "0.01"))
+
+
+def check_codec(codec: str) -> str:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression '{codec}', expected one of {list(CODECS)}")
+    return codec
+
+
+def payload_bytes(arrays: List[np.ndarray]) -> int:
+    return int(sum(a.nbytes for a in arrays))
+
+
+def _is_float(array: np.ndarray) -> bool:
+    return np.issubdtype(array.dtype, np.floating)
+
+
+def _encode_layer(delta: np.ndarray, codec: str, topk_ratio: float) -> Tuple[List[np.ndarray], np.ndarray]:
+    """Returns the arrays to send for one float layer and the delta the server will reconstruct."""
+    if codec == "delta":
+        return [delta], delta
+    if codec == "fp16":
+        sent = delta.astype(np.float16)
+        return [sent], sent.astype(np.float32)
+    if codec == "int8":
+        peak = float(np.abs(delta).max()) if delta.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        q = np.clip(np.rint(delta / scale), -127, 127).astype(np.int8)
+        return [q, np.array([scale], dtype=np.float32)], q.astype(np.float32) * scale
+    # topk
+    flat = delta.reshape(-1)
+    k = max(1, int(np.ceil(flat.size * topk_ratio)))
+    if k >= flat.size:
+        idx = np.arange(flat.size, dtype=np.int32)
+    else:
+        idx = np.argpartition(np.abs(flat), flat.size - k)[flat.size - k:].astype(np.int32)
+    values = flat[idx].astype(np.float16)
+    decoded = np.zeros_like(flat)
+    decoded[idx] = values.astype(np.float32)
+    return [idx, values], decoded.reshape(delta.shape)
+
+
+def _arrays_per_layer(codec: str) -> int:
+    return 2 if codec in ("int8", "topk") else 1
+
+
+class UpdateEncoder:
+    """
+    Client-side encoder. Keeps one float32 residual per layer for error
+    feedback: whatever a lossy codec drops this round is added back to the
+    next round's delta, so nothing is lost permanently.
+    """
+
+    def __init__(self, error_feedback: bool = True):
+        self.error_feedback = error_feedback
+        self.residuals: Optional[List[np.ndarray]] = None
+
+    def reset(self):
+        self.residuals = None
+
+    def encode(self, global_weights: List[np.ndarray], local_weights: List[np.ndarray],
+               codec: str = DEFAULT_CODEC, topk_ratio: float = DEFAULT_TOPK_RATIO) -> List[np.ndarray]:
+        check_codec(codec)
+        if codec == "none":
+            return local_weights
+
+        lossy = codec in ("fp16", "int8", "topk") and self.error_feedback
+        if self.residuals is not None and [r.shape for r in self.residuals] != [w.shape for w in local_weights]:
+            self.residuals = None
+        if lossy and self.residuals is None:
+            self.residuals = [np.zeros(w.shape, dtype=np.float32) for w in local_weights]
+
+        payload: List[np.ndarray] = []
+        for i, (g, w) in enumerate(zip(global_weights, local_weights)):
+            if not _is_float(w):
+                # Integer buffers (BatchNorm num_batches_tracked) go as-is.
+                payload.append(w)
+                continue
+            delta = w.astype(np.float32) - g.astype(np.float32)
+            if lossy:
+                delta += self.residuals[i]
+            sent, decoded = _encode_layer(delta, codec, topk_ratio)
+            if lossy:
+                self.residuals[i] = delta - decoded
+            payload.extend(sent)
+        return payload
+
+
+def decode_update(global_weights: List[np.ndarray], payload: List[np.ndarray], codec: str) -> List[np.ndarray]:
+    """Server-side inverse of UpdateEncoder.encode: full weights for aggregation."""
+    check_codec(codec)
+    if codec == "none":
+        return payload
+
+    weights: List[np.ndarray] = []
+    pos = 0
+    for g in global_weights:
+        if not _is_float(g):
+            weights.append(payload[pos])
+            pos += 1
+            continue
+        parts = payload[pos:pos + _arrays_per_layer(codec)]
+        pos += len(parts)
+        if codec == "int8":
+            delta = parts[0].astype(np.float32) * parts[1][0]
+        elif codec == "topk":
+            delta = np.zeros(g.size, dtype=np.float32)
+            delta[parts[0]] = parts[1].astype(np.float32)
+            delta = delta.reshape(g.shape)
+        else:
+            delta = parts[0].astype(np.float32)
+        weights.append((g.astype(np.float32) + delta).astype(g.dtype))
+    if pos != len(payload):
+        raise ValueError(f"Malformed '{codec}' update: {len(payload)} arrays, {pos} expected")
+    return weights
+
+
+class CompressedUpdatesMixin:
+    """
+    Strategy mixin (put before FedAvg/FedProx in the bases): remembers the
+    global weights sent in configure_fit, decodes every client's update
+    against them before the regular aggregation, and records per-round
+    bytes-on-wire in round_stats, keyed by round, for the evaluation function.
+    """
+
+    def __init__(self, *args, round_stats: Optional[Dict[int, Dict]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_stats = round_stats if round_stats is not None else {}
+        self._round_global: Dict[int, List[np.ndarray]] = {}
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        import flwr as fl
+
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        self._round_global = {server_round: fl.common.parameters_to_ndarrays(parameters)}
+        download = sum(len(t) for t in parameters.tensors)
+        self.round_stats[server_round] = {"bytes_down": download * len(instructions)}
+        return instructions
+
+    def aggregate_fit(self, server_round, results, failures):
+        import flwr as fl
+
+        global_weights = self._round_global.get(server_round)
+        upload = 0
+        codec = "none"
+        decoded = []
+        for proxy, fit_res in results:
+            upload += sum(len(t) for t in fit_res.parameters.tensors)
+            codec = str(fit_res.metrics.get("compression", "none"))
+            if codec != "none":
+                if global_weights is None:
+                    raise RuntimeError(f"Round {server_round}: no global weights to decode '{codec}' updates against")
+                weights = decode_update(global_weights, fl.common.parameters_to_ndarrays(fit_res.parameters), codec)
+                fit_res.parameters = fl.common.ndarrays_to_parameters(weights)
+            decoded.append((proxy, fit_res))
+
+        stats = self.round_stats.setdefault(server_round, {})
+        stats.update({"compression": codec, "bytes_up": upload,
+                      "bytes_per_client": upload // len(results) if results else 0})
+        print(f"[Server Round {server_round}] Received {upload / 1024:.0f} KiB of '{codec}' updates "
+              f"from {len(results)} clients", flush=True)
+        self._round_global.pop(server_round, None)
+        return super().aggregate_fit(server_round, decoded, failures)
@@ -0,0 +1,98 @@
+import os
+import threading
+import traceback
+from collections import deque
+from typing import Any, Callable, Optional
+
+import torch
+
+# Server-side evaluation knobs (env), read by backend.fl.server.get_eval_fn:
+#   FL_EVAL_BACKGROUND  "1" (default) evaluates and checkpoints on a worker thread; "0" inline
+#   FL_EVALUATE_EVERY   evaluate every N rounds (round 0 and the last round always run)
+#   FL_EVAL_SUBSAMPLE   evaluate intermediate rounds on this many fixed random test rows (0 = all)
+#   FL_EVAL_QUEUE       pending background jobs (each holds a copy of the weights), default 1
+#   FL_EVAL_BACKPRESSURE  "drop" (default) replaces the oldest droppable pending round; "block" stalls the round
+EVAL_QUEUE = int(os.getenv("FL_EVAL_QUEUE", "1"))
+EVAL_BACKPRESSURE = os.getenv("FL_EVAL_BACKPRESSURE", "drop")
+
+
+class EvaluationWorker:
+    """
+    One background thread draining a bounded FIFO of evaluation/bookkeeping
+    jobs, so the Flower round loop only pays for enqueueing the weights. Jobs
+    run in submission order; errors are logged and do not stop the worker.
+
+    When max_pending jobs are already waiting, policy "drop" discards the
+    oldest droppable one (the newest round is what matters) and "block"
+    makes submit() wait; jobs submitted with droppable=False are never
+    discarded, submit() waits for room instead.
+    """
+
+    def __init__(self, name: str = "fl-eval", max_pending: int = EVAL_QUEUE, policy: str = EVAL_BACKPRESSURE):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown evaluation backpressure policy '{policy}', expected 'drop' or 'block'")
+        self.max_pending = max(max_pending, 1)
+        self.policy = policy
+        self.jobs: deque = deque()
+        self.running = 0
+        self.closing = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args, droppable: bool = True, label: str = ""):
+        with self.cond:
+            while len(self.jobs) >= self.max_pending:
+                victim = next((job for job in self.jobs if job[2]), None) if self.policy == "drop" else None
+                if victim is None:
+                    self.cond.wait()
+                    continue
+                self.jobs.remove(victim)
+                print(f"[Evaluator] Falling behind: dropped pending job {victim[3] or victim[0].__name__}", flush=True)
+            self.jobs.append((fn, args, droppable, label))
+            self.cond.notify_all()
+
+    def pending(self) -> int:
+        with self.cond:
+            return len(self.jobs) + self.running
+
+    def flush(self):
+        """Blocks until every submitted job has finished."""
+        with self.cond:
+            while self.jobs or self.running:
+                self.cond.wait()
+
+    def close(self):
+        self.flush()
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.jobs and not self.closing:
+                    self.cond.wait()
+                if not self.jobs:
+                    return
+                fn, args, _, _ = self.jobs.popleft()
+                self.running = 1
+                self.cond.notify_all()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[Evaluator] Background job failed: {e}", flush=True)
+                traceback.print_exc()
+            finally:
+                with self.cond:
+                    self.running = 0
+                    self.cond.notify_all()
+
+
+def subsample_indices(num_rows: int, size: int, seed: int = 0) -> Optional[torch.Tensor]:
+    """Fixed random subset of the test set (sorted, for sequential reads); None means all rows."""
+    if size <= 0 or size >= num_rows:
+        return None
+    gen = torch.Generator().manual_seed(seed)
+    return torch.randperm(num_rows, generator=gen)[:size].sort().values
@@ -0,0 +1,254 @@
+import concurrent.futures
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import flwr as fl
+import numpy as np
+from flwr.common import FitIns, FitRes, Parameters, Scalar
+from flwr.server.client_proxy import ClientProxy
+
+from backend.fl.compression import decode_update
+from backend.fl.server import fit_client
+
+# FedBuff knobs (env): updates per aggregation, server step size, staleness cut-off and decay.
+FEDBUFF_BUFFER_SIZE = int(os.getenv("FL_FEDBUFF_K", "3"))
+FEDBUFF_SERVER_LR = float(os.getenv("FL_FEDBUFF_SERVER_LR", "1.0"))
+FEDBUFF_MAX_STALENESS = int(os.getenv("FL_FEDBUFF_MAX_STALENESS", "10"))
+FEDBUFF_STALENESS_EXPONENT = float(os.getenv("FL_FEDBUFF_STALENESS_EXPONENT", "0.5"))
+# Round limits: a round ends with a partial buffer after this many seconds or failed fits.
+FEDBUFF_ROUND_TIMEOUT = float(os.getenv("FL_FEDBUFF_ROUND_TIMEOUT", "600"))
+FEDBUFF_MAX_FAILURES = int(os.getenv("FL_FEDBUFF_MAX_FAILURES", "10"))
+# A client whose fit failed waits backoff * 2^(consecutive failures - 1) seconds, capped, before the next one.
+FEDBUFF_RETRY_BACKOFF = float(os.getenv("FL_FEDBUFF_RETRY_BACKOFF", "2"))
+FEDBUFF_MAX_BACKOFF = float(os.getenv("FL_FEDBUFF_MAX_BACKOFF", "60"))
+
+
+def staleness_weight(staleness: int, exponent: float = FEDBUFF_STALENESS_EXPONENT) -> float:
+    """Polynomial discount 1 / (1 + staleness)^exponent from the FedBuff paper."""
+    return 1.0 / (1.0 + staleness) ** exponent
+
+
+class IDSFedBuffStrategy(fl.server.strategy.FedAvg):
+    """
+    Buffered asynchronous aggregation (FedBuff). Driven by AsyncBufferedServer,
+    which hands out the current global model version with fit_ins() and calls
+    aggregate_fit() whenever buffer_size updates have arrived.
+
+    Each update is applied as a delta from the model version the client
+    trained on, weighted by num_examples * staleness_weight(current - trained),
+    and scaled by server_lr. Updates staler than max_staleness are dropped.
+    Federated evaluation is disabled; the server-side eval_fn still runs
+    after every aggregation.
+    """
+
+    def __init__(self, eval_fn, fit_config_fn, *args, buffer_size: int = FEDBUFF_BUFFER_SIZE,
+                 server_lr: float = FEDBUFF_SERVER_LR, max_staleness: int = FEDBUFF_MAX_STALENESS,
+                 staleness_exponent: float = FEDBUFF_STALENESS_EXPONENT,
+                 round_stats: Optional[Dict[int, Dict]] = None, **kwargs):
+        kwargs.setdefault("fraction_evaluate", 0.0)
+        kwargs.setdefault("min_evaluate_clients", 0)
+        super().__init__(*args, evaluate_fn=eval_fn, on_fit_config_fn=fit_config_fn, **kwargs)
+        self.buffer_size = buffer_size
+        self.server_lr = server_lr
+        self.max_staleness = max_staleness
+        self.staleness_exponent = staleness_exponent
+        self.round_stats = round_stats if round_stats is not None else {}
+        self.version = 0
+        self.global_weights: Optional[List[np.ndarray]] = None
+        # Global weights by version, for decoding deltas from clients that trained on older ones.
+        self.history: Dict[int, List[np.ndarray]] = {}
+
+    def __repr__(self) -> str:
+        return f"IDSFedBuffStrategy(K={self.buffer_size}, server_lr={self.server_lr})"
+
+    def initialize_parameters(self, client_manager):
+        parameters = super().initialize_parameters(client_manager)
+        if parameters is not None:
+            self._set_global(fl.common.parameters_to_ndarrays(parameters))
+        return parameters
+
+    def _set_global(self, weights: List[np.ndarray]):
+        self.global_weights = weights
+        self.history[self.version] = weights
+        for version in [v for v in self.history if v < self.version - self.max_staleness]:
+            del self.history[version]
+
+    def fit_ins(self, server_round: int) -> Tuple[int, FitIns]:
+        """Instructions carrying the current global model and its version."""
+        if self.global_weights is None:
+            raise RuntimeError("FedBuff needs initial_parameters")
+        config = self.on_fit_config_fn(server_round) if self.on_fit_config_fn is not None else {}
+        config["model_version"] = self.version
+        return self.version, FitIns(fl.common.ndarrays_to_parameters(self.global_weights), config)
+
+    def aggregate_fit(self, server_round: int, results: List[Tuple[ClientProxy, FitRes]],
+                      failures) -> Tuple[Optional[Parameters], Dict[str, Scalar]]:
+        if not results:
+            return None, {}
+
+        accum = [np.zeros(w.shape, dtype=np.float64) for w in self.global_weights]
+        total_weight = 0.0
+        stalenesses = []
+        upload = 0
+        latest_ints = None
+        for _, fit_res in results:
+            upload += sum(len(t) for t in fit_res.parameters.tensors)
+            trained_on = int(fit_res.metrics.get("model_version", self.version))
+            staleness = self.version - trained_on
+            base = self.history.get(trained_on)
+            if staleness > self.max_staleness or base is None:
+                print(f"[FedBuff] Dropping update with staleness {staleness}", flush=True)
+                continue
+            payload = fl.common.parameters_to_ndarrays(fit_res.parameters)
+            weights = decode_update(base, payload, str(fit_res.metrics.get("compression", "none")))
+            w = fit_res.num_examples * staleness_weight(staleness, self.staleness_exponent)
+            for i, (new, old) in enumerate(zip(weights, base)):
+                if np.issubdtype(old.dtype, np.floating):
+                    accum[i] += w * (new.astype(np.float64) - old)
+            latest_ints = weights
+            total_weight += w
+            stalenesses.append(staleness)
+
+        if total_weight == 0.0:
+            return None, {}
+
+        step = self.server_lr / total_weight
+        new_global = []
+        for i, current in enumerate(self.global_weights):
+            if np.issubdtype(current.dtype, np.floating):
+                new_global.append((current + step * accum[i]).astype(current.dtype))
+            else:
+                new_global.append(latest_ints[i])
+        self.version += 1
+        self._set_global(new_global)
+
+        stats = self.round_stats.setdefault(server_round, {})
+        stats.update({"model_version": self.version, "updates": len(stalenesses), "bytes_up": upload,
+                      "staleness_mean": float(np.mean(stalenesses)), "staleness_max": int(max(stalenesses))})
+        print(f"[FedBuff] Version {self.version}: {len(stalenesses)} updates, "
+              f"staleness mean {stats['staleness_mean']:.2f} max {stats['staleness_max']}", flush=True)
+        return fl.common.ndarrays_to_parameters(new_global), {"staleness_mean": stats["staleness_mean"]}
+
+
+class AsyncBufferedServer(fl.server.Server):
+    """
+    Flower server that never waits for a whole cohort. Every connected client
+    always has a fit in flight; a "round" ends as soon as strategy.buffer_size
+    updates have come back, the strategy folds them into a new global model,
+    and each client that finished is sent the newest model. Slow clients keep
+    training and contribute later with a staleness discount.
+
+    A client whose fit fails is retried only after an exponential backoff. A
+    round that hits round_timeout seconds or max_failures failed fits ends
+    with the updates it has (or is skipped when it has none) instead of
+    waiting for a full buffer that may never come.
+    """
+
+    def __init__(self, *, client_manager, strategy: IDSFedBuffStrategy, min_clients: int = 3,
+                 round_timeout: float = FEDBUFF_ROUND_TIMEOUT, max_failures: int = FEDBUFF_MAX_FAILURES,
+                 retry_backoff: float = FEDBUFF_RETRY_BACKOFF, max_backoff: float = FEDBUFF_MAX_BACKOFF):
+        super().__init__(client_manager=client_manager, strategy=strategy)
+        self.min_clients = min_clients
+        self.round_timeout = round_timeout
+        self.max_failures = max_failures
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="fedbuff")
+        self.in_flight: Dict[concurrent.futures.Future, Tuple[ClientProxy, int, float]] = {}
+        # cid -> (consecutive failures, monotonic time before which it is not re-sent a fit)
+        self.backoff: Dict[str, Tuple[int, float]] = {}
+
+    def _dispatch(self, client: ClientProxy, server_round: int, timeout: Optional[float]):
+        version, ins = self.strategy.fit_ins(server_round)
+        future = self.executor.submit(fit_client, client, ins, timeout, server_round)
+        self.in_flight[future] = (client, version, time.perf_counter())
+
+    def _dispatch_idle(self, server_round: int, timeout: Optional[float]):
+        busy = {client.cid for client, _, _ in self.in_flight.values()}
+        now = time.monotonic()
+        for cid, client in self._client_manager.all().items():
+            if cid not in busy and self.backoff.get(cid, (0, 0.0))[1] <= now:
+                self._dispatch(client, server_round, timeout)
+
+    def _record_failure(self, client: ClientProxy, server_round: int, reason):
+        count = self.backoff.get(client.cid, (0, 0.0))[0] + 1
+        delay = min(self.retry_backoff * 2 ** (count - 1), self.max_backoff)
+        self.backoff[client.cid] = (count, time.monotonic() + delay)
+        print(f"[FedBuff] Round {server_round}: client {client.cid} fit failed ({reason}); "
+              f"retrying in {delay:.0f}s", flush=True)
+
+    def fit_round(self, server_round: int, timeout: Optional[float]):
+        start = time.perf_counter()
+        deadline = start + self.round_timeout
+        if not self.in_flight:
+            self._client_manager.wait_for(self.min_clients, timeout=int(self.round_timeout))
+        self._dispatch_idle(server_round, timeout)
+
+        results: List[Tuple[ClientProxy, FitRes]] = []
+        failures = []
+        while len(results) < self.strategy.buffer_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or len(failures) >= self.max_failures:
+                break
+            if not self.in_flight:
+                # Nobody connected, or every idle client is backing off after a failure.
+                time.sleep(min(0.5, remaining))
+                self._dispatch_idle(server_round, timeout)
+                continue
+            done, _ = concurrent.futures.wait(list(self.in_flight), timeout=min(1.0, remaining),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                client, version, _ = self.in_flight.pop(future)
+                try:
+                    fit_res = future.result()
+                except Exception as e:
+                    failures.append(e)
+                    self._record_failure(client, server_round, e)
+                    continue
+                if fit_res.status.code != fl.common.Code.OK:
+                    failures.append((client, fit_res))
+                    self._record_failure(client, server_round, fit_res.status.message)
+                    continue
+                self.backoff.pop(client.cid, None)
+                fit_res.metrics["model_version"] = version
+                results.append((client, fit_res))
+            if len(results) < self.strategy.buffer_size:
+                # Clients that just reported (and any newly connected) start again right away; once
+                # the buffer is full they wait for the aggregated model instead, at the next round.
+                self._dispatch_idle(server_round, timeout)
+
+        elapsed = time.perf_counter() - start
+        if len(results) < self.strategy.buffer_size:
+            reason = "failure limit" if len(failures) >= self.max_failures else "round timeout"
+            print(f"[FedBuff] Round {server_round}: {reason} after {elapsed:.2f}s with {len(results)}/"
+                  f"{self.strategy.buffer_size} updates and {len(failures)} failures", flush=True)
+            if not results:
+                return None
+        else:
+            print(f"[FedBuff] Round {server_round}: buffer of {len(results)} filled in "
+                  f"{elapsed:.2f}s, {len(self.in_flight)} still training", flush=True)
+        parameters, metrics = self.strategy.aggregate_fit(server_round, results, failures)
+        return parameters, metrics, (results, failures)
+
+    def disconnect_all_clients(self, timeout: Optional[float]):
+        """Waits (up to timeout) for fits still in flight and reports their outcome before disconnecting."""
+        if self.in_flight:
+            print(f"[FedBuff] Waiting for {len(self.in_flight)} in-flight fit(s) before shutdown", flush=True)
+            done, not_done = concurrent.futures.wait(list(self.in_flight), timeout=timeout)
+            for future in done:
+                client, version, _ = self.in_flight[future]
+                try:
+                    fit_res = future.result()
+                    outcome = f"finished after training ended (version {version}, {fit_res.num_examples} examples), discarded"
+                except Exception as e:
+                    outcome = f"failed: {e}"
+                print(f"[FedBuff] Client {client.cid} {outcome}", flush=True)
+            for future in not_done:
+                future.cancel()
+            if not_done:
+                print(f"[FedBuff] {len(not_done)} fit(s) still running at shutdown: "
+                      f"{[self.in_flight[f][0].cid for f in not_done]}", flush=True)
+            self.in_flight.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        super().disconnect_all_clients(timeout)
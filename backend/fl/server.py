@@ -1,98 +1,141 @@
 
+import inspect
 from typing import List, Tuple, Dict, Optional
 import flwr as fl
 from flwr.common import Metrics
 import torch
 import numpy as np
-from collections import OrderedDict
-from torch.utils.data import DataLoader, TensorDataset
 import os
-import json
-from backend.ml.model import IDSModel, test
+import time
+from backend.ml.model import DEFAULT_MODEL, build_model, model_summary, test
 from backend.ml.data import get_dataloader
+from backend.ml.parameters import FlatParameters
+from backend.fl.compression import DEFAULT_CODEC, DEFAULT_TOPK_RATIO, CompressedUpdatesMixin, check_codec
+from backend.fl.evaluation import EvaluationWorker, subsample_indices
+from backend.analytics.metrics_store import MetricsStore
+from backend.ml.checkpoints import CHECKPOINT_ROOT, CheckpointManager
+
+# ClientProxy subclass -> whether its fit() takes group_id (added in Flower 1.5).
+_FIT_TAKES_GROUP_ID: Dict[type, bool] = {}
+
+def fit_client(client, ins: fl.common.FitIns, timeout: Optional[float], server_round: int) -> fl.common.FitRes:
+    """ClientProxy.fit for custom fit_round loops, passing the round as group_id where Flower supports it."""
+    takes_group_id = _FIT_TAKES_GROUP_ID.get(type(client))
+    if takes_group_id is None:
+        takes_group_id = _FIT_TAKES_GROUP_ID[type(client)] = "group_id" in inspect.signature(client.fit).parameters
+    if takes_group_id:
+        return client.fit(ins, timeout=timeout, group_id=server_round)
+    return client.fit(ins, timeout=timeout)
 
 def set_weights(model: torch.nn.Module, parameters: List[np.ndarray]):
-    params_dict = zip(model.state_dict().keys(), parameters)
-    state_dict = OrderedDict({k: torch.tensor(v) for k, v in params_dict})
-    model.load_state_dict(state_dict, strict=True)
+    """One-off load of Flower NDArrays into a model; keep a FlatParameters around for repeated loads."""
+    state = model.state_dict()
+    if len(state) != len(parameters):
+        raise ValueError(f"Expected {len(state)} arrays, got {len(parameters)}")
+    with torch.no_grad():
+        for tensor, array in zip(state.values(), parameters):
+            tensor.copy_(torch.as_tensor(array))
 
-def get_eval_fn(test_data, device="cpu", algorithm="fedavg"):
-    """Return an evaluation function for server-side evaluation."""
-    
-    test_loader = get_dataloader(test_data, batch_size=64, shuffle=False)
+def get_initial_parameters(model_name: str = DEFAULT_MODEL) -> fl.common.Parameters:
+    """Fresh weights for the selected architecture, so the server never has to ask a client for them."""
+    return fl.common.ndarrays_to_parameters(FlatParameters(build_model(model_name)).to_ndarrays())
 
-    X_test, y_test = test_data
-    X_test_tensor = torch.tensor(X_test, dtype=torch.float32)
-    y_test_tensor = torch.tensor(y_test, dtype=torch.long)
+def get_eval_fn(test_data, device="cpu", algorithm="fedavg", batch_size: int = int(os.getenv("FL_EVAL_BATCH_SIZE", "1024")),
+                model_name: str = DEFAULT_MODEL, round_stats: Optional[Dict[int, Dict]] = None,
+                num_rounds: Optional[int] = None,
+                background: bool = os.getenv("FL_EVAL_BACKGROUND", "1") == "1",
+                evaluate_every: int = int(os.getenv("FL_EVALUATE_EVERY", "1")),
+                eval_subsample: int = int(os.getenv("FL_EVAL_SUBSAMPLE", "0")),
+                checkpoints: Optional[CheckpointManager] = None, round_offset: int = 0):
+    """Server-side evaluation function (metrics, checkpoints) for Flower; call .flush() after training."""
     
-    val_loader = DataLoader(TensorDataset(X_test_tensor, y_test_tensor), batch_size=32)
+    summary = model_summary(build_model(model_name))
+    print(f"[Server] Model '{model_name}': {summary['params']:,} parameters, "
+          f"{summary['bytes_per_round'] / 1024:.0f} KiB per client per round")
     
-    METRICS_FILE = f"metrics_{algorithm}.json"
-    CHECKPOINT_DIR = f"backend/checkpoints/{algorithm}"
+    full_loader = get_dataloader(test_data, batch_size=batch_size, shuffle=False)
+    subset = subsample_indices(full_loader.num_samples, eval_subsample)
+    sub_loader = full_loader if subset is None else get_dataloader(test_data, batch_size=batch_size, shuffle=False, indices=subset)
     
-    if not os.path.exists(CHECKPOINT_DIR):
-        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    model = build_model(model_name).to(device)
+    layout = FlatParameters(model)
+    worker = EvaluationWorker(name=f"fl-eval-{algorithm}") if background else None
+    
+    store = MetricsStore(algorithm)
+    # Most recent completed (loss, metrics) for Flower; replaced as a whole by the worker.
+    latest: Dict[str, Tuple[float, Dict[str, fl.common.Scalar]]] = {}
+    if checkpoints is None:
+        checkpoints = CheckpointManager(os.path.join(CHECKPOINT_ROOT, algorithm))
 
-    def evaluate(server_round: int, parameters: fl.common.NDArrays, config: Dict[str, fl.common.Scalar]) -> Optional[Tuple[float, Dict[str, fl.common.Scalar]]]:
-        model = IDSModel()
-        model.to(device)
-        set_weights(model, parameters)
+    def run(server_round: int, parameters: fl.common.NDArrays, stats: Dict) -> Optional[Tuple[float, Dict[str, fl.common.Scalar]]]:
+        layout.from_ndarrays(parameters)
+        loader = full_loader if server_round == num_rounds else sub_loader
         
-        print(f"DEBUG: Starting test() for round {server_round}")
         try:
-            metrics = test(model, val_loader, device=device)
-            print(f"DEBUG: test() returned. Metrics: {metrics.keys()}")
-            print(f"[Server Round {server_round}] Global Eval - Loss: {metrics['loss']:.4f}, Accuracy: {metrics['accuracy']:.4f}")
+            metrics = test(model, loader, device=device)
+            print(f"[Server Round {server_round}] Global Eval - Loss: {metrics['loss']:.4f}, Accuracy: {metrics['accuracy']:.4f}"
+                  f" ({loader.num_samples} samples)", flush=True)
         except Exception as e:
             print(f"CRITICAL ERROR IN EVALUATE: {e}")
             import traceback
             traceback.print_exc()
             return None
         
-        print("DEBUG: Saving metrics to json")
-        
+        global_round = round_offset + server_round
         metric_data = {
-            "round": server_round,
+            "round": global_round,
+            "timestamp": stats.pop("timestamp"),
             "loss": metrics["loss"],
             "accuracy": metrics["accuracy"],
             "precision": metrics.get("precision", 0),
             "recall": metrics.get("recall", 0),
             "f1": metrics.get("f1", 0),
-            "confusion_matrix": metrics.get("confusion_matrix", [])
+            "confusion_matrix": metrics.get("confusion_matrix", []),
+            "eval_samples": loader.num_samples,
+            "model": model_name,
+            "params": summary["params"],
+            "bytes_per_round": summary["bytes_per_round"],
         }
+        metric_data.update(stats)
         
-        existing_data = []
-        
-        if os.path.exists(METRICS_FILE):
-            
-            if server_round == 0:
-                print(f"DEBUG: Round 0 detected. overwriting {METRICS_FILE} for fresh experiment.")
-                existing_data = [] 
-            else:
-                try:
-                    with open(METRICS_FILE, "r") as f:
-                        existing_data = json.load(f)
-                        
-                        existing_data = [d for d in existing_data if d["round"] < server_round]
-                        
-                except Exception as e:
-                    print(f"ERROR reading metrics file {METRICS_FILE}: {e}")
-                    existing_data = []
-        
-        existing_data.append(metric_data)
-        
-        with open(METRICS_FILE, "w") as f:
-            json.dump(existing_data, f, indent=4) 
-            
+        if global_round == 0:
+            print(f"[Server] Round 0: starting a fresh {store.path}")
+            store.reset()
         try:
-            ckpt_path = f"{CHECKPOINT_DIR}/model_round_{server_round}.pth"
-            torch.save(model.state_dict(), ckpt_path)
-            print(f"DEBUG: Saved checkpoint to {ckpt_path}")
-        except Exception as e:
-            print(f"ERROR Saving Checkpoint: {e}")
+            store.append(metric_data)
+        except OSError as e:
+            print(f"ERROR appending to {store.path}: {e}")
+            
+        if server_round > 0 or round_offset == 0:
+            checkpoints.save(global_round, layout.state_dict(), model_name=model_name,
+                             metrics={k: metrics[k] for k in ("loss", "accuracy", "precision", "recall", "f1") if k in metrics})
             
-        return metrics["loss"], {"accuracy": metrics["accuracy"]}
+        result = metrics["loss"], {"accuracy": metrics["accuracy"], "eval_round": global_round}
+        latest["result"] = result
+        return result
+
+    def evaluate(server_round: int, parameters: fl.common.NDArrays, config: Dict[str, fl.common.Scalar]) -> Optional[Tuple[float, Dict[str, fl.common.Scalar]]]:
+        due = server_round == 0 or server_round == num_rounds or server_round % max(evaluate_every, 1) == 0
+        if not due:
+            return latest.get("result")
+        # Wall-clock time the global model existed, not when the worker got to it.
+        stats = dict(round_stats.get(server_round, {})) if round_stats is not None else {}
+        stats["timestamp"] = time.time()
+        if worker is None:
+            return run(server_round, parameters, stats)
+        # Round 0 (metrics reset, first checkpoint) and the last round are never dropped under backpressure.
+        worker.submit(run, server_round, parameters, stats, droppable=server_round not in (0, num_rounds),
+                      label=f"round {server_round}")
+        if worker.pending() > 1:
+            print(f"[Server Round {server_round}] Evaluation queued behind {worker.pending() - 1} round(s)", flush=True)
+        return latest.get("result")
+
+    def flush():
+        if worker is not None:
+            worker.flush()
+        checkpoints.flush()
 
+    evaluate.flush = flush
     return evaluate
 
 def weighted_average(metrics: List[Tuple[int, Metrics]]) -> Metrics:
@@ -101,72 +144,112 @@ def weighted_average(metrics: List[Tuple[int, Metrics]]) -> Metrics:
 
     return {"accuracy": sum(accuracies) / sum(examples)}
 
-def get_fit_config_fn(algorithm: str = "fedavg"):
+def get_fit_config_fn(algorithm: str = "fedavg", model_name: str = DEFAULT_MODEL,
+                      compression: str = DEFAULT_CODEC, topk_ratio: float = DEFAULT_TOPK_RATIO,
+                      round_offset: int = 0):
+    check_codec(compression)
+
     def fit_config(server_round: int):
-        """Return training configuration dict for each round."""
+        """Return training configuration dict for each round (global round numbering, for the LR schedule)."""
         config = {
-            "server_round": server_round,
+            "server_round": round_offset + server_round,
+            "model": model_name,
+            "compression": compression,
+            "topk_ratio": topk_ratio,
         }
         if algorithm == "fedprox":
             config["mu"] = 0.01 
         return config
     return fit_config
 
-class IDSServerStrategy(fl.server.strategy.FedAvg):
+class IDSServerStrategy(CompressedUpdatesMixin, fl.server.strategy.FedAvg):
     def __init__(self, eval_fn, fit_config_fn, *args, **kwargs):
         super().__init__(
             *args, 
             evaluate_fn=eval_fn, 
             evaluate_metrics_aggregation_fn=weighted_average, 
             on_fit_config_fn=fit_config_fn,
+            on_evaluate_config_fn=fit_config_fn,
             **kwargs
         )
 
-class IDSFedProxStrategy(fl.server.strategy.FedProx):
+class IDSFedProxStrategy(CompressedUpdatesMixin, fl.server.strategy.FedProx):
     def __init__(self, eval_fn, fit_config_fn, proximal_mu, *args, **kwargs):
         super().__init__(
             *args, 
             evaluate_fn=eval_fn, 
             evaluate_metrics_aggregation_fn=weighted_average, 
             on_fit_config_fn=fit_config_fn,
+            on_evaluate_config_fn=fit_config_fn,
             proximal_mu=proximal_mu,
             **kwargs
         )
 
-def run_flower_server(algorithm: str = "fedavg"):
-    print(f"Starting Flower Server with Algorithm: {algorithm}")
+def run_flower_server(algorithm: str = "fedavg", model_name: str = DEFAULT_MODEL,
+                      aggregator: str = os.getenv("FL_AGGREGATOR", "buffered")):
+    print(f"Starting Flower Server with Algorithm: {algorithm}, Model: {model_name}, Aggregator: {aggregator}")
     
-    eval_fn = get_eval_fn()
-    fit_config_fn = get_fit_config_fn(algorithm)
+    round_stats: Dict[int, Dict] = {}
+    eval_fn = get_eval_fn(model_name=model_name, round_stats=round_stats, num_rounds=50)
+    fit_config_fn = get_fit_config_fn(algorithm, model_name)
     
-    if algorithm == "fedprox":
-        strategy = IDSFedProxStrategy(
+    server = None
+    fedavg_cls, fedprox_cls, streaming_kwargs = IDSServerStrategy, IDSFedProxStrategy, {}
+    streaming = algorithm != "fedbuff" and aggregator != "buffered"
+    if streaming:
+        from backend.fl.streaming import IDSStreamingFedProxStrategy, IDSStreamingStrategy, StreamingServer
+        fedavg_cls, fedprox_cls, streaming_kwargs = IDSStreamingStrategy, IDSStreamingFedProxStrategy, {"aggregator": aggregator}
+    if algorithm == "fedbuff":
+        from backend.fl.fedbuff import AsyncBufferedServer, IDSFedBuffStrategy
+        strategy = IDSFedBuffStrategy(
+            eval_fn=eval_fn,
+            fit_config_fn=fit_config_fn,
+            initial_parameters=get_initial_parameters(model_name),
+            round_stats=round_stats,
+            min_available_clients=3,
+        )
+        server = AsyncBufferedServer(client_manager=fl.server.SimpleClientManager(), strategy=strategy, min_clients=3)
+    elif algorithm == "fedprox":
+        strategy = fedprox_cls(
             eval_fn=eval_fn,
             fit_config_fn=fit_config_fn,
+            initial_parameters=get_initial_parameters(model_name),
+            round_stats=round_stats,
             proximal_mu=0.01, 
             min_fit_clients=3,
             min_evaluate_clients=3,
             min_available_clients=3,
+            **streaming_kwargs,
         )
     else:
-        strategy = IDSServerStrategy(
+        strategy = fedavg_cls(
             eval_fn=eval_fn,
             fit_config_fn=fit_config_fn,
+            initial_parameters=get_initial_parameters(model_name),
+            round_stats=round_stats,
             min_fit_clients=3,
             min_evaluate_clients=3,
             min_available_clients=3,
+            **streaming_kwargs,
         )
+    if streaming:
+        server = StreamingServer(client_manager=fl.server.SimpleClientManager(), strategy=strategy)
     fl.server.start_server(
         server_address="0.0.0.0:8080",
         config=fl.server.ServerConfig(num_rounds=50),
+        server=server,
         strategy=strategy,
     )
+    eval_fn.flush()
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description='Flower Server')
-    parser.add_argument('--algorithm', type=str, default='fedavg', help='Algorithm to use (fedavg/fedprox)')
+    parser.add_argument('--algorithm', type=str, default='fedavg', help='Algorithm to use (fedavg/fedprox/fedbuff)')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL, help='Model architecture (cnn/cnn_gap/mlp)')
+    parser.add_argument('--aggregator', type=str, default=os.getenv("FL_AGGREGATOR", "buffered"),
+                        help='Aggregation for fedavg/fedprox (buffered/mean/trimmed_mean/median)')
     args = parser.parse_args()
     
-    run_flower_server(args.algorithm)
+    run_flower_server(args.algorithm, args.model, args.aggregator)
 
@@ -0,0 +1,322 @@
+"""
+Single-process federated simulation: the regular strategies and
+IDSFlowerClient, without XMPP agents, gRPC or one process per client.
+
+    python -m backend.fl.simulation --algorithm fedavg --clients 50 --rounds 5
+    python -m backend.fl.simulation --algorithm fedprox --sweep 5,50,500 --rounds 3 --workers 4
+
+Virtual clients sit behind in-process ClientProxy objects registered with a
+normal Flower Server, so configure_fit/aggregate_fit, the evaluation
+function, metrics files and checkpoints are exactly those of a real run
+(written under the run name, "sim-<algorithm>-<clients>" by default).
+Client fits run on a pool of --workers threads; at most --resident client
+objects (model + loaders) are kept alive, with per-client state such as the
+compression error-feedback residual preserved across evictions.
+
+With --vectorized (fedavg/fedprox), a round's clients are instead trained
+--group-size at a time by one VectorizedTrainer (backend/ml/vectorized.py),
+which stacks their models and runs them through a single vmapped
+forward/backward; updates are encoded per client exactly as
+IDSFlowerClient.fit would.
+"""
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import flwr as fl
+import numpy as np
+import torch
+from flwr.common import (Code, EvaluateIns, EvaluateRes, FitIns, FitRes, GetParametersIns, GetParametersRes,
+                         GetPropertiesIns, GetPropertiesRes, ReconnectIns, DisconnectRes, Status)
+from flwr.server.client_proxy import ClientProxy
+
+from backend.fl.client import IDSFlowerClient
+from backend.fl.compression import DEFAULT_TOPK_RATIO, UpdateEncoder, payload_bytes
+from backend.fl.server import (IDSFedProxStrategy, IDSServerStrategy, get_eval_fn, get_fit_config_fn,
+                               get_initial_parameters)
+
+OK = Status(code=Code.OK, message="Success")
+
+
+class ClientPool:
+    """Builds IDSFlowerClients on demand and keeps the most recently used ones (LRU)."""
+
+    def __init__(self, factory: Callable[[str], IDSFlowerClient], max_resident: int):
+        self.factory = factory
+        self.max_resident = max(max_resident, 1)
+        self.resident: "OrderedDict[str, IDSFlowerClient]" = OrderedDict()
+        self.encoders: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    def get(self, cid: str) -> IDSFlowerClient:
+        with self.lock:
+            client = self.resident.pop(cid, None)
+            if client is not None:
+                self.resident[cid] = client
+                return client
+        client = self.factory(cid)
+        if cid in self.encoders:
+            client.encoder = self.encoders[cid]
+        with self.lock:
+            self.encoders[cid] = client.encoder
+            self.resident[cid] = client
+            while len(self.resident) > self.max_resident:
+                self.resident.popitem(last=False)
+        return client
+
+
+class InProcessClientProxy(ClientProxy):
+    """Calls an IDSFlowerClient's NumPyClient methods directly instead of over gRPC."""
+
+    def __init__(self, cid: str, pool: ClientPool):
+        super().__init__(cid)
+        self.pool = pool
+
+    def get_properties(self, ins: GetPropertiesIns, timeout: Optional[float] = None, group_id=None) -> GetPropertiesRes:
+        return GetPropertiesRes(status=OK, properties={})
+
+    def get_parameters(self, ins: GetParametersIns, timeout: Optional[float] = None, group_id=None) -> GetParametersRes:
+        arrays = self.pool.get(self.cid).get_parameters(ins.config)
+        return GetParametersRes(status=OK, parameters=fl.common.ndarrays_to_parameters(arrays))
+
+    def fit(self, ins: FitIns, timeout: Optional[float] = None, group_id=None) -> FitRes:
+        client = self.pool.get(self.cid)
+        arrays, num_examples, metrics = client.fit(fl.common.parameters_to_ndarrays(ins.parameters), ins.config)
+        # Serialize right away: the arrays may be views of the client's live weights.
+        return FitRes(status=OK, parameters=fl.common.ndarrays_to_parameters(arrays),
+                      num_examples=num_examples, metrics=metrics)
+
+    def evaluate(self, ins: EvaluateIns, timeout: Optional[float] = None, group_id=None) -> EvaluateRes:
+        loss, num_examples, metrics = self.pool.get(self.cid).evaluate(
+            fl.common.parameters_to_ndarrays(ins.parameters), ins.config)
+        return EvaluateRes(status=OK, loss=loss, num_examples=num_examples, metrics=metrics)
+
+    def reconnect(self, ins: ReconnectIns, timeout: Optional[float] = None, group_id=None) -> DisconnectRes:
+        return DisconnectRes(reason="")
+
+
+class VectorizedServer(fl.server.Server):
+    """
+    Synchronous Flower server whose fit_round trains the sampled clients in
+    groups with a VectorizedTrainer instead of calling each proxy's fit. The
+    learning-rate schedule, FedProx mu, batch size, local epochs and update
+    encoding follow IDSFlowerClient.fit; aggregation is the strategy's own.
+    """
+
+    def __init__(self, *, client_manager, strategy, datasets, partitions: Dict[str, np.ndarray],
+                 group_size: int = int(os.getenv("FL_VECTORIZED_GROUP", "16")), device: str = "cpu",
+                 local_epochs: int = 3, batch_size: int = int(os.getenv("FL_BATCH_SIZE", "32"))):
+        super().__init__(client_manager=client_manager, strategy=strategy)
+        self.datasets = datasets
+        self.partitions = partitions
+        self.group_size = max(group_size, 1)
+        self.device = device
+        self.local_epochs = local_epochs
+        self.batch_size = batch_size
+        self.trainers: Dict[str, "VectorizedTrainer"] = {}
+        self.encoders: Dict[str, UpdateEncoder] = {}
+
+    def _trainer(self, model_name: str):
+        from backend.ml.vectorized import VectorizedTrainer
+
+        if model_name not in self.trainers:
+            self.trainers[model_name] = VectorizedTrainer(model_name, device=self.device)
+        return self.trainers[model_name]
+
+    def _fit_group(self, group) -> list:
+        config = group[0][1].config
+        server_round = int(config.get("server_round", 1))
+        lr = 0.001 * (0.9 ** ((server_round - 1) // 10))
+        decoded: Dict[int, list] = {}
+        initial = [decoded.setdefault(id(ins.parameters), fl.common.parameters_to_ndarrays(ins.parameters))
+                   for _, ins in group]
+        trained = self._trainer(str(config.get("model"))).train(
+            initial, self.datasets["train"], [self.partitions[proxy.cid] for proxy, _ in group],
+            epochs=self.local_epochs, lr=lr, batch_size=int(config.get("batch_size", self.batch_size)),
+            mu=[float(ins.config.get("mu", 0.01)) for _, ins in group])
+
+        results = []
+        for (proxy, ins), global_weights, (weights, num_examples, metrics) in zip(group, initial, trained):
+            codec = str(ins.config.get("compression", "none"))
+            encoder = self.encoders.setdefault(proxy.cid, UpdateEncoder())
+            update = encoder.encode(global_weights, weights, codec,
+                                    topk_ratio=float(ins.config.get("topk_ratio", DEFAULT_TOPK_RATIO)))
+            metrics.update(compression=codec, update_bytes=payload_bytes(update))
+            results.append((proxy, FitRes(status=OK, parameters=fl.common.ndarrays_to_parameters(update),
+                                          num_examples=num_examples, metrics=metrics)))
+        return results
+
+    def fit_round(self, server_round: int, timeout: Optional[float]):
+        instructions = self.strategy.configure_fit(server_round=server_round, parameters=self.parameters,
+                                                   client_manager=self._client_manager)
+        if not instructions:
+            print(f"[Simulation] Round {server_round}: no clients selected", flush=True)
+            return None
+        # Clients are grouped by model so one stacked trainer serves each group.
+        by_model: Dict[str, list] = {}
+        for proxy, ins in instructions:
+            by_model.setdefault(str(ins.config.get("model")), []).append((proxy, ins))
+
+        results, failures = [], []
+        for group in by_model.values():
+            for start in range(0, len(group), self.group_size):
+                chunk = group[start:start + self.group_size]
+                try:
+                    group_results = self._fit_group(chunk)
+                except Exception as e:
+                    print(f"[Simulation] Round {server_round}: vectorized group failed: {e}", flush=True)
+                    failures.append(e)
+                    continue
+                # Streaming strategies fold each group in right away instead of holding every update.
+                if hasattr(self.strategy, "accumulate"):
+                    for _, fit_res in group_results:
+                        self.strategy.accumulate(server_round, fit_res)
+                results.extend(group_results)
+        parameters, metrics = self.strategy.aggregate_fit(server_round, results, failures)
+        return parameters, metrics, (results, failures)
+
+
+def build_strategy(algorithm: str, eval_fn, fit_config_fn, initial_parameters, round_stats: Dict,
+                   num_clients: int, clients_per_round: int, federated_eval: bool, aggregator: str = "buffered"):
+    per_round = clients_per_round or num_clients
+    common = dict(eval_fn=eval_fn, fit_config_fn=fit_config_fn, initial_parameters=initial_parameters,
+                  round_stats=round_stats, fraction_fit=per_round / num_clients, min_fit_clients=per_round,
+                  min_available_clients=num_clients,
+                  fraction_evaluate=1.0 if federated_eval else 0.0, min_evaluate_clients=per_round if federated_eval else 0)
+    fedavg_cls, fedprox_cls = IDSServerStrategy, IDSFedProxStrategy
+    if aggregator != "buffered":
+        from backend.fl.streaming import IDSStreamingFedProxStrategy, IDSStreamingStrategy
+        fedavg_cls, fedprox_cls = IDSStreamingStrategy, IDSStreamingFedProxStrategy
+        common["aggregator"] = aggregator
+    if algorithm == "fedprox":
+        return fedprox_cls(proximal_mu=0.01, **common)
+    if algorithm == "fedavg":
+        return fedavg_cls(**common)
+    raise ValueError(f"Unknown algorithm '{algorithm}' for simulation")
+
+
+def build_server(algorithm: str, strategy, client_manager, num_clients: int, workers: int, vectorized: bool = False,
+                 datasets=None, partitions=None, group_size: int = 0, device: str = "cpu"):
+    if vectorized:
+        if algorithm == "fedbuff":
+            raise ValueError("Vectorized training is only available for the synchronous algorithms (fedavg, fedprox)")
+        extra = {"group_size": group_size} if group_size else {}
+        return VectorizedServer(client_manager=client_manager, strategy=strategy, datasets=datasets,
+                                partitions=partitions, device=device, **extra)
+    if algorithm == "fedbuff":
+        from backend.fl.fedbuff import AsyncBufferedServer
+        return AsyncBufferedServer(client_manager=client_manager, strategy=strategy, min_clients=num_clients)
+    if hasattr(strategy, "accumulate"):
+        from backend.fl.streaming import StreamingServer
+        server = StreamingServer(client_manager=client_manager, strategy=strategy)
+    else:
+        server = fl.server.Server(client_manager=client_manager, strategy=strategy)
+    server.set_max_workers(workers)
+    return server
+
+
+def simulate(algorithm: str = "fedavg", num_clients: int = 5, num_rounds: int = 5, datasets=None,
+             partitions: Optional[Dict[str, np.ndarray]] = None, workers: int = 1, resident: int = 0,
+             clients_per_round: int = 0, federated_eval: bool = False, run_name: Optional[str] = None,
+             device: str = "cpu", vectorized: bool = False, group_size: int = 0,
+             aggregator: str = "buffered") -> Dict:
+    """Runs one federation in this process; returns timing and the final metrics entry."""
+    from backend.analytics.metrics_store import MetricsStore
+    from backend.ml.model import DEFAULT_MODEL
+
+    run_name = run_name or f"sim-{algorithm}-{num_clients}" + ("-vec" if vectorized else "")
+    if workers > 1:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+    def factory(cid: str) -> IDSFlowerClient:
+        return IDSFlowerClient(cid=cid, train_data=datasets["train"], test_data=datasets["test"], device=device,
+                               train_indices=partitions[cid])
+
+    pool = ClientPool(factory, max_resident=resident or 2 * workers)
+    client_manager = fl.server.SimpleClientManager()
+    for cid in sorted(partitions, key=int)[:num_clients]:
+        client_manager.register(InProcessClientProxy(cid, pool))
+
+    round_stats: Dict[int, Dict] = {}
+    eval_fn = get_eval_fn(datasets["test"], device=device, algorithm=run_name, model_name=DEFAULT_MODEL,
+                          round_stats=round_stats, num_rounds=num_rounds)
+    fit_config_fn = get_fit_config_fn(algorithm, DEFAULT_MODEL)
+    initial_parameters = get_initial_parameters(DEFAULT_MODEL)
+
+    if algorithm == "fedbuff":
+        from backend.fl.fedbuff import IDSFedBuffStrategy
+        strategy = IDSFedBuffStrategy(eval_fn=eval_fn, fit_config_fn=fit_config_fn, initial_parameters=initial_parameters,
+                                      round_stats=round_stats, min_available_clients=num_clients)
+    else:
+        strategy = build_strategy(algorithm, eval_fn, fit_config_fn, initial_parameters, round_stats,
+                                  num_clients, clients_per_round, federated_eval, aggregator=aggregator)
+    server = build_server(algorithm, strategy, client_manager, num_clients, workers, vectorized=vectorized,
+                          datasets=datasets, partitions=partitions, group_size=group_size, device=device)
+
+    mode = f"vectorized groups of {server.group_size}" if vectorized else f"{workers} worker(s)"
+    print(f"[Simulation] {run_name}: {num_clients} clients, {num_rounds} rounds, {mode}", flush=True)
+    start = time.perf_counter()
+    server.fit(num_rounds=num_rounds, timeout=None)
+    eval_fn.flush()
+    elapsed = time.perf_counter() - start
+    if algorithm == "fedbuff":
+        server.disconnect_all_clients(timeout=None)
+
+    entries = MetricsStore(run_name).read()
+    result = {"run": run_name, "algorithm": algorithm, "clients": num_clients, "rounds": num_rounds,
+              "seconds": elapsed, "seconds_per_round": elapsed / max(num_rounds, 1),
+              "final": entries[-1] if entries else {}}
+    print(f"[Simulation] {run_name}: {elapsed:.1f}s total, {result['seconds_per_round']:.2f}s/round, "
+          f"final accuracy {result['final'].get('accuracy', float('nan')):.4f}", flush=True)
+    return result
+
+
+def main():
+    from backend.benchmarks.common import print_table
+    from backend.ml.data import NSL_KDD_DataProcessor, attach_datasets
+    from backend.ml.partition import SCHEMES, ensure_partitions, load_all_partitions
+
+    parser = argparse.ArgumentParser(description="Single-process federated simulation")
+    parser.add_argument("--algorithm", type=str, default="fedavg", choices=["fedavg", "fedprox", "fedbuff"])
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--sweep", type=str, default=None, help="Comma-separated client counts, e.g. 5,50,500")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--clients-per-round", type=int, default=0, help="0 = every client, every round")
+    parser.add_argument("--workers", type=int, default=1, help="Threads running client fits concurrently")
+    parser.add_argument("--resident", type=int, default=0, help="Client objects kept alive (default 2 * workers)")
+    parser.add_argument("--vectorized", action="store_true", help="Train each round's clients in stacked vmap groups")
+    parser.add_argument("--group-size", type=int, default=0, help="Clients per vectorized group (default FL_VECTORIZED_GROUP, 16)")
+    parser.add_argument("--aggregator", type=str, default=os.getenv("FL_AGGREGATOR", "buffered"),
+                        choices=["buffered", "mean", "trimmed_mean", "median"])
+    parser.add_argument("--federated-eval", action="store_true", help="Also run client-side evaluation each round")
+    parser.add_argument("--partition", type=str, default=os.getenv("FL_PARTITION", "iid"), choices=SCHEMES)
+    parser.add_argument("--seed", type=int, default=int(os.getenv("FL_PARTITION_SEED", "42")))
+    parser.add_argument("--alpha", type=float, default=float(os.getenv("FL_PARTITION_ALPHA", "0.5")))
+    parser.add_argument("--sigma", type=float, default=float(os.getenv("FL_PARTITION_SIGMA", "1.0")))
+    parser.add_argument("--data-path", type=str, default=os.getenv("DATA_PATH", "nsl-kdd"))
+    args = parser.parse_args()
+
+    processor = NSL_KDD_DataProcessor(args.data_path)
+    handle = processor.materialize()
+    datasets = attach_datasets(handle)
+
+    results = []
+    for num_clients in ([int(n) for n in args.sweep.split(",")] if args.sweep else [args.clients]):
+        path = ensure_partitions(handle, args.partition, num_clients, args.seed, alpha=args.alpha, sigma=args.sigma,
+                                 attack_names_fn=lambda: processor.load_attack_names("train"))
+        partitions = load_all_partitions(path)
+        results.append(simulate(args.algorithm, num_clients, args.rounds, datasets=datasets, partitions=partitions,
+                                workers=args.workers, resident=args.resident, clients_per_round=args.clients_per_round,
+                                federated_eval=args.federated_eval, vectorized=args.vectorized,
+                                group_size=args.group_size, aggregator=args.aggregator))
+
+    print_table([[r["clients"], f"{r['seconds']:.1f}", f"{r['seconds_per_round']:.2f}",
+                  f"{r['final'].get('accuracy', float('nan')):.4f}"] for r in results],
+                ["clients", "total s", "s/round", "final acc"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import concurrent.futures
+import os
+from typing import Dict, List, Optional, Tuple
+
+import flwr as fl
+import numpy as np
+from flwr.common import FitRes
+from flwr.server.client_proxy import ClientProxy
+
+from backend.fl.compression import decode_update
+from backend.fl.server import IDSFedProxStrategy, IDSServerStrategy, fit_client
+
+# "buffered" is the stock Flower path (every update held until the round ends); the
+# others fold each update into a fixed-size aggregate as soon as it arrives.
+AGGREGATORS = ["buffered", "mean", "trimmed_mean", "median"]
+DEFAULT_AGGREGATOR = os.getenv("FL_AGGREGATOR", "buffered")
+# trimmed_mean drops the TRIM_K largest and TRIM_K smallest values of every coordinate.
+TRIM_K = int(os.getenv("FL_TRIM_K", "1"))
+# median is taken over a uniform reservoir of at most this many client updates.
+MEDIAN_SKETCH = int(os.getenv("FL_MEDIAN_SKETCH", "32"))
+
+
+def check_aggregator(name: str):
+    if name not in AGGREGATORS:
+        raise ValueError(f"Unknown aggregator '{name}', expected one of {AGGREGATORS}")
+
+
+class WeightedMean:
+    """FedAvg: running sum of num_examples-weighted updates in one float64 vector."""
+
+    def __init__(self, size: int):
+        self.total = np.zeros(size, dtype=np.float64)
+        self.weight = 0.0
+        self.count = 0
+
+    def add(self, vector: np.ndarray, weight: float):
+        self.total += weight * vector
+        self.weight += weight
+        self.count += 1
+
+    def result(self) -> np.ndarray:
+        return self.total / self.weight
+
+
+class TrimmedMean:
+    """
+    Coordinate-wise trimmed mean (unweighted) without keeping the updates:
+    a running sum plus the k largest and k smallest values seen at every
+    coordinate, which are subtracted out at the end. Memory is (2k + 1)
+    vectors whatever the number of clients. With 2k or fewer updates there
+    is nothing left after trimming and the plain mean is returned.
+    """
+
+    def __init__(self, size: int, k: int = TRIM_K):
+        self.k = max(k, 1)
+        self.total = np.zeros(size, dtype=np.float64)
+        self.top = np.full((self.k, size), -np.inf)
+        self.bottom = np.full((self.k, size), np.inf)
+        self.cols = np.arange(size)
+        self.count = 0
+
+    def add(self, vector: np.ndarray, weight: float):
+        self.total += vector
+        self.count += 1
+        # Each buffer row set holds the k extremes; a new value replaces the weakest one where it beats it.
+        rows = self.top.argmin(axis=0)
+        beats = vector > self.top[rows, self.cols]
+        self.top[rows[beats], self.cols[beats]] = vector[beats]
+        rows = self.bottom.argmax(axis=0)
+        beats = vector < self.bottom[rows, self.cols]
+        self.bottom[rows[beats], self.cols[beats]] = vector[beats]
+
+    def result(self) -> np.ndarray:
+        if self.count <= 2 * self.k:
+            print(f"[Aggregation] trimmed_mean needs more than {2 * self.k} updates, got {self.count}; "
+                  f"using the plain mean", flush=True)
+            return self.total / self.count
+        return (self.total - self.top.sum(axis=0) - self.bottom.sum(axis=0)) / (self.count - 2 * self.k)
+
+
+class ReservoirMedian:
+    """
+    Coordinate-wise median over a uniform reservoir sample of at most
+    sketch_size updates (Algorithm R), preallocated as one float32 matrix.
+    Exact while no more than sketch_size updates arrive in a round.
+    """
+
+    def __init__(self, size: int, sketch_size: int = MEDIAN_SKETCH, seed: int = 0):
+        self.sample = np.empty((max(sketch_size, 1), size), dtype=np.float32)
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+
+    def add(self, vector: np.ndarray, weight: float):
+        if self.count < len(self.sample):
+            self.sample[self.count] = vector
+        else:
+            slot = self.rng.integers(0, self.count + 1)
+            if slot < len(self.sample):
+                self.sample[slot] = vector
+        self.count += 1
+
+    def result(self) -> np.ndarray:
+        return np.median(self.sample[:min(self.count, len(self.sample))], axis=0).astype(np.float64)
+
+
+def make_aggregate(name: str, size: int, trim_k: int = TRIM_K, sketch_size: int = MEDIAN_SKETCH, seed: int = 0):
+    if name == "trimmed_mean":
+        return TrimmedMean(size, trim_k)
+    if name == "median":
+        return ReservoirMedian(size, sketch_size, seed)
+    return WeightedMean(size)
+
+
+class StreamingAggregationMixin:
+    """
+    Replaces the collect-then-average aggregate_fit of CompressedUpdatesMixin
+    strategies. configure_fit sets up the round's fixed-size aggregate;
+    accumulate() decodes one FitRes against the round's global weights,
+    folds it in and drops its parameters, so a result costs memory only
+    until it is processed. aggregate_fit folds in whatever a regular Flower
+    server hands it that was not accumulated yet, then finalizes, so the
+    strategies also work without StreamingServer (just without the
+    memory bound).
+    """
+
+    def __init__(self, *args, aggregator: str = DEFAULT_AGGREGATOR, trim_k: int = TRIM_K,
+                 sketch_size: int = MEDIAN_SKETCH, **kwargs):
+        super().__init__(*args, **kwargs)
+        check_aggregator(aggregator)
+        self.aggregator = "mean" if aggregator == "buffered" else aggregator
+        self.trim_k = trim_k
+        self.sketch_size = sketch_size
+        self._rounds: Dict[int, Dict] = {}
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        global_weights = self._round_global.pop(server_round)
+        size = sum(w.size for w in global_weights)
+        self._rounds = {server_round: {
+            "global": global_weights,
+            "aggregate": make_aggregate(self.aggregator, size, self.trim_k, self.sketch_size, seed=server_round),
+            "seen": set(), "upload": 0, "codec": "none",
+        }}
+        return instructions
+
+    def accumulate(self, server_round: int, fit_res: FitRes):
+        state = self._rounds.get(server_round)
+        if state is None:
+            raise RuntimeError(f"Round {server_round}: update received before configure_fit")
+        state["upload"] += sum(len(t) for t in fit_res.parameters.tensors)
+        codec = str(fit_res.metrics.get("compression", "none"))
+        state["codec"] = codec
+        weights = fl.common.parameters_to_ndarrays(fit_res.parameters)
+        if codec != "none":
+            weights = decode_update(state["global"], weights, codec)
+        vector = np.concatenate([np.asarray(w, dtype=np.float64).ravel() for w in weights])
+        state["aggregate"].add(vector, float(fit_res.num_examples))
+        state["seen"].add(id(fit_res))
+        fit_res.parameters = fl.common.Parameters(tensors=[], tensor_type=fit_res.parameters.tensor_type)
+
+    def aggregate_fit(self, server_round, results, failures):
+        if not results:
+            return None, {}
+        if failures and not self.accept_failures:
+            return None, {}
+        state = self._rounds.get(server_round)
+        if state is None:
+            raise RuntimeError(f"Round {server_round}: aggregate_fit without configure_fit")
+        for _, fit_res in results:
+            if id(fit_res) not in state["seen"]:
+                self.accumulate(server_round, fit_res)
+
+        vector = state["aggregate"].result()
+        weights, offset = [], 0
+        for template in state["global"]:
+            chunk = vector[offset:offset + template.size].reshape(template.shape)
+            offset += template.size
+            if not np.issubdtype(template.dtype, np.floating):
+                chunk = np.rint(chunk)
+            weights.append(chunk.astype(template.dtype))
+
+        stats = self.round_stats.setdefault(server_round, {})
+        stats.update({"compression": state["codec"], "bytes_up": state["upload"],
+                      "bytes_per_client": state["upload"] // len(results), "aggregator": self.aggregator})
+        print(f"[Server Round {server_round}] Aggregated {state['aggregate'].count} '{state['codec']}' updates "
+              f"({state['upload'] / 1024:.0f} KiB) with streaming {self.aggregator}", flush=True)
+        self._rounds.pop(server_round, None)
+
+        metrics = {}
+        if self.fit_metrics_aggregation_fn:
+            metrics = self.fit_metrics_aggregation_fn([(res.num_examples, res.metrics) for _, res in results])
+        return fl.common.ndarrays_to_parameters(weights), metrics
+
+
+class IDSStreamingStrategy(StreamingAggregationMixin, IDSServerStrategy):
+    pass
+
+
+class IDSStreamingFedProxStrategy(StreamingAggregationMixin, IDSFedProxStrategy):
+    pass
+
+
+class StreamingServer(fl.server.Server):
+    """
+    Synchronous Flower server whose fit_round hands each FitRes to
+    strategy.accumulate() the moment it completes (as_completed), so the
+    server folds early updates while stragglers are still training or
+    uploading, instead of waiting for the whole cohort and then averaging.
+    """
+
+    def __init__(self, *, client_manager, strategy: StreamingAggregationMixin):
+        super().__init__(client_manager=client_manager, strategy=strategy)
+
+    def fit_round(self, server_round: int, timeout: Optional[float]):
+        instructions = self.strategy.configure_fit(server_round=server_round, parameters=self.parameters,
+                                                   client_manager=self._client_manager)
+        if not instructions:
+            print(f"[Server Round {server_round}] No clients selected, skipping", flush=True)
+            return None
+
+        results: List[Tuple[ClientProxy, FitRes]] = []
+        failures = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(fit_client, client, ins, timeout, server_round): client
+                       for client, ins in instructions}
+            for future in concurrent.futures.as_completed(futures):
+                client = futures[future]
+                try:
+                    fit_res = future.result()
+                except Exception as e:
+                    failures.append(e)
+                    continue
+                if fit_res.status.code != fl.common.Code.OK:
+                    failures.append((client, fit_res))
+                    continue
+                self.strategy.accumulate(server_round, fit_res)
+                results.append((client, fit_res))
+
+        parameters, metrics = self.strategy.aggregate_fit(server_round, results, failures)
+        return parameters, metrics, (results, failures)
@@ -0,0 +1,105 @@
+import contextlib
+import os
+from typing import Any, Callable, Iterable, Optional, Set, Union
+
+import torch
+import torch.nn as nn
+
+# Comma-separated subset of {"compile", "bf16"}; empty keeps eager float32.
+ACCEL_ENV = "IDS_ACCEL"
+MODES = {"compile", "bf16"}
+
+
+def parse_accel(value: Union[str, Iterable[str], None]) -> Set[str]:
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        value = value.replace("+", ",").split(",")
+    modes = {v.strip().lower() for v in value if v and v.strip() and v.strip().lower() not in ("none", "eager")}
+    unknown = modes - MODES
+    if unknown:
+        raise ValueError(f"Unknown acceleration mode(s) {sorted(unknown)}, expected a subset of {sorted(MODES)}")
+    return modes
+
+
+def default_accel() -> Set[str]:
+    return parse_accel(os.getenv(ACCEL_ENV, ""))
+
+
+def bf16_supported(device: str = "cpu") -> bool:
+    """bfloat16 autocast only pays off with native bf16 support (AVX512-BF16/AMX on CPU)."""
+    device = str(device)
+    if device.startswith("cuda"):
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    if device.startswith("cpu"):
+        for probe in ("_is_amx_tile_supported", "_is_avx512_bf16_supported"):
+            fn = getattr(torch.cpu, probe, None)
+            if fn is not None and fn():
+                return True
+        return os.getenv("IDS_ACCEL_FORCE_BF16", "0") == "1"
+    return False
+
+
+class Accelerator:
+    """
+    Opt-in acceleration for one model in one process: torch.compile (done
+    once, reused across rounds since it shares the model's parameters) and
+    bfloat16 autocast. Compilation errors surface on the first call in each
+    mode, so the first training and evaluation steps run through guarded():
+    on failure it switches permanently to the eager model and retries.
+    """
+
+    def __init__(self, model: nn.Module, modes: Set[str], device: str = "cpu", log=print):
+        self.model = model
+        self.modes = set(modes)
+        self.device = str(device)
+        self.log = log
+        self._verified: Set[str] = set()
+
+        self.bf16 = "bf16" in self.modes and bf16_supported(self.device)
+        if "bf16" in self.modes and not self.bf16:
+            self.log(f"[Accel] bfloat16 autocast not supported on {self.device}, staying in float32")
+
+        self.compiled: Optional[nn.Module] = None
+        if "compile" in self.modes:
+            if hasattr(torch, "compile"):
+                try:
+                    self.compiled = torch.compile(model)
+                except Exception as e:
+                    self.log(f"[Accel] torch.compile unavailable, using eager model: {e}")
+            else:
+                self.log("[Accel] torch.compile requires PyTorch 2.x, using eager model")
+
+    @property
+    def active_modes(self) -> Set[str]:
+        return ({"compile"} if self.compiled is not None else set()) | ({"bf16"} if self.bf16 else set())
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        module = self.compiled if self.compiled is not None else self.model
+        return module(x)
+
+    def autocast(self):
+        if not self.bf16:
+            return contextlib.nullcontext()
+        device_type = "cuda" if self.device.startswith("cuda") else "cpu"
+        return torch.autocast(device_type=device_type, dtype=torch.bfloat16)
+
+    def guarded(self, step: Callable[[], Any], phase: str) -> Any:
+        if phase in self._verified:
+            return step()
+        try:
+            result = step()
+        except Exception as e:
+            if not self.fallback(e):
+                raise
+            result = step()
+        self._verified.add(phase)
+        return result
+
+    def fallback(self, error: Exception) -> bool:
+        """Drops the compiled module after a failure; False if there was nothing to fall back from."""
+        if self.compiled is None:
+            return False
+        self.log(f"[Accel] Compiled model failed ({type(error).__name__}: {error}); falling back to eager")
+        self.compiled = None
+        return True
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+CACHE_DIR = os.getenv("NSL_KDD_CACHE_DIR", "backend/cache/nsl-kdd")
+
+# Bump whenever preprocess() changes its output, so stale entries are never reused.
+PREPROCESS_VERSION = 2
+
+ARRAY_NAMES = ["X_train", "y_train", "X_test", "y_test"]
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """
+    Content-addressed store for preprocessed NSL-KDD arrays.
+
+    Each entry is a directory named after the hash of the source files, the
+    column layout and PREPROCESS_VERSION. Arrays are plain .npy files so they
+    can be opened with np.load(mmap_mode=...) without parsing anything.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, "sources.json")
+
+    def _source_hash(self, path: str) -> str:
+        # Hashing the raw txt files is the slow part of a warm start, so remember
+        # the digest for an unchanged (size, mtime) pair.
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        index = {}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, "r") as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {}
+
+        entry = index.get(os.path.abspath(path))
+        if entry and entry["stamp"] == stamp:
+            return entry["sha256"]
+
+        digest = file_sha256(path)
+        index[os.path.abspath(path)] = {"stamp": stamp, "sha256": digest}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._write_json(self._index_path, index)
+        return digest
+
+    def key(self, source_paths: List[str], columns: List[str], categorical_cols: List[str]) -> str:
+        payload = {
+            "version": PREPROCESS_VERSION,
+            "columns": list(columns),
+            "categorical": list(categorical_cols),
+            "sources": [self._source_hash(p) for p in source_paths],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.entry_dir(key), "meta.json"))
+
+    def load(self, key: str, mmap_mode: Optional[str] = "c") -> Optional[Dict]:
+        """Returns {"arrays": {...}, "state": {...}, "meta": {...}} or None on a miss."""
+        if not self.exists(key):
+            return None
+        return self.open_entry(self.entry_dir(key), mmap_mode=mmap_mode)
+
+    @staticmethod
+    def open_entry(entry: str, mmap_mode: Optional[str] = "c") -> Optional[Dict]:
+        """Opens an entry directory directly, e.g. one handed over by a parent process."""
+        key = os.path.basename(os.path.normpath(entry))
+        try:
+            arrays = {
+                name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode=mmap_mode)
+                for name in ARRAY_NAMES
+            }
+            with np.load(os.path.join(entry, "state.npz"), allow_pickle=False) as npz:
+                state = {k: npz[k] for k in npz.files}
+            with open(os.path.join(entry, "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[DataCache] Corrupt entry {key}, ignoring: {e}")
+            return None
+        return {"arrays": arrays, "state": state, "meta": meta}
+
+    def reserve(self, key: str) -> str:
+        """Temp directory to build an entry in; publish it with commit()."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return tempfile.mkdtemp(prefix=f".{key}-", dir=self.cache_dir)
+
+    def commit(self, key: str, tmp_dir: str, meta: Dict) -> str:
+        """Finishes a reserved entry and renames it into place atomically."""
+        final_dir = self.entry_dir(key)
+        try:
+            self._write_json(os.path.join(tmp_dir, "meta.json"), dict(meta, key=key, version=PREPROCESS_VERSION))
+            if os.path.exists(final_dir):
+                # Another process won the race; its entry is identical.
+                self.discard(tmp_dir)
+            else:
+                try:
+                    os.replace(tmp_dir, final_dir)
+                except OSError:
+                    # Lost the race between the check and the rename (non-empty target).
+                    if not os.path.isdir(final_dir):
+                        raise
+                    self.discard(tmp_dir)
+        except Exception:
+            self.discard(tmp_dir)
+            raise
+        return final_dir
+
+    @staticmethod
+    def discard(tmp_dir: str):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def store(self, key: str, arrays: Dict[str, np.ndarray], state: Dict[str, np.ndarray], meta: Dict) -> str:
+        """Writes a complete entry from in-memory arrays."""
+        tmp_dir = self.reserve(key)
+        try:
+            for name in ARRAY_NAMES:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+            np.savez(os.path.join(tmp_dir, "state.npz"), **state)
+        except Exception:
+            self.discard(tmp_dir)
+            raise
+        return self.commit(key, tmp_dir, meta)
+
+    @staticmethod
+    def _write_json(path: str, data: Dict):
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
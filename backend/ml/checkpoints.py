@@ -0,0 +1,195 @@
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+CHECKPOINT_ROOT = "backend/checkpoints"
+MANIFEST = "manifest.json"
+
+
+def _atomic_torch_save(obj, path: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_state(path: str, map_location="cpu") -> Dict[str, torch.Tensor]:
+    """
+    state_dict from a checkpoint file: a plain torch.save'd state_dict, or a
+    delta checkpoint ({"kind": "delta", "base": <file>, "delta": ...}) that is
+    resolved against its full base in the same directory.
+    """
+    obj = torch.load(path, map_location=map_location)
+    if isinstance(obj, dict) and obj.get("kind") == "delta":
+        base = torch.load(os.path.join(os.path.dirname(path), obj["base"]), map_location=map_location)
+        return {k: (base[k] + d.to(base[k].dtype)) if base[k].is_floating_point() else d
+                for k, d in obj["delta"].items()}
+    return obj
+
+
+class CheckpointManager:
+    """
+    Per-algorithm checkpoint directory with a manifest.json indexed by round.
+
+    save() snapshots the weights on the caller's thread and hands the write
+    to a single background thread, which writes the file atomically
+    (tmp + fsync + rename), records it in the manifest (also replaced
+    atomically) with its metrics, and applies retention: the last keep_last
+    rounds and the keep_best rounds by best_metric survive, everything else
+    is deleted. With delta=True only every full_every-th checkpoint is a full
+    state_dict; the others store the float16 difference from the latest full
+    one, which is never deleted while a kept delta depends on it.
+
+    latest() is a manifest lookup; its "round" is the global round to resume
+    from. Directories written before the manifest existed are indexed once
+    from their model_round_<n>.pth names.
+
+    A write that fails is logged and recorded under the manifest's "failed"
+    key (never as an entry, so resume ignores it); it does not raise.
+    flush() waits for every pending write and returns the failures recorded
+    since the previous flush.
+    """
+
+    def __init__(self, directory: str, keep_last: int = int(os.getenv("FL_CKPT_KEEP_LAST", "5")),
+                 keep_best: int = int(os.getenv("FL_CKPT_KEEP_BEST", "1")), best_metric: str = "accuracy",
+                 delta: bool = os.getenv("FL_CKPT_DELTA", "0") == "1",
+                 full_every: int = int(os.getenv("FL_CKPT_FULL_EVERY", "10"))):
+        self.directory = directory
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.best_metric = best_metric
+        self.delta = delta
+        self.full_every = max(full_every, 1)
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.manifest = self._load_manifest()
+        # Created on first save(), so read-only users (resume, inference) start no thread.
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self._last: Optional[Future] = None
+        self._base: Optional[Tuple[int, Dict[str, torch.Tensor]]] = None
+        self.failures: List[Tuple[int, str]] = []
+        self._reported = 0
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        manifest = {"entries": {}, "latest": None}
+        for path in glob.glob(os.path.join(self.directory, "model_round_*.pth")):
+            match = re.search(r"model_round_(\d+)\.pth$", path)
+            if match:
+                manifest["entries"][match.group(1)] = {"round": int(match.group(1)), "file": os.path.basename(path),
+                                                       "kind": "full", "metrics": {}}
+        if manifest["entries"]:
+            manifest["latest"] = max(e["round"] for e in manifest["entries"].values())
+        return manifest
+
+    def _write_manifest(self):
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def latest(self) -> Optional[Dict]:
+        latest = self.manifest.get("latest")
+        return self.manifest["entries"].get(str(latest)) if latest is not None else None
+
+    def path(self, entry: Dict) -> str:
+        return os.path.join(self.directory, entry["file"])
+
+    def load(self, entry: Dict, map_location="cpu") -> Dict[str, torch.Tensor]:
+        return load_state(self.path(entry), map_location=map_location)
+
+    def save(self, server_round: int, state_dict: Dict[str, torch.Tensor], metrics: Optional[Dict] = None,
+             model_name: Optional[str] = None) -> Future:
+        snapshot = {k: v.detach().to("cpu", copy=True) for k, v in state_dict.items()}
+        if self.executor is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ckpt-writer")
+        self._last = self.executor.submit(self._write, server_round, snapshot, dict(metrics or {}), model_name)
+        return self._last
+
+    def flush(self) -> List[Tuple[int, str]]:
+        # One writer thread: once the last write has finished, all earlier ones have too.
+        if self._last is not None:
+            self._last.result()
+        failures = self.failures[self._reported:]
+        self._reported = len(self.failures)
+        if failures:
+            print(f"[Checkpoint] {len(failures)} checkpoint write(s) failed in {self.directory}: "
+                  f"rounds {[r for r, _ in failures]}", flush=True)
+        return failures
+
+    def close(self):
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def _write(self, server_round: int, state: Dict[str, torch.Tensor], metrics: Dict, model_name: Optional[str]):
+        try:
+            entry = {"round": server_round, "timestamp": time.time(), "metrics": metrics, "model": model_name}
+            use_delta = self.delta and self._base is not None and server_round % self.full_every != 0
+            if use_delta:
+                base_round, base = self._base
+                entry.update(kind="delta", base=base_round, file=f"model_round_{server_round}.delta.pth")
+                delta = {k: (v - base[k]).half() if v.is_floating_point() else v for k, v in state.items()}
+                base_file = self.manifest["entries"][str(base_round)]["file"]
+                _atomic_torch_save({"kind": "delta", "base": base_file, "delta": delta}, self.path(entry))
+            else:
+                entry.update(kind="full", file=f"model_round_{server_round}.pth")
+                _atomic_torch_save(state, self.path(entry))
+                self._base = (server_round, state)
+
+            self.manifest["entries"][str(server_round)] = entry
+            self.manifest["latest"] = server_round
+            self._apply_retention()
+            self._write_manifest()
+        except Exception as e:
+            print(f"[Checkpoint] Failed to write round {server_round}: {e}", flush=True)
+            self.failures.append((server_round, str(e)))
+            self.manifest["entries"].pop(str(server_round), None)
+            if self.manifest.get("latest") == server_round:
+                self.manifest["latest"] = max((e["round"] for e in self.manifest["entries"].values()), default=None)
+            if self._base is not None and self._base[0] == server_round:
+                # Deltas must not reference a checkpoint the manifest does not list; the next save is full.
+                self._base = None
+            self.manifest.setdefault("failed", {})[str(server_round)] = {"error": str(e), "timestamp": time.time()}
+            try:
+                self._write_manifest()
+            except Exception as manifest_error:
+                print(f"[Checkpoint] Could not record the failure in the manifest: {manifest_error}", flush=True)
+
+    def _apply_retention(self):
+        entries = self.manifest["entries"]
+        rounds = sorted(int(r) for r in entries)
+        keep = set(rounds[-self.keep_last:]) if self.keep_last > 0 else set(rounds)
+        scored = [r for r in rounds if self.best_metric in entries[str(r)].get("metrics", {})]
+        scored.sort(key=lambda r: entries[str(r)]["metrics"][self.best_metric], reverse=True)
+        keep.update(scored[:self.keep_best])
+        keep.add(self.manifest["latest"])
+        if self._base is not None:
+            keep.add(self._base[0])
+        keep.update(entries[str(r)]["base"] for r in list(keep) if entries[str(r)].get("kind") == "delta")
+
+        for r in rounds:
+            if r in keep:
+                continue
+            entry = entries.pop(str(r))
+            try:
+                os.remove(self.path(entry))
+            except FileNotFoundError:
+                pass
+
+    def best(self) -> Optional[Dict]:
+        scored = [e for e in self.manifest["entries"].values() if self.best_metric in e.get("metrics", {})]
+        return max(scored, key=lambda e: e["metrics"][self.best_metric]) if scored else None
+
+    def entries(self) -> List[Dict]:
+        return [self.manifest["entries"][str(r)] for r in sorted(int(r) for r in self.manifest["entries"])]
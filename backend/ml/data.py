@@ -1,13 +1,16 @@
 import pandas as pd
 import numpy as np
 import torch
-from torch.utils.data import DataLoader, TensorDataset
-from sklearn.preprocessing import MinMaxScaler, LabelEncoder
+from torch.utils.data import DataLoader, TensorDataset, Subset
 import torch
 import numpy as np
 import random
 
-from typing import Tuple, List, Dict
+import os
+from typing import Tuple, List, Dict, Iterator, Optional
+
+from backend.ml.cache import DatasetCache
+from backend.ml.pipeline import COLUMNS, CATEGORICAL_COLS, FEATURE_COLS, PreprocessingPipeline
 
 def set_seed(seed: int = 42):
     torch.manual_seed(seed)
@@ -18,72 +21,193 @@ def set_seed(seed: int = 42):
     print(f"[System] Global Seed set to {seed}")
 set_seed(42)
 
-COLUMNS = [
-    "duration", "protocol_type", "service", "flag", "src_bytes", "dst_bytes",
-    "land", "wrong_fragment", "urgent", "hot", "num_failed_logins",
-    "logged_in", "num_compromised", "root_shell", "su_attempted", "num_root",
-    "num_file_creations", "num_shells", "num_access_files", "num_outbound_cmds",
-    "is_host_login", "is_guest_login", "count", "srv_count", "serror_rate",
-    "srv_serror_rate", "rerror_rate", "srv_rerror_rate", "same_srv_rate",
-    "diff_srv_rate", "srv_diff_host_rate", "dst_host_count", "dst_host_srv_count",
-    "dst_host_same_srv_rate", "dst_host_diff_srv_rate", "dst_host_same_src_port_rate",
-    "dst_host_srv_diff_host_rate", "dst_host_serror_rate", "dst_host_srv_serror_rate",
-    "dst_host_rerror_rate", "dst_host_srv_rerror_rate", "class", "difficulty"
-]
-
-CATEGORICAL_COLS = ["protocol_type", "service", "flag"]
+def iter_raw_chunks(path: str, chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+    """
+    Streams raw NSL-KDD records in DataFrame chunks.
+
+    Accepts the txt/csv layout (with the trailing difficulty column) and ARFF
+    files, whose data section has no difficulty column and may quote values.
+    """
+    if path.endswith(".arff"):
+        header_lines = 0
+        with open(path, "r") as f:
+            for line in f:
+                header_lines += 1
+                if line.strip().lower() == "@data":
+                    break
+        return pd.read_csv(path, names=COLUMNS[:-1], skiprows=header_lines, chunksize=chunksize,
+                           quotechar="'", skipinitialspace=True, comment="%")
+    return pd.read_csv(path, names=COLUMNS, chunksize=chunksize)
 
 class NSL_KDD_DataProcessor:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, cache: DatasetCache = None,
+                 train_file: str = "KDDTrain+.txt", test_file: str = "KDDTest+.txt"):
         self.data_path = data_path
-        self.encoders: Dict[str, LabelEncoder] = {}
-        self.scaler = MinMaxScaler()
-        
+        self.train_file = train_file
+        self.test_file = test_file
+        self.pipeline = PreprocessingPipeline()
+        self.cache = cache if cache is not None else DatasetCache()
+
+    def source_path(self, dataset_type: str = "train") -> str:
+        filename = self.train_file if dataset_type == "train" else self.test_file
+        return f"{self.data_path}/{filename}"
+
     def load_raw_data(self, dataset_type: str = "train") -> pd.DataFrame:
         """Loads raw data from txt files."""
-        filename = "KDDTrain+.txt" if dataset_type == "train" else "KDDTest+.txt"
-        path = f"{self.data_path}/{filename}"
+        path = self.source_path(dataset_type)
         
         df = pd.read_csv(path, names=COLUMNS)
         return df
 
-    def preprocess(self, df: pd.DataFrame, fit_scalers: bool = False) -> Tuple[pd.DataFrame, pd.Series]:
+    def preprocess(self, df: pd.DataFrame, fit_scalers: bool = False) -> Tuple[np.ndarray, np.ndarray]:
         """Preprocesses the dataframe: Encoding and Scaling."""
-        
-        if "difficulty" in df.columns:
-            df = df.drop("difficulty", axis=1)
-            
-        X = df.drop("class", axis=1)
-        y = df["class"]
-        
-        y_binary = y.apply(lambda x: 0 if x == "normal" else 1)
-        
-        for col in CATEGORICAL_COLS:
-            if fit_scalers:
-                le = LabelEncoder()
-                X[col] = le.fit_transform(X[col])
-                self.encoders[col] = le
-            else:
-                if col in self.encoders:
-                    le = self.encoders[col]
-                    mapping = dict(zip(le.classes_, range(len(le.classes_))))
-                    X[col] = X[col].map(mapping).fillna(-1) 
-                
-        numerical_cols = [c for c in X.columns if c not in CATEGORICAL_COLS] 
-        
         if fit_scalers:
-            self.scaler.fit(X)
-            
-        X_scaled = pd.DataFrame(self.scaler.transform(X), columns=X.columns)
-        
-        return X_scaled, y_binary
+            self.pipeline = PreprocessingPipeline().fit(df)
+
+        return self.pipeline.transform(df), self.pipeline.transform_labels(df)
+
+    def export_state(self) -> Dict[str, np.ndarray]:
+        """Fitted pipeline state as plain arrays (no pickling)."""
+        return self.pipeline.state_dict()
+
+    def restore_state(self, state: Dict[str, np.ndarray]):
+        self.pipeline = PreprocessingPipeline.from_state(state)
 
-    def get_datasets(self) -> Dict[str, Tuple[torch.Tensor, torch.Tensor]]:
+    def cache_key(self) -> str:
+        sources = [self.source_path("train"), self.source_path("test")]
+        return self.cache.key(sources, COLUMNS, CATEGORICAL_COLS)
+
+    def get_datasets(self, use_cache: bool = True) -> Dict[str, Tuple[torch.Tensor, torch.Tensor]]:
         """
         Returns processed PyTorch tensors for:
         1. Train (KDDTrain+) - To be distributed among clients
         2. Test (KDDTest+) - For server evaluation (and client eval if desired)
+
+        With use_cache, a warm start maps the arrays straight from the
+        on-disk cache instead of re-running the CSV pipeline.
+        """
+        key = self.cache_key() if use_cache else None
+        if key is not None:
+            entry = self.cache.load(key)
+            if entry is not None:
+                self.restore_state(entry["state"])
+                arrays = entry["arrays"]
+                print(f"[DataProcessor] Loaded preprocessed datasets from cache {key}")
+                return {
+                    "train": (torch.from_numpy(arrays["X_train"]), torch.from_numpy(arrays["y_train"])),
+                    "test": (torch.from_numpy(arrays["X_test"]), torch.from_numpy(arrays["y_test"])),
+                }
+
+        datasets = self._build_datasets()
+
+        if key is not None:
+            arrays = {
+                "X_train": datasets["train"][0].numpy(),
+                "y_train": datasets["train"][1].numpy(),
+                "X_test": datasets["test"][0].numpy(),
+                "y_test": datasets["test"][1].numpy(),
+            }
+            try:
+                self.cache.store(key, arrays, self.export_state(), {"columns": COLUMNS})
+                print(f"[DataProcessor] Stored preprocessed datasets in cache {key}")
+            except OSError as e:
+                print(f"[DataProcessor] Could not write dataset cache: {e}")
+
+        return datasets
+
+    def fit_streaming(self, path: str, chunksize: int = 100_000) -> int:
+        """
+        First streaming pass: fits category vocabularies and min/max statistics
+        chunk by chunk, leaving self.pipeline in the same state a
+        preprocess(fit_scalers=True) over the whole file would. Returns the row count.
+        """
+        pipeline = PreprocessingPipeline()
+        for chunk in iter_raw_chunks(path, chunksize):
+            pipeline.partial_fit(chunk)
+        if pipeline.n_samples_seen_ == 0:
+            raise ValueError(f"No records found in {path}")
+        self.pipeline = pipeline.finalize()
+        return pipeline.n_samples_seen_
+
+    def transform_streaming(self, path: str, X_out: np.ndarray, y_out: np.ndarray, chunksize: int = 100_000) -> int:
+        """
+        Second streaming pass: encodes and scales each chunk and writes it as
+        float32 straight into the preallocated X_out/y_out (e.g. np.memmap).
+        Unseen categories become -1, as in preprocess(). Returns rows written.
         """
+        row = 0
+        for chunk in iter_raw_chunks(path, chunksize):
+            n = len(chunk)
+            if row + n > len(X_out):
+                raise ValueError(f"{path} has more rows than the output buffer ({len(X_out)})")
+            self.pipeline.transform(chunk, out=X_out[row:row + n])
+            y_out[row:row + n] = self.pipeline.transform_labels(chunk)
+            row += n
+        return row
+
+    def load_attack_names(self, dataset_type: str = "train", chunksize: int = 100_000) -> np.ndarray:
+        """Raw 'class' column (attack names), read without materializing the features."""
+        path = self.source_path(dataset_type)
+        return np.concatenate([chunk["class"].to_numpy().astype(str) for chunk in iter_raw_chunks(path, chunksize)])
+
+    @staticmethod
+    def count_rows(path: str, chunksize: int = 100_000) -> int:
+        return sum(len(chunk) for chunk in iter_raw_chunks(path, chunksize))
+
+    def stream_to_cache(self, chunksize: int = 100_000) -> str:
+        """
+        Builds the cache entry without ever holding a whole file in memory:
+        output arrays are memory-mapped .npy files inside the entry, so peak
+        memory is bounded by chunksize rather than by the capture size.
+        """
+        key = self.cache_key()
+        if self.cache.exists(key):
+            return self.cache.entry_dir(key)
+
+        tmp_dir = self.cache.reserve(key)
+        try:
+            for dataset_type, suffix in [("train", "train"), ("test", "test")]:
+                path = self.source_path(dataset_type)
+                if dataset_type == "train":
+                    n_rows = self.fit_streaming(path, chunksize)
+                else:
+                    n_rows = self.count_rows(path, chunksize)
+
+                X_out = np.lib.format.open_memmap(os.path.join(tmp_dir, f"X_{suffix}.npy"), mode="w+",
+                                                  dtype=np.float32, shape=(n_rows, len(FEATURE_COLS)))
+                y_out = np.lib.format.open_memmap(os.path.join(tmp_dir, f"y_{suffix}.npy"), mode="w+",
+                                                  dtype=np.int64, shape=(n_rows,))
+                written = self.transform_streaming(path, X_out, y_out, chunksize)
+                X_out.flush()
+                y_out.flush()
+                del X_out, y_out
+                if written != n_rows:
+                    raise ValueError(f"{path} changed while streaming ({written} != {n_rows} rows)")
+                print(f"[DataProcessor] Streamed {n_rows} {dataset_type} rows in chunks of {chunksize}")
+
+            np.savez(os.path.join(tmp_dir, "state.npz"), **self.export_state())
+        except Exception:
+            self.cache.discard(tmp_dir)
+            raise
+        return self.cache.commit(key, tmp_dir, {"columns": COLUMNS, "streamed": True})
+
+    def materialize(self, chunksize: Optional[int] = None) -> str:
+        """
+        Makes sure the preprocessed arrays exist on disk and returns the cache
+        entry directory. Child processes pass it to attach_datasets() and map
+        the same pages instead of re-running the pipeline. With chunksize the
+        entry is built by the bounded-memory streaming path.
+        """
+        key = self.cache_key()
+        if chunksize:
+            return self.stream_to_cache(chunksize)
+        if not self.cache.exists(key):
+            self.get_datasets(use_cache=True)
+        if not self.cache.exists(key):
+            raise RuntimeError(f"Dataset cache entry {key} could not be written to {self.cache.cache_dir}")
+        return self.cache.entry_dir(key)
+
+    def _build_datasets(self) -> Dict[str, Tuple[torch.Tensor, torch.Tensor]]:
         train_raw = self.load_raw_data("train")
         test_raw = self.load_raw_data("test")
         
@@ -92,13 +216,13 @@ class NSL_KDD_DataProcessor:
         X_test, y_test = self.preprocess(test_raw, fit_scalers=False)
         
         train_dataset = (
-            torch.tensor(X_train.values, dtype=torch.float32),
-            torch.tensor(y_train.values, dtype=torch.long)
+            torch.from_numpy(X_train),
+            torch.from_numpy(y_train)
         )
         
         test_dataset = (
-            torch.tensor(X_test.values, dtype=torch.float32),
-            torch.tensor(y_test.values, dtype=torch.long)
+            torch.from_numpy(X_test),
+            torch.from_numpy(y_test)
         )
         
         return {
@@ -106,6 +230,90 @@ class NSL_KDD_DataProcessor:
             "test": test_dataset
         }
 
-def get_dataloader(data: Tuple[torch.Tensor, torch.Tensor], batch_size: int = 32, shuffle: bool = True):
+def load_pipeline(entry_dir: str) -> PreprocessingPipeline:
+    """The fitted pipeline stored alongside a materialized cache entry."""
+    return PreprocessingPipeline.load(os.path.join(entry_dir, "state.npz"))
+
+def attach_datasets(entry_dir: str) -> Dict[str, Tuple[torch.Tensor, torch.Tensor]]:
+    """
+    Zero-copy tensors over a cache entry produced by materialize().
+
+    Arrays are mapped copy-on-write, so every process reading the same entry
+    shares the page cache and slicing a partition out of them allocates nothing.
+    """
+    entry = DatasetCache.open_entry(entry_dir, mmap_mode="c")
+    if entry is None:
+        raise RuntimeError(f"Dataset cache entry {entry_dir} is missing or corrupt")
+    arrays = entry["arrays"]
+    return {
+        "train": (torch.from_numpy(arrays["X_train"]), torch.from_numpy(arrays["y_train"])),
+        "test": (torch.from_numpy(arrays["X_test"]), torch.from_numpy(arrays["y_test"])),
+    }
+
+class TensorBatchIterator:
+    """
+    Minimal replacement for TensorDataset + DataLoader over in-memory tensors.
+
+    One permutation per epoch, then each batch is gathered with a single
+    index_select into preallocated buffers instead of collating sample by
+    sample. Unshuffled iteration over the full tensors yields plain slices.
+    Yielded batches are reused on the next step, so consume (or clone) each
+    batch before advancing.
+    """
+
+    def __init__(self, data: Tuple[torch.Tensor, torch.Tensor], batch_size: int = 32, shuffle: bool = True,
+                 indices=None, drop_last: bool = False):
+        self.X, self.y = data
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.indices = torch.as_tensor(indices, dtype=torch.long) if indices is not None else None
+        self.num_samples = len(self.indices) if self.indices is not None else len(self.X)
+        self._x_buf: Optional[torch.Tensor] = None
+        self._y_buf: Optional[torch.Tensor] = None
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return self.num_samples // self.batch_size
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
+
+    def _buffers(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        if self._x_buf is None or self._x_buf.size(0) != self.batch_size:
+            self._x_buf = torch.empty((self.batch_size,) + tuple(self.X.shape[1:]), dtype=self.X.dtype)
+            self._y_buf = torch.empty((self.batch_size,) + tuple(self.y.shape[1:]), dtype=self.y.dtype)
+        return self._x_buf, self._y_buf
+
+    def __iter__(self) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        n = self.num_samples
+        stop = n - n % self.batch_size if self.drop_last else n
+
+        if not self.shuffle and self.indices is None:
+            for start in range(0, stop, self.batch_size):
+                end = min(start + self.batch_size, n)
+                yield self.X[start:end], self.y[start:end]
+            return
+
+        rows = self.indices
+        if self.shuffle:
+            order = torch.randperm(n)
+            rows = order if rows is None else rows[order]
+
+        x_buf, y_buf = self._buffers()
+        for start in range(0, stop, self.batch_size):
+            idx = rows[start:start + self.batch_size]
+            m = idx.size(0)
+            xb, yb = x_buf[:m], y_buf[:m]
+            torch.index_select(self.X, 0, idx, out=xb)
+            torch.index_select(self.y, 0, idx, out=yb)
+            yield xb, yb
+
+def get_dataloader(data: Tuple[torch.Tensor, torch.Tensor], batch_size: int = 32, shuffle: bool = True, indices=None):
+    """indices restricts the loader to a partition without copying the tensors."""
+    return TensorBatchIterator(data, batch_size=batch_size, shuffle=shuffle, indices=indices)
+
+def get_torch_dataloader(data: Tuple[torch.Tensor, torch.Tensor], batch_size: int = 32, shuffle: bool = True, indices=None):
+    """The TensorDataset + DataLoader path, kept for comparison in benchmarks."""
     dataset = TensorDataset(data[0], data[1])
+    if indices is not None:
+        dataset = Subset(dataset, indices)
     return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle)
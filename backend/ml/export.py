@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from backend.ml.model import IDSModel, load_model, test
+
+EXPORT_ROOT = "backend/exports"
+
+
+def fold_batchnorm(conv: nn.Conv1d, bn: nn.BatchNorm1d) -> nn.Conv1d:
+    """Returns a Conv1d equivalent to bn(conv(x)) with bn in eval mode."""
+    fused = nn.Conv1d(conv.in_channels, conv.out_channels, conv.kernel_size, stride=conv.stride,
+                      padding=conv.padding, dilation=conv.dilation, groups=conv.groups, bias=True)
+    with torch.no_grad():
+        std = torch.sqrt(bn.running_var + bn.eps)
+        gamma = bn.weight if bn.affine else torch.ones_like(std)
+        beta = bn.bias if bn.affine else torch.zeros_like(std)
+        factor = gamma / std
+        fused.weight.copy_(conv.weight * factor.reshape(-1, 1, 1))
+        conv_bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+        fused.bias.copy_((conv_bias - bn.running_mean) * factor + beta)
+    return fused
+
+
+class InferenceIDSModel(nn.Module):
+    """IDSModel with BatchNorm folded into the convolutions and dropout removed."""
+
+    def __init__(self, model: IDSModel):
+        super().__init__()
+        model = model.eval()
+        self.conv1 = fold_batchnorm(model.conv1, model.bn1)
+        self.conv2 = fold_batchnorm(model.conv2, model.bn2)
+        self.fc1 = model.fc1
+        self.fc2 = model.fc2
+
+    def forward(self, x):
+        x = torch.relu(self.conv1(x.unsqueeze(1)))
+        x = torch.relu(self.conv2(x))
+        x = torch.relu(self.fc1(x.flatten(1)))
+        return self.fc2(x)
+
+
+def _select_quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("fbgemm", "x86", "qnnpack"):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    return None
+
+
+def optimize_for_inference(model: nn.Module, quantize: bool = False, input_dim: int = 41) -> torch.jit.ScriptModule:
+    """Folds BN (IDSModel), strips dropout, optionally int8-quantizes the Linear layers, then traces and freezes."""
+    module = InferenceIDSModel(model) if isinstance(model, IDSModel) else model
+    module = module.cpu().eval()
+    if quantize:
+        if _select_quantized_engine() is None:
+            raise RuntimeError("No quantized engine available in this PyTorch build")
+        module = torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+
+    example = torch.zeros(1, input_dim)
+    with torch.no_grad():
+        traced = torch.jit.trace(module, example)
+    return torch.jit.freeze(traced.eval())
+
+
+def measure_latency(model: nn.Module, batch_size: int, input_dim: int = 41, iters: int = 200, warmup: int = 20) -> Dict[str, float]:
+    x = torch.rand(batch_size, input_dim)
+    timings = []
+    with torch.inference_mode():
+        for i in range(warmup + iters):
+            start = time.perf_counter()
+            model(x)
+            if i >= warmup:
+                timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "records_per_sec": float(batch_size / (np.median(timings) / 1000.0)),
+    }
+
+
+def export_checkpoint(checkpoint: str, output_dir: str, test_data=None, quantize: bool = True,
+                      latency_batches=(1, 1024)) -> Dict:
+    """
+    Writes ids_fp32.pt (and ids_int8.pt) TorchScript artifacts plus report.json
+    comparing accuracy and latency against the float eager model.
+    """
+    from backend.ml.data import get_dataloader
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = load_model(checkpoint)
+    model.eval()
+
+    variants = {"float_eager": model}
+    artifacts = {}
+    variants["fp32_folded"] = optimize_for_inference(model, quantize=False)
+    artifacts["fp32_folded"] = os.path.join(output_dir, "ids_fp32.pt")
+    if quantize:
+        try:
+            variants["int8_dynamic"] = optimize_for_inference(model, quantize=True)
+            artifacts["int8_dynamic"] = os.path.join(output_dir, "ids_int8.pt")
+        except Exception as e:
+            print(f"[Export] Skipping int8 quantization: {e}")
+
+    report = {"checkpoint": checkpoint, "model": type(model).__name__, "variants": {}}
+    for name, module in variants.items():
+        entry: Dict = {}
+        if name in artifacts:
+            torch.jit.save(module, artifacts[name])
+            entry["path"] = artifacts[name]
+            entry["size_bytes"] = os.path.getsize(artifacts[name])
+        else:
+            entry["size_bytes"] = sum(t.numel() * t.element_size() for t in model.state_dict().values())
+
+        if test_data is not None:
+            metrics = test(module, get_dataloader(test_data, batch_size=1024, shuffle=False))
+            entry.update({k: metrics[k] for k in ("accuracy", "precision", "recall", "f1")})
+        for batch_size in latency_batches:
+            entry[f"batch_{batch_size}"] = measure_latency(module, batch_size)
+        report["variants"][name] = entry
+
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=4)
+    return report
+
+
+def print_report(report: Dict):
+    print(f"[Export] Report for {report['checkpoint']}")
+    for name, entry in report["variants"].items():
+        acc = f"{entry['accuracy']:.4f}" if "accuracy" in entry else "-"
+        lat = "  ".join(f"bs={k[6:]} p50={v['p50_ms']:.3f}ms {v['records_per_sec']:,.0f} rec/s"
+                        for k, v in entry.items() if k.startswith("batch_"))
+        print(f"  {name:<14} acc={acc}  size={entry['size_bytes'] / 1024:.0f}KiB  {lat}")
+
+
+if __name__ == "__main__":
+    from backend.ml.inference import latest_checkpoint
+
+    parser = argparse.ArgumentParser(description="Export a model checkpoint for CPU inference")
+    parser.add_argument("--algorithm", type=str, default="fedprox")
+    parser.add_argument("--checkpoint", type=str, default=None, help="Defaults to the latest checkpoint of --algorithm")
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--data-path", type=str, default=os.getenv("DATA_PATH", "nsl-kdd"))
+    args = parser.parse_args()
+
+    checkpoint: Optional[str] = args.checkpoint or latest_checkpoint(args.algorithm)
+    if checkpoint is None:
+        raise SystemExit(f"No checkpoint found for {args.algorithm}")
+
+    test_data = None
+    try:
+        from backend.ml.data import NSL_KDD_DataProcessor
+        test_data = NSL_KDD_DataProcessor(args.data_path).get_datasets()["test"]
+    except (OSError, ValueError) as e:
+        print(f"[Export] KDDTest+ unavailable, reporting latency only: {e}")
+
+    output_dir = args.output or os.path.join(EXPORT_ROOT, args.algorithm)
+    print_report(export_checkpoint(checkpoint, output_dir, test_data=test_data, quantize=not args.no_quantize))
@@ -0,0 +1,236 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from backend.ml.checkpoints import CHECKPOINT_ROOT, CheckpointManager
+from backend.ml.model import load_model
+from backend.ml.pipeline import PreprocessingPipeline
+
+def latest_checkpoint(algorithm: str, checkpoint_root: str = CHECKPOINT_ROOT) -> Optional[str]:
+    """Latest checkpoint file of an algorithm according to its manifest, or None."""
+    manager = CheckpointManager(os.path.join(checkpoint_root, algorithm))
+    entry = manager.latest()
+    return manager.path(entry) if entry is not None else None
+
+
+class IDSPredictor:
+    """A persistent model (any registered architecture) in eval mode plus the fitted preprocessing pipeline."""
+
+    def __init__(self, checkpoint_path: str, pipeline: PreprocessingPipeline, device: str = "cpu"):
+        self.checkpoint_path = checkpoint_path
+        self.pipeline = pipeline
+        self.device = device
+        if checkpoint_path.endswith(".pt"):
+            # TorchScript artifact from backend.ml.export (BN folded, optionally int8).
+            self.model = torch.jit.load(checkpoint_path, map_location=device)
+        else:
+            self.model = load_model(checkpoint_path, device=device)
+        self.model.eval()
+
+    @classmethod
+    def from_latest(cls, algorithm: str, pipeline: PreprocessingPipeline, device: str = "cpu") -> "IDSPredictor":
+        checkpoint = latest_checkpoint(algorithm)
+        if checkpoint is None:
+            raise FileNotFoundError(f"No checkpoint found for '{algorithm}' in {CHECKPOINT_ROOT}/{algorithm}")
+        return cls(checkpoint, pipeline, device=device)
+
+    @torch.inference_mode()
+    def predict(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Scaled float32 features -> (predicted labels, attack probabilities)."""
+        x = torch.from_numpy(np.ascontiguousarray(features, dtype=np.float32)).to(self.device)
+        probs = torch.softmax(self.model(x), dim=1)[:, 1]
+        probs = probs.float().cpu().numpy()
+        return (probs >= 0.5).astype(np.int64), probs
+
+    def predict_records(self, records) -> Tuple[np.ndarray, np.ndarray]:
+        return self.predict(self.pipeline.transform(records))
+
+
+class LatencyTracker:
+    """Sliding window of request latencies and a records/sec rate."""
+
+    def __init__(self, window: int = 10_000, rate_window_s: float = 10.0):
+        self.latencies = deque(maxlen=window)
+        self.completions = deque()
+        self.rate_window_s = rate_window_s
+        self.total_requests = 0
+        self.total_records = 0
+        self.total_batches = 0
+        self.batch_sizes = deque(maxlen=1000)
+
+    def record_request(self, latency_s: float, n_records: int):
+        now = time.monotonic()
+        self.latencies.append(latency_s)
+        self.completions.append((now, n_records))
+        self.total_requests += 1
+        self.total_records += n_records
+        while self.completions and now - self.completions[0][0] > self.rate_window_s:
+            self.completions.popleft()
+
+    def record_batch(self, n_records: int):
+        self.total_batches += 1
+        self.batch_sizes.append(n_records)
+
+    def snapshot(self) -> Dict[str, float]:
+        lat = np.fromiter(self.latencies, dtype=np.float64) * 1000.0
+        now = time.monotonic()
+        recent = sum(n for t, n in self.completions if now - t <= self.rate_window_s)
+        return {
+            "requests": self.total_requests,
+            "records": self.total_records,
+            "batches": self.total_batches,
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "p50_ms": float(np.percentile(lat, 50)) if len(lat) else 0.0,
+            "p99_ms": float(np.percentile(lat, 99)) if len(lat) else 0.0,
+            "records_per_sec": recent / self.rate_window_s,
+        }
+
+
+class BatcherClosed(RuntimeError):
+    """The micro-batcher was stopped (reload or shutdown); the request can be retried on a fresh service."""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent prediction requests into micro-batches.
+
+    Requests wait in a bounded queue; a worker drains up to max_batch_size
+    rows or until max_wait_ms has passed since the first one, runs the model
+    once in a dedicated thread (off the event loop) and resolves every
+    request's future with its slice of the result.
+
+    stop() first lets the worker finish everything already queued (new
+    submissions are refused from then on), and fails any future still
+    unresolved afterwards, so no caller is left waiting.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]],
+                 max_batch_size: int = 256, max_wait_ms: float = 2.0, max_queue: int = 10_000):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ids-inference")
+        self.tracker = LatencyTracker()
+        self._worker: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, drain: bool = True):
+        self.closed = True
+        if self._worker is not None:
+            if drain and not self._worker.done():
+                await self.queue.join()
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            self.queue.task_done()
+            if not future.done():
+                future.set_exception(BatcherClosed("Inference service was stopped before this request ran"))
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Raises asyncio.QueueFull when the service is saturated, BatcherClosed once stop() has begun."""
+        if self.closed:
+            raise BatcherClosed("Inference service is closed")
+        future = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        self.queue.put_nowait((features, future))
+        result = await future
+        self.tracker.record_request(time.perf_counter() - start, len(features))
+        return result
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                rows = len(batch[0][0])
+                deadline = loop.time() + self.max_wait_s
+                while rows < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(item)
+                    rows += len(item[0])
+
+                await self._process(loop, batch, rows)
+            finally:
+                # Only left unresolved when stop() cancels the worker mid-batch.
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(BatcherClosed("Inference service was stopped during this request"))
+                    self.queue.task_done()
+
+    async def _process(self, loop, batch, rows: int):
+        features = np.concatenate([f for f, _ in batch]) if len(batch) > 1 else batch[0][0]
+        try:
+            labels, probs = await loop.run_in_executor(self.executor, self.predict_fn, features)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.tracker.record_batch(rows)
+        offset = 0
+        for f, future in batch:
+            n = len(f)
+            if not future.done():
+                future.set_result((labels[offset:offset + n], probs[offset:offset + n]))
+            offset += n
+
+
+class InferenceService:
+    """
+    Predictor + micro-batcher for one algorithm. Must be created inside the
+    event loop; build the predictor beforehand (e.g. in a thread) since
+    loading the checkpoint blocks.
+    """
+
+    def __init__(self, algorithm: str, predictor: IDSPredictor,
+                 max_batch_size: int = int(os.getenv("PREDICT_MAX_BATCH", "256")),
+                 max_wait_ms: float = float(os.getenv("PREDICT_MAX_WAIT_MS", "2")),
+                 max_queue: int = int(os.getenv("PREDICT_MAX_QUEUE", "10000"))):
+        self.algorithm = algorithm
+        self.predictor = predictor
+        self.batcher = MicroBatcher(self.predictor.predict, max_batch_size=max_batch_size,
+                                    max_wait_ms=max_wait_ms, max_queue=max_queue)
+        self.batcher.start()
+
+    async def predict(self, records) -> List[Dict]:
+        if self.batcher.closed:
+            raise BatcherClosed("Inference service is closed")
+        # Building and encoding the DataFrame is CPU work; keep it off the event loop.
+        features = await asyncio.to_thread(self.predictor.pipeline.transform, records)
+        labels, probs = await self.batcher.submit(features)
+        return [
+            {"label": "attack" if label else "normal", "attack_probability": float(p)}
+            for label, p in zip(labels, probs)
+        ]
+
+    def stats(self) -> Dict:
+        return dict(self.batcher.tracker.snapshot(), algorithm=self.algorithm,
+                    checkpoint=self.predictor.checkpoint_path)
+
+    async def close(self):
+        await self.batcher.stop()
@@ -0,0 +1,35 @@
+from typing import Dict
+
+import numpy as np
+
+
+def metrics_from_confusion(cm) -> Dict[str, object]:
+    """
+    Accuracy and macro precision/recall/F1 from a confusion matrix
+    (rows = true label, columns = predicted label).
+
+    Matches sklearn's average='macro', zero_division=0: classes that appear
+    neither in the targets nor in the predictions are left out of the average.
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    tp = np.diag(cm)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    present = (support + predicted) > 0
+    total = cm.sum()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(support + predicted > 0, 2 * tp / (support + predicted), 0.0)
+
+    def macro(values):
+        return float(values[present].mean()) if present.any() else 0.0
+
+    return {
+        "accuracy": float(tp.sum() / total) if total > 0 else 0.0,
+        "precision": macro(precision),
+        "recall": macro(recall),
+        "f1": macro(f1),
+        "confusion_matrix": cm.astype(np.int64).tolist(),
+    }
@@ -2,8 +2,13 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
-from typing import Tuple, Dict
+import contextlib
+import os
+import time
+from typing import Any, Callable, Tuple, Dict, Iterable, Optional
+
+from backend.ml.metrics import metrics_from_confusion
+from backend.ml.checkpoints import load_state
 
 class IDSModel(nn.Module):
     def __init__(self, input_dim: int = 41, output_dim: int = 2):
@@ -43,93 +48,287 @@ class IDSModel(nn.Module):
         
         return x
 
-def train(model: nn.Module, train_loader: DataLoader, epochs: int = 1, lr: float = 0.001, device: str = "cpu", global_model: nn.Module = None, mu: float = 0.0) -> Dict[str, float]:
-    """Train the model for a number of epochs."""
+class IDSGlobalPoolModel(nn.Module):
+    """
+    Same two-conv front end as IDSModel (narrower), but the feature axis is
+    reduced with global average + max pooling instead of being flattened into
+    fc1, which removes the 128 * input_dim * 256 weight matrix that dominates
+    IDSModel's size.
+    """
+
+    def __init__(self, input_dim: int = 41, output_dim: int = 2, channels: int = 64):
+        super(IDSGlobalPoolModel, self).__init__()
+        self.conv1 = nn.Conv1d(in_channels=1, out_channels=channels // 2, kernel_size=3, padding=1)
+        self.bn1 = nn.BatchNorm1d(channels // 2)
+        self.conv2 = nn.Conv1d(in_channels=channels // 2, out_channels=channels, kernel_size=3, padding=1)
+        self.bn2 = nn.BatchNorm1d(channels)
+        self.relu = nn.ReLU()
+        self.dropout = nn.Dropout(0.3)
+        self.fc1 = nn.Linear(2 * channels, 64)
+        self.fc2 = nn.Linear(64, output_dim)
+
+    def forward(self, x):
+        x = x.unsqueeze(1)
+        x = self.relu(self.bn1(self.conv1(x)))
+        x = self.relu(self.bn2(self.conv2(x)))
+        x = torch.cat([x.mean(dim=2), x.amax(dim=2)], dim=1)
+        x = self.dropout(self.relu(self.fc1(x)))
+        return self.fc2(x)
+
+class IDSMLPModel(nn.Module):
+    """Compact fully-connected baseline on the 41 scaled features."""
+
+    def __init__(self, input_dim: int = 41, output_dim: int = 2, hidden: int = 128):
+        super(IDSMLPModel, self).__init__()
+        self.fc1 = nn.Linear(input_dim, hidden)
+        self.bn1 = nn.BatchNorm1d(hidden)
+        self.fc2 = nn.Linear(hidden, hidden // 2)
+        self.fc3 = nn.Linear(hidden // 2, output_dim)
+        self.relu = nn.ReLU()
+        self.dropout = nn.Dropout(0.2)
+
+    def forward(self, x):
+        x = self.dropout(self.relu(self.bn1(self.fc1(x))))
+        x = self.relu(self.fc2(x))
+        return self.fc3(x)
+
+# Architectures selectable by name (fit config key "model", env IDS_MODEL).
+MODEL_REGISTRY: Dict[str, Callable[..., nn.Module]] = {
+    "cnn": IDSModel,
+    "cnn_gap": IDSGlobalPoolModel,
+    "mlp": IDSMLPModel,
+}
+DEFAULT_MODEL = os.getenv("IDS_MODEL", "cnn")
+
+def build_model(name: Optional[str] = None, input_dim: int = 41, output_dim: int = 2) -> nn.Module:
+    name = name or DEFAULT_MODEL
+    if name not in MODEL_REGISTRY:
+        raise ValueError(f"Unknown model '{name}', expected one of {sorted(MODEL_REGISTRY)}")
+    return MODEL_REGISTRY[name](input_dim=input_dim, output_dim=output_dim)
+
+def infer_model_name(state_dict: Dict[str, torch.Tensor]) -> str:
+    """Registry name whose state_dict keys and shapes match a checkpoint."""
+    shapes = {k: tuple(v.shape) for k, v in state_dict.items()}
+    for name in MODEL_REGISTRY:
+        candidate = {k: tuple(v.shape) for k, v in build_model(name).state_dict().items()}
+        if candidate == shapes:
+            return name
+    raise ValueError("Checkpoint does not match any registered model architecture")
+
+def load_model(checkpoint_path: str, device: str = "cpu") -> nn.Module:
+    """Builds the matching registered architecture and loads a (full or delta) checkpoint."""
+    state = load_state(checkpoint_path, map_location=device)
+    model = build_model(infer_model_name(state)).to(device)
+    model.load_state_dict(state)
+    return model
+
+def model_summary(model: nn.Module) -> Dict[str, int]:
+    """Trainable parameters and the bytes one client ships per round (every state_dict array)."""
+    return {
+        "params": sum(p.numel() for p in model.parameters() if p.requires_grad),
+        "bytes_per_round": sum(t.numel() * t.element_size() for t in model.state_dict().values()),
+    }
+
+class ProximalTerm:
+    """
+    FedProx regularizer (mu / 2) * ||w - w_global||^2 against a frozen snapshot.
+
+    The global weights are copied once into a single flat detached buffer with
+    per-parameter views, so no model deep copy is needed. Instead of adding
+    the penalty to the loss and differentiating it, apply_() adds its gradient
+    mu * (w - w_global) straight to .grad with multi-tensor foreach ops after
+    backward(), which costs a few fused kernels per step regardless of depth.
+    """
+
+    def __init__(self, model: nn.Module, mu: float, reference: Optional[nn.Module] = None):
+        self.mu = mu
+        self.params = [p for p in model.parameters() if p.requires_grad]
+        source = self.params if reference is None else [p for p in reference.parameters() if p.requires_grad]
+        if len(source) != len(self.params):
+            raise ValueError("Reference model does not match the trained model's parameters")
+        with torch.no_grad():
+            self.flat = torch.cat([p.detach().reshape(-1) for p in source])
+        self.views = self._make_views()
+
+    def _make_views(self):
+        chunks = torch.split(self.flat, [p.numel() for p in self.params])
+        return [chunk.view_as(p) for chunk, p in zip(chunks, self.params)]
+
+    def to(self, device) -> "ProximalTerm":
+        if self.flat.device != torch.device(device):
+            self.flat = self.flat.to(device)
+            self.views = self._make_views()
+        return self
+
+    @torch.no_grad()
+    def apply_(self) -> torch.Tensor:
+        """Adds the proximal gradient to every .grad; returns the penalty (detached)."""
+        for p in self.params:
+            if p.grad is None:
+                p.grad = torch.zeros_like(p)
+        diffs = torch._foreach_sub(self.params, self.views)
+        torch._foreach_add_([p.grad for p in self.params], diffs, alpha=self.mu)
+        return 0.5 * self.mu * torch.stack(torch._foreach_norm(diffs)).square().sum()
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+def format_progress(info: Dict[str, Any]) -> str:
+    if info["event"] == "batch":
+        return f"Batch {info['batch']}/{info['num_batches']} Loss: {info['loss'].item():.4f}"
+    return (f"Epoch {info['epoch'] + 1} Loss: {info['loss']:.4f} Accuracy: {info['accuracy']:.4f} "
+            f"({info['epoch_time']:.2f}s)")
+
+def _accumulator_dtype(device) -> torch.dtype:
+    """float64 for on-device loss sums, except on MPS which has no float64."""
+    return torch.float32 if str(device).startswith("mps") else torch.float64
+
+def train(model: nn.Module, train_loader: Iterable, epochs: int = 1, lr: float = 0.001, device: str = "cpu",
+          global_model: nn.Module = None, mu: float = 0.0,
+          progress_callback: Optional[ProgressCallback] = None, log_interval: int = 0,
+          proximal: Optional[ProximalTerm] = None, accelerator=None) -> Dict[str, float]:
+    """
+    Train the model for a number of epochs.
+
+    Loss and accuracy are accumulated in device tensors and read back once
+    per epoch, so the loop never blocks on a host sync. progress_callback gets
+    a dict per epoch ("event": "epoch") and, every log_interval batches, one
+    with the batch loss still on device ("event": "batch"); reading it is the
+    callback's choice.
+
+    FedProx: pass proximal (preferred), or global_model and mu > 0 to have
+    one built from the global model's parameters. accelerator (see
+    backend.ml.acceleration) runs forward/backward through a compiled model
+    and/or bfloat16 autocast.
+    """
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=lr)
     model.train()
     model.to(device)
     
-    if global_model:
-        global_model.to(device)
-        global_model.eval()
+    if proximal is None and global_model is not None and mu > 0.0:
+        proximal = ProximalTerm(model, mu, reference=global_model)
+    if proximal is not None:
+        proximal.to(device)
+
+    forward = accelerator if accelerator is not None else model
+    autocast = accelerator.autocast if accelerator is not None else contextlib.nullcontext
 
-    total_loss = 0.0
-    correct = 0
+    def step(data, target):
+        optimizer.zero_grad(set_to_none=True)
+        with autocast():
+            output = forward(data)
+            loss = criterion(output, target)
+        loss.backward()
+        return output, loss
+
+    # BatchNorm cannot normalize a single row in training mode; a partition whose size is
+    # 1 mod batch_size ends each epoch with one, so only models with BatchNorm skip it.
+    skip_single_rows = model.training and any(isinstance(m, nn.modules.batchnorm._BatchNorm) for m in model.modules())
+    num_batches = len(train_loader)
+    acc_dtype = _accumulator_dtype(device)
+    total_loss = torch.zeros((), dtype=acc_dtype, device=device)
+    correct = torch.zeros((), dtype=torch.long, device=device)
     total = 0
+    epoch_times = []
 
     for epoch in range(epochs):
+        epoch_start = time.perf_counter()
+        epoch_loss = torch.zeros((), dtype=acc_dtype, device=device)
+        epoch_correct = torch.zeros((), dtype=torch.long, device=device)
+        epoch_total = 0
+
         for batch_idx, (data, target) in enumerate(train_loader):
-            data, target = data.to(device), target.to(device)
-            
-            optimizer.zero_grad()
-            output = model(data)
-            loss = criterion(output, target)
-            
-            if mu > 0.0 and global_model is not None:
-                proximal_term = 0.0
-                for w, w_t in zip(model.parameters(), global_model.parameters()):
-                    proximal_term += (w - w_t).norm(2) ** 2
-                loss += (mu / 2) * proximal_term
+            if skip_single_rows and target.size(0) < 2:
+                print(f"[Train] Epoch {epoch}: skipping a single-row batch ({batch_idx + 1}/{num_batches}), "
+                      f"BatchNorm needs at least 2 rows", flush=True)
+                continue
+            data, target = data.to(device, non_blocking=True), target.to(device, non_blocking=True)
             
-            loss.backward()
+            if accelerator is not None:
+                output, loss = accelerator.guarded(lambda: step(data, target), "train")
+            else:
+                output, loss = step(data, target)
+
+            batch_loss = loss.detach()
+            if proximal is not None:
+                batch_loss = batch_loss + proximal.apply_()
+
             optimizer.step()
             
-            total_loss += loss.item() * data.size(0)
-            _, predicted = torch.max(output.data, 1)
-            total += target.size(0)
-            correct += (predicted == target).sum().item()
+            batch_size = target.size(0)
+            epoch_loss += batch_loss * batch_size
+            epoch_correct += (output.detach().argmax(dim=1) == target).sum()
+            epoch_total += batch_size
             
-            if batch_idx % 50 == 0:
-                print(f"Batch {batch_idx}/{len(train_loader)} Loss: {loss.item():.4f}", flush=True)
+            if progress_callback is not None and log_interval > 0 and batch_idx % log_interval == 0:
+                progress_callback({"event": "batch", "epoch": epoch, "batch": batch_idx,
+                                   "num_batches": num_batches, "loss": batch_loss})
 
-    avg_loss = total_loss / total
-    accuracy = correct / total
-    return {"loss": avg_loss, "accuracy": accuracy}
+        total_loss += epoch_loss
+        correct += epoch_correct
+        total += epoch_total
+        # The one host sync of the epoch.
+        epoch_loss_value = epoch_loss.item() / max(epoch_total, 1)
+        epoch_accuracy = epoch_correct.item() / max(epoch_total, 1)
+        epoch_times.append(time.perf_counter() - epoch_start)
 
-def test(model: nn.Module, test_loader: DataLoader, device: str = "cpu") -> Dict[str, float]:
-    """Evaluate the model."""
-    criterion = nn.CrossEntropyLoss()
+        if progress_callback is not None:
+            progress_callback({"event": "epoch", "epoch": epoch, "num_batches": num_batches,
+                               "loss": epoch_loss_value, "accuracy": epoch_accuracy,
+                               "epoch_time": epoch_times[-1], "samples": epoch_total})
+
+    avg_loss = total_loss.item() / max(total, 1)
+    accuracy = correct.item() / max(total, 1)
+    train_time = sum(epoch_times)
+    return {
+        "loss": avg_loss,
+        "accuracy": accuracy,
+        "epoch_time": train_time / max(epochs, 1),
+        "samples_per_sec": total / train_time if train_time > 0 else 0.0,
+    }
+
+def test(model: nn.Module, test_loader: Iterable, device: str = "cpu", accelerator=None) -> Dict[str, float]:
+    """
+    Evaluate the model.
+
+    Predictions are folded into an on-device confusion matrix with one
+    bincount per batch, so memory stays O(classes^2) and every metric is
+    derived from it at the end with a single host transfer.
+    """
+    criterion = nn.CrossEntropyLoss(reduction="sum")
     model.eval()
     model.to(device)
-    
-    print(f"DEBUG_MODEL: Starting evaluation on device {device}")
-    total_loss = 0.0
-    correct = 0
-    total = 0
-    
-    all_preds = []
-    all_targets = []
+
+    acc_dtype = _accumulator_dtype(device)
+    total_loss = torch.zeros((), dtype=acc_dtype, device=device)
+    confusion = None
+    num_classes = 0
+    forward = accelerator if accelerator is not None else model
+    autocast = accelerator.autocast if accelerator is not None else contextlib.nullcontext
+
+    def step(data):
+        with autocast():
+            return forward(data)
     
     with torch.no_grad():
         for data, target in test_loader:
-            data, target = data.to(device), target.to(device)
-            output = model(data)
-            loss = criterion(output, target)
-            
-            total_loss += loss.item() * data.size(0)
-            _, predicted = torch.max(output.data, 1)
-            total += target.size(0)
-            correct += (predicted == target).sum().item()
-            
-            all_preds.extend(predicted.cpu().numpy())
-            all_targets.extend(target.cpu().numpy())
-            
-    avg_loss = total_loss / total
-    accuracy = correct / total
-    
-    from sklearn.metrics import precision_score, recall_score, f1_score, confusion_matrix
+            data, target = data.to(device, non_blocking=True), target.to(device, non_blocking=True)
+            if accelerator is not None:
+                output = accelerator.guarded(lambda: step(data), "eval")
+            else:
+                output = step(data)
+            total_loss += criterion(output.float(), target)
 
-    precision = precision_score(all_targets, all_preds, average='macro', zero_division=0)
-    recall = recall_score(all_targets, all_preds, average='macro', zero_division=0)
-    f1 = f1_score(all_targets, all_preds, average='macro', zero_division=0)
-    conf_matrix = confusion_matrix(all_targets, all_preds).tolist() 
-    
-    return {
-        "loss": avg_loss, 
-        "accuracy": accuracy,
-        "precision": precision,
-        "recall": recall,
-        "f1": f1,
-        "confusion_matrix": conf_matrix
-    }
+            if confusion is None:
+                num_classes = output.size(1)
+                confusion = torch.zeros(num_classes * num_classes, dtype=torch.long, device=device)
+            predicted = output.argmax(dim=1)
+            confusion += torch.bincount(target * num_classes + predicted, minlength=num_classes * num_classes)
+
+    if confusion is None:
+        raise ValueError("test() got an empty loader")
+
+    conf_matrix = confusion.view(num_classes, num_classes).cpu().numpy()
+    metrics = metrics_from_confusion(conf_matrix)
+    metrics["loss"] = total_loss.item() / conf_matrix.sum()
+    return metrics
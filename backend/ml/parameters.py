@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class FlatParameters:
+    """
+    Moves every parameter and buffer of a model into one contiguous flat
+    buffer per dtype (float32 weights and running stats; int64 for
+    num_batches_tracked) and rebinds the model's tensors as named views of
+    it, in state_dict order.
+
+    Exchanging weights with Flower then needs no per-tensor allocation:
+    to_ndarrays() returns numpy views of the buffer (on CPU) and
+    from_ndarrays() copies each incoming array straight into its view. On
+    an accelerator, a CPU staging copy of the flat buffer is kept and moved
+    with one copy per dtype.
+
+    Create it after the model has been moved to its device; model.to() would
+    reallocate the tensors and break the aliasing. The arrays returned by
+    to_ndarrays() on CPU alias the live weights: serialize or copy them
+    before training again.
+    """
+
+    def __init__(self, model: nn.Module):
+        self.model = model
+        state = model.state_dict(keep_vars=True)
+        self.names: List[str] = list(state)
+        self.shapes = [tuple(t.shape) for t in state.values()]
+        self.device = next(iter(state.values())).device if state else torch.device("cpu")
+
+        sizes: Dict[torch.dtype, int] = OrderedDict()
+        for t in state.values():
+            sizes[t.dtype] = sizes.get(t.dtype, 0) + t.numel()
+        self.buffers = {dtype: torch.empty(n, dtype=dtype, device=self.device) for dtype, n in sizes.items()}
+
+        self.views: List[torch.Tensor] = []
+        offsets = dict.fromkeys(sizes, 0)
+        with torch.no_grad():
+            for name, t in state.items():
+                start = offsets[t.dtype]
+                view = self.buffers[t.dtype][start:start + t.numel()].view(t.shape)
+                view.copy_(t)
+                offsets[t.dtype] = start + t.numel()
+                self.views.append(view)
+                self._rebind(name, view)
+
+        if self.device.type == "cpu":
+            self.staging = self.buffers
+        else:
+            pin = self.device.type == "cuda"
+            self.staging = {dtype: torch.empty(buf.numel(), dtype=dtype, pin_memory=pin) for dtype, buf in self.buffers.items()}
+        self._np_views = self._staging_views()
+
+    def _rebind(self, name: str, view: torch.Tensor):
+        module_name, _, attr = name.rpartition(".")
+        module = self.model.get_submodule(module_name) if module_name else self.model
+        if attr in module._parameters:
+            module._parameters[attr].data = view
+        else:
+            module._buffers[attr] = view
+
+    def _staging_views(self) -> List[np.ndarray]:
+        flat_np = {dtype: buf.numpy() for dtype, buf in self.staging.items()}
+        offsets = dict.fromkeys(self.staging, 0)
+        views = []
+        for view in self.views:
+            start = offsets[view.dtype]
+            views.append(flat_np[view.dtype][start:start + view.numel()].reshape(view.shape))
+            offsets[view.dtype] = start + view.numel()
+        return views
+
+    @property
+    def num_bytes(self) -> int:
+        return sum(buf.numel() * buf.element_size() for buf in self.buffers.values())
+
+    def to_ndarrays(self) -> List[np.ndarray]:
+        if self.staging is not self.buffers:
+            for dtype, buf in self.buffers.items():
+                self.staging[dtype].copy_(buf)
+        return list(self._np_views)
+
+    def from_ndarrays(self, arrays: List[np.ndarray]):
+        if len(arrays) != len(self._np_views):
+            raise ValueError(f"Expected {len(self._np_views)} arrays, got {len(arrays)}")
+        for name, dst, src in zip(self.names, self._np_views, arrays):
+            if dst.shape != src.shape:
+                raise ValueError(f"Shape mismatch for {name}: expected {dst.shape}, got {src.shape}")
+            np.copyto(dst, src, casting="same_kind")
+        if self.staging is not self.buffers:
+            for dtype, buf in self.buffers.items():
+                buf.copy_(self.staging[dtype], non_blocking=True)
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        return OrderedDict(zip(self.names, self.views))
+
+    @torch.no_grad()
+    def load_state_dict(self, state: Dict[str, torch.Tensor]):
+        missing = set(self.names) - set(state)
+        if missing:
+            raise KeyError(f"Missing keys in state_dict: {sorted(missing)}")
+        for name, view in zip(self.names, self.views):
+            view.copy_(state[name])
@@ -0,0 +1,167 @@
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Standard NSL-KDD attack taxonomy; anything unknown is treated as its own family.
+ATTACK_FAMILIES = {
+    "normal": "normal",
+    "back": "DoS", "land": "DoS", "neptune": "DoS", "pod": "DoS", "smurf": "DoS",
+    "teardrop": "DoS", "apache2": "DoS", "udpstorm": "DoS", "processtable": "DoS",
+    "worm": "DoS", "mailbomb": "DoS",
+    "satan": "Probe", "ipsweep": "Probe", "nmap": "Probe", "portsweep": "Probe",
+    "mscan": "Probe", "saint": "Probe",
+    "guess_passwd": "R2L", "ftp_write": "R2L", "imap": "R2L", "phf": "R2L",
+    "multihop": "R2L", "warezmaster": "R2L", "warezclient": "R2L", "spy": "R2L",
+    "xlock": "R2L", "xsnoop": "R2L", "snmpguess": "R2L", "snmpgetattack": "R2L",
+    "httptunnel": "R2L", "sendmail": "R2L", "named": "R2L",
+    "buffer_overflow": "U2R", "loadmodule": "U2R", "rootkit": "U2R", "perl": "U2R",
+    "sqlattack": "U2R", "xterm": "U2R", "ps": "U2R",
+}
+
+SCHEMES = ["contiguous", "iid", "dirichlet", "attack_family", "size_skewed"]
+
+
+def contiguous_partition(num_samples: int, num_clients: int) -> List[np.ndarray]:
+    """Equal consecutive slices, the last client takes the remainder."""
+    part_size = num_samples // num_clients
+    bounds = [i * part_size for i in range(num_clients)] + [num_samples]
+    return [np.arange(bounds[i], bounds[i + 1], dtype=np.int64) for i in range(num_clients)]
+
+
+def iid_partition(num_samples: int, num_clients: int, rng: np.random.Generator) -> List[np.ndarray]:
+    perm = rng.permutation(num_samples)
+    return [np.sort(part) for part in np.array_split(perm, num_clients)]
+
+
+def dirichlet_partition(labels: np.ndarray, num_clients: int, alpha: float,
+                        rng: np.random.Generator, min_size: int = 10) -> List[np.ndarray]:
+    """
+    Label-skewed split: for every class, client shares are drawn from
+    Dir(alpha). Small alpha gives highly non-IID clients. Redraws until every
+    client holds at least min_size samples; raises ValueError if 100 draws
+    all fail.
+    """
+    labels = np.asarray(labels)
+    classes = np.unique(labels)
+    required = min(min_size, len(labels) // num_clients)
+    for _ in range(100):
+        parts: List[List[np.ndarray]] = [[] for _ in range(num_clients)]
+        for c in classes:
+            idx = rng.permutation(np.flatnonzero(labels == c))
+            shares = rng.dirichlet(np.full(num_clients, alpha))
+            cuts = (np.cumsum(shares)[:-1] * len(idx)).astype(np.int64)
+            for client, chunk in enumerate(np.split(idx, cuts)):
+                parts[client].append(chunk)
+        result = [np.sort(np.concatenate(p)).astype(np.int64) for p in parts]
+        if min(len(p) for p in result) >= required:
+            return result
+    raise ValueError(f"Dirichlet split with alpha={alpha} left a client below min_size={required} "
+                     f"samples after 100 draws (num_clients={num_clients}); raise alpha, lower min_size "
+                     f"or lower num_clients")
+
+
+def attack_family_partition(attack_names: np.ndarray, num_clients: int,
+                            rng: np.random.Generator) -> List[np.ndarray]:
+    """
+    Each client sees a subset of attack families (DoS, Probe, R2L, U2R),
+    assigned round-robin, plus an IID share of normal traffic so every client
+    still has both classes.
+    """
+    names, inverse = np.unique(np.asarray(attack_names).astype(str), return_inverse=True)
+    families = np.array([ATTACK_FAMILIES.get(n, n) for n in names])[inverse]
+    attack_families = sorted(f for f in np.unique(families) if f != "normal")
+
+    parts: List[List[np.ndarray]] = [[] for _ in range(num_clients)]
+    normal_idx = rng.permutation(np.flatnonzero(families == "normal"))
+    for client, chunk in enumerate(np.array_split(normal_idx, num_clients)):
+        parts[client].append(chunk)
+
+    for f_i, family in enumerate(attack_families):
+        owners = [c for c in range(num_clients) if c % len(attack_families) == f_i] or [f_i % num_clients]
+        idx = rng.permutation(np.flatnonzero(families == family))
+        for owner, chunk in zip(owners, np.array_split(idx, len(owners))):
+            parts[owner].append(chunk)
+
+    return [np.sort(np.concatenate(p)).astype(np.int64) for p in parts]
+
+
+def size_skewed_partition(num_samples: int, num_clients: int, sigma: float,
+                          rng: np.random.Generator, min_size: int = 10) -> List[np.ndarray]:
+    """IID content but log-normally distributed client sizes."""
+    weights = rng.lognormal(mean=0.0, sigma=sigma, size=num_clients)
+    sizes = np.maximum((weights / weights.sum() * num_samples).astype(np.int64), min(min_size, num_samples // num_clients))
+    sizes[np.argmax(sizes)] -= sizes.sum() - num_samples
+    perm = rng.permutation(num_samples)
+    return [np.sort(part) for part in np.split(perm, np.cumsum(sizes)[:-1])]
+
+
+def build_partitions(scheme: str, num_clients: int, labels: np.ndarray,
+                     attack_names: Optional[np.ndarray] = None, seed: int = 42,
+                     alpha: float = 0.5, sigma: float = 1.0) -> List[np.ndarray]:
+    """Per-client row index arrays into the training tensors."""
+    rng = np.random.default_rng(seed)
+    num_samples = len(labels)
+    if scheme == "contiguous":
+        return contiguous_partition(num_samples, num_clients)
+    if scheme == "iid":
+        return iid_partition(num_samples, num_clients, rng)
+    if scheme == "dirichlet":
+        return dirichlet_partition(labels, num_clients, alpha, rng)
+    if scheme == "attack_family":
+        if attack_names is None:
+            raise ValueError("attack_family partitioning needs the raw 'class' column")
+        return attack_family_partition(attack_names, num_clients, rng)
+    if scheme == "size_skewed":
+        return size_skewed_partition(num_samples, num_clients, sigma, rng)
+    raise ValueError(f"Unknown partition scheme '{scheme}', expected one of {SCHEMES}")
+
+
+def partition_path(entry_dir: str, scheme: str, num_clients: int, seed: int,
+                   alpha: float = 0.5, sigma: float = 1.0) -> str:
+    suffix = {"dirichlet": f"-a{alpha}", "size_skewed": f"-s{sigma}"}.get(scheme, "")
+    return os.path.join(entry_dir, "partitions", f"{scheme}-{num_clients}-{seed}{suffix}.npz")
+
+
+def save_partitions(path: str, parts: List[np.ndarray]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}.npz"
+    np.savez(tmp_path, **{f"client_{i + 1}": p for i, p in enumerate(parts)})
+    os.replace(tmp_path, path)
+
+
+def ensure_partitions(entry_dir: str, scheme: str, num_clients: int, seed: int = 42, alpha: float = 0.5,
+                      sigma: float = 1.0, attack_names_fn: Optional[Callable[[], np.ndarray]] = None) -> str:
+    """
+    Builds (once) and persists the partitions for a dataset cache entry;
+    returns the .npz path. attack_names_fn is only called for attack_family.
+    """
+    path = partition_path(entry_dir, scheme, num_clients, seed, alpha=alpha, sigma=sigma)
+    if not os.path.exists(path):
+        labels = np.load(os.path.join(entry_dir, "y_train.npy"), mmap_mode="r")
+        attack_names = attack_names_fn() if scheme == "attack_family" and attack_names_fn is not None else None
+        parts = build_partitions(scheme, num_clients, labels, attack_names=attack_names,
+                                 seed=seed, alpha=alpha, sigma=sigma)
+        save_partitions(path, parts)
+        print(f"[Partition] Built {scheme} partitions for {num_clients} clients: {[len(p) for p in parts][:20]}")
+    return path
+
+
+def load_all_partitions(path: str) -> Dict[str, np.ndarray]:
+    """Every client's index array, keyed by cid."""
+    with np.load(path, allow_pickle=False) as npz:
+        return {k[len("client_"):]: npz[k] for k in npz.files}
+
+
+def load_partition(path: str, cid: str) -> np.ndarray:
+    """Index array for one client (cids are 1-based, as assigned by the API)."""
+    with np.load(path, allow_pickle=False) as npz:
+        key = f"client_{int(cid)}"
+        if key not in npz.files:
+            raise ValueError(f"Client {cid} has no partition in {path} ({len(npz.files)} clients)")
+        return npz[key]
+
+
+def partition_sizes(path: str) -> Dict[str, int]:
+    with np.load(path, allow_pickle=False) as npz:
+        return {k: len(npz[k]) for k in npz.files}
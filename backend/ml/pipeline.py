@@ -0,0 +1,191 @@
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "duration", "protocol_type", "service", "flag", "src_bytes", "dst_bytes",
+    "land", "wrong_fragment", "urgent", "hot", "num_failed_logins",
+    "logged_in", "num_compromised", "root_shell", "su_attempted", "num_root",
+    "num_file_creations", "num_shells", "num_access_files", "num_outbound_cmds",
+    "is_host_login", "is_guest_login", "count", "srv_count", "serror_rate",
+    "srv_serror_rate", "rerror_rate", "srv_rerror_rate", "same_srv_rate",
+    "diff_srv_rate", "srv_diff_host_rate", "dst_host_count", "dst_host_srv_count",
+    "dst_host_same_srv_rate", "dst_host_diff_srv_rate", "dst_host_same_src_port_rate",
+    "dst_host_srv_diff_host_rate", "dst_host_serror_rate", "dst_host_srv_serror_rate",
+    "dst_host_rerror_rate", "dst_host_srv_rerror_rate", "class", "difficulty"
+]
+
+CATEGORICAL_COLS = ["protocol_type", "service", "flag"]
+
+FEATURE_COLS = [c for c in COLUMNS if c not in ("class", "difficulty")]
+
+Records = Union[pd.DataFrame, np.ndarray, Dict, List]
+
+
+class PreprocessingPipeline:
+    """
+    Fitted NSL-KDD preprocessing: label-encodes the categorical columns and
+    min/max scales every feature to float32.
+
+    Fitting can be done in one go (fit) or over chunks (partial_fit + finalize).
+    The fitted state is a handful of NumPy arrays, saved as a pickle-free .npz,
+    so training, server evaluation and online scoring all load the same artifact
+    instead of re-fitting. transform() is vectorized and takes one record or a
+    million: a DataFrame, a dict or list of dicts keyed by column name, or raw
+    rows ordered as COLUMNS.
+    """
+
+    def __init__(self):
+        self.vocabularies: Dict[str, np.ndarray] = {}
+        self.scale_: Optional[np.ndarray] = None
+        self.min_: Optional[np.ndarray] = None
+        self.data_min_: Optional[np.ndarray] = None
+        self.data_max_: Optional[np.ndarray] = None
+        self.n_samples_seen_ = 0
+
+        self._cat_positions = [FEATURE_COLS.index(c) for c in CATEGORICAL_COLS]
+        self._numeric_positions = [i for i, c in enumerate(FEATURE_COLS) if c not in CATEGORICAL_COLS]
+        self._numeric_cols = [FEATURE_COLS[i] for i in self._numeric_positions]
+        self._partial_vocab: Dict[str, set] = {}
+        self._partial_min: Optional[np.ndarray] = None
+        self._partial_max: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scale_ is not None
+
+    @property
+    def n_features(self) -> int:
+        return len(FEATURE_COLS)
+
+    def partial_fit(self, df: pd.DataFrame) -> "PreprocessingPipeline":
+        """Accumulates vocabularies and numeric min/max from one chunk of raw records."""
+        if not self._partial_vocab:
+            self._partial_vocab = {col: set() for col in CATEGORICAL_COLS}
+            self._partial_min = np.full(len(self._numeric_cols), np.inf)
+            self._partial_max = np.full(len(self._numeric_cols), -np.inf)
+
+        for col in CATEGORICAL_COLS:
+            self._partial_vocab[col].update(df[col].astype(str).unique())
+        values = df[self._numeric_cols].to_numpy(dtype=np.float64)
+        if len(values):
+            np.minimum(self._partial_min, values.min(axis=0), out=self._partial_min)
+            np.maximum(self._partial_max, values.max(axis=0), out=self._partial_max)
+        self.n_samples_seen_ += len(df)
+        return self
+
+    def finalize(self) -> "PreprocessingPipeline":
+        """Turns the accumulated statistics into MinMaxScaler-equivalent scale/offset."""
+        if self.n_samples_seen_ == 0:
+            raise ValueError("PreprocessingPipeline.finalize() called before any data was seen")
+
+        self.vocabularies = {col: np.array(sorted(self._partial_vocab[col]), dtype=str) for col in CATEGORICAL_COLS}
+
+        # Encoded categorical columns span [0, n_categories - 1] on the fitting data.
+        data_min = np.empty(self.n_features)
+        data_max = np.empty(self.n_features)
+        data_min[self._numeric_positions] = self._partial_min
+        data_max[self._numeric_positions] = self._partial_max
+        for col, pos in zip(CATEGORICAL_COLS, self._cat_positions):
+            data_min[pos] = 0.0
+            data_max[pos] = len(self.vocabularies[col]) - 1
+        self._set_scaling(data_min, data_max)
+
+        self._partial_vocab = {}
+        self._partial_min = self._partial_max = None
+        return self
+
+    def fit(self, df: pd.DataFrame) -> "PreprocessingPipeline":
+        self.n_samples_seen_ = 0
+        self._partial_vocab = {}
+        return self.partial_fit(df).finalize()
+
+    def _set_scaling(self, data_min: np.ndarray, data_max: np.ndarray):
+        data_range = data_max - data_min
+        self.data_min_ = data_min
+        self.data_max_ = data_max
+        # Same zero-range handling as sklearn's MinMaxScaler.
+        self.scale_ = 1.0 / np.where(data_range == 0.0, 1.0, data_range)
+        self.min_ = -data_min * self.scale_
+
+    def encode_categorical(self, col: str, values: Iterable) -> np.ndarray:
+        """Vectorized vocabulary lookup; unseen categories map to -1."""
+        vocab = self.vocabularies[col]
+        values = np.asarray(values).astype(str)
+        idx = np.searchsorted(vocab, values)
+        found = vocab[np.minimum(idx, len(vocab) - 1)] == values
+        return np.where(found, idx, -1)
+
+    @staticmethod
+    def encode_labels(labels: Iterable) -> np.ndarray:
+        return (np.asarray(labels).astype(str) != "normal").astype(np.int64)
+
+    def _as_columns(self, records: Records):
+        """Returns a column getter over the supported record layouts."""
+        if isinstance(records, dict):
+            records = [records]
+        if isinstance(records, list) and records and isinstance(records[0], dict):
+            records = pd.DataFrame.from_records(records)
+        if isinstance(records, pd.DataFrame):
+            return len(records), lambda col: records[col].to_numpy()
+
+        rows = np.asarray(records, dtype=object)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if rows.shape[1] < self.n_features:
+            raise ValueError(f"Expected at least {self.n_features} fields per record, got {rows.shape[1]}")
+        return len(rows), lambda col: rows[:, COLUMNS.index(col)]
+
+    def transform(self, records: Records, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Raw records -> scaled float32 matrix of shape (n, 41)."""
+        if not self.is_fitted:
+            raise RuntimeError("PreprocessingPipeline is not fitted")
+
+        n, column = self._as_columns(records)
+        block = np.empty((n, self.n_features), dtype=np.float64)
+        for pos, col in zip(self._numeric_positions, self._numeric_cols):
+            block[:, pos] = column(col).astype(np.float64)
+        for pos, col in zip(self._cat_positions, CATEGORICAL_COLS):
+            block[:, pos] = self.encode_categorical(col, column(col))
+        block *= self.scale_
+        block += self.min_
+
+        if out is None:
+            return block.astype(np.float32)
+        out[:n] = block
+        return out[:n]
+
+    def transform_labels(self, records: Records) -> np.ndarray:
+        n, column = self._as_columns(records)
+        return self.encode_labels(column("class"))
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        if not self.is_fitted:
+            raise RuntimeError("PreprocessingPipeline is not fitted")
+        state = {f"vocab_{col}": self.vocabularies[col] for col in CATEGORICAL_COLS}
+        state.update({
+            "feature_names": np.array(FEATURE_COLS, dtype=str),
+            "data_min": self.data_min_,
+            "data_max": self.data_max_,
+            "n_samples_seen": np.array(self.n_samples_seen_, dtype=np.int64),
+        })
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]) -> "PreprocessingPipeline":
+        if list(state["feature_names"]) != FEATURE_COLS:
+            raise ValueError("Pipeline state was fitted on a different column layout")
+        pipeline = cls()
+        pipeline.vocabularies = {col: state[f"vocab_{col}"].astype(str) for col in CATEGORICAL_COLS}
+        pipeline._set_scaling(state["data_min"].astype(np.float64), state["data_max"].astype(np.float64))
+        pipeline.n_samples_seen_ = int(state["n_samples_seen"])
+        return pipeline
+
+    def save(self, path: str):
+        np.savez(path, **self.state_dict())
+
+    @classmethod
+    def load(cls, path: str) -> "PreprocessingPipeline":
+        with np.load(path, allow_pickle=False) as npz:
+            return cls.from_state({k: npz[k] for k in npz.files})
@@ -0,0 +1,166 @@
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.func import functional_call, vmap
+
+from backend.ml.model import build_model
+
+
+class VectorizedTrainer:
+    """
+    Local training of K clients at once on one host.
+
+    The K copies of the model are stacked along a leading client dimension
+    (weights, BatchNorm running stats and Adam moments alike) and one
+    forward/backward runs them all: torch.func.vmap over functional_call for
+    the forward, a single autograd pass over the summed per-client losses for
+    the backward (clients are independent, so each slice of the stacked
+    gradient is that client's own gradient). Dropout draws different masks
+    per client.
+
+    Each client keeps its own data: every epoch it shuffles its partition and
+    the step count is that of the largest client. A client's last partial
+    batch is padded by wrapping around its own shuffled rows and the padded
+    rows are masked out of the loss; once a client has run out of batches
+    its weights, running stats and Adam state are frozen for the remaining
+    steps of the epoch. Adam (torch.optim.Adam defaults) and the FedProx
+    gradient mu * (w - w_global) are applied per client, so the result
+    matches K separate train() calls up to batch composition and RNG.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, device: str = "cpu"):
+        self.device = torch.device(device)
+        self.base = build_model(model_name).to(self.device)
+        self.names = list(self.base.state_dict())
+        self.param_names = [name for name, _ in self.base.named_parameters()]
+        self.buffer_names = [name for name, _ in self.base.named_buffers()]
+        self._forward = vmap(self._forward_one, in_dims=(0, 0, 0), randomness="different")
+
+    def _forward_one(self, params, buffers, x):
+        return functional_call(self.base, (params, buffers), (x,))
+
+    def _stack(self, weights: Sequence[List[np.ndarray]]) -> Dict[str, torch.Tensor]:
+        return {name: torch.stack([torch.as_tensor(w[i]) for w in weights]).to(self.device)
+                for i, name in enumerate(self.names)}
+
+    @staticmethod
+    def _per_client(values: torch.Tensor, like: torch.Tensor) -> torch.Tensor:
+        """Reshapes a (K,) vector to broadcast against a stacked (K, ...) tensor."""
+        return values.view((-1,) + (1,) * (like.dim() - 1)).to(like.dtype)
+
+    def _epoch_indices(self, client_indices: List[torch.Tensor], batch_size: int) -> Tuple[torch.Tensor, torch.Tensor, int]:
+        """Shuffled, wrap-padded (K, steps * batch_size) row indices and the matching validity mask."""
+        steps = max((len(idx) + batch_size - 1) // batch_size for idx in client_indices)
+        positions = torch.arange(steps * batch_size)
+        rows, valid = [], []
+        for idx in client_indices:
+            perm = idx[torch.randperm(len(idx))]
+            rows.append(perm[positions % len(idx)])
+            valid.append(positions < len(idx))
+        return torch.stack(rows), torch.stack(valid), steps
+
+    def train(self, initial: Sequence[List[np.ndarray]], data: Tuple[torch.Tensor, torch.Tensor],
+              client_indices: Sequence, epochs: int = 1, lr: float = 0.001,
+              mu: Union[float, Sequence[float]] = 0.0, batch_size: int = 32,
+              betas: Tuple[float, float] = (0.9, 0.999), eps: float = 1e-8) -> List[Tuple[List[np.ndarray], int, Dict]]:
+        """
+        Trains one client per entry of initial (its starting weights, in
+        state_dict order, e.g. the global model it was sent) on the rows
+        client_indices[k] of data. mu is the FedProx coefficient, one for all
+        or one per client, against that client's initial weights.
+
+        Returns (weights, num_examples, metrics) per client, in input order,
+        in the same form as IDSFlowerClient.fit.
+        """
+        num_clients = len(initial)
+        if num_clients != len(client_indices):
+            raise ValueError(f"Got {num_clients} initial weight lists for {len(client_indices)} clients")
+        X, y = data
+        indices = [torch.as_tensor(np.asarray(idx), dtype=torch.long) for idx in client_indices]
+        sizes = torch.tensor([len(idx) for idx in indices], dtype=torch.long)
+        if (sizes == 0).any():
+            raise ValueError("Every client needs at least one training row")
+
+        state = self._stack(initial)
+        params = {name: state[name].requires_grad_() for name in self.param_names}
+        buffers = {name: state[name] for name in self.buffer_names}
+        mus = torch.as_tensor(mu, dtype=torch.float32).expand(num_clients).to(self.device)
+        use_prox = bool((mus > 0).any())
+        reference = {name: p.detach().clone() for name, p in params.items()} if use_prox else None
+        exp_avg = {name: torch.zeros_like(p) for name, p in params.items()}
+        exp_avg_sq = {name: torch.zeros_like(p) for name, p in params.items()}
+        step_count = torch.zeros(num_clients, device=self.device)
+        beta1, beta2 = betas
+
+        loss_sum = torch.zeros(num_clients, dtype=torch.float64, device=self.device)
+        correct = torch.zeros(num_clients, dtype=torch.long, device=self.device)
+        self.base.train()
+        start = time.perf_counter()
+
+        for _ in range(epochs):
+            rows, valid, steps = self._epoch_indices(indices, batch_size)
+            for s in range(steps):
+                window = slice(s * batch_size, (s + 1) * batch_size)
+                batch_rows = rows[:, window].reshape(-1)
+                mask = valid[:, window].to(self.device)
+                active = mask.any(dim=1)
+                x = X[batch_rows].to(self.device, non_blocking=True).view(num_clients, batch_size, -1)
+                target = y[batch_rows].to(self.device, non_blocking=True).view(num_clients, batch_size)
+
+                saved = {name: b.clone() for name, b in buffers.items()} if not active.all() else None
+                for p in params.values():
+                    p.grad = None
+                output = self._forward(params, buffers, x)
+                weights = mask.to(output.dtype)
+                counts = weights.sum(dim=1).clamp(min=1)
+                per_sample = F.cross_entropy(output.reshape(-1, output.size(-1)), target.reshape(-1),
+                                             reduction="none").view(num_clients, batch_size)
+                client_loss = (per_sample * weights).sum(dim=1) / counts
+                client_loss.sum().backward()
+
+                with torch.no_grad():
+                    batch_loss = client_loss.detach()
+                    step_count += active.to(step_count.dtype)
+                    t = step_count.clamp(min=1)
+                    sq = torch.zeros(num_clients, device=self.device)
+                    for name, p in params.items():
+                        grad = p.grad
+                        if use_prox:
+                            diff = p - reference[name]
+                            grad = grad + self._per_client(mus, p) * diff
+                            sq += diff.pow(2).flatten(1).sum(dim=1)
+                        a = self._per_client(active, p)
+                        exp_avg[name].add_(a * (1 - beta1) * (grad - exp_avg[name]))
+                        exp_avg_sq[name].add_(a * (1 - beta2) * (grad * grad - exp_avg_sq[name]))
+                        bias1 = self._per_client(1 - beta1 ** t, p)
+                        bias2 = self._per_client(1 - beta2 ** t, p)
+                        update = lr * (exp_avg[name] / bias1) / ((exp_avg_sq[name] / bias2).sqrt() + eps)
+                        p.sub_(a * update)
+                    if use_prox:
+                        batch_loss = batch_loss + 0.5 * mus * sq
+                    if saved is not None:
+                        for name, b in buffers.items():
+                            b.copy_(torch.where(self._per_client(active, b).bool(), b, saved[name]))
+
+                    loss_sum += (batch_loss * counts * active).to(loss_sum.dtype)
+                    correct += ((output.argmax(dim=-1) == target) & mask).sum(dim=1)
+
+        elapsed = time.perf_counter() - start
+        totals = sizes * epochs
+        # The one host sync of the call.
+        loss_values = (loss_sum.cpu() / totals).tolist()
+        accuracy_values = (correct.cpu().double() / totals).tolist()
+        samples_per_sec = int(totals.sum()) / elapsed if elapsed > 0 else 0.0
+
+        stacked = {name: tensor.detach().cpu() for name, tensor in state.items()}
+        results = []
+        for k in range(num_clients):
+            weights = [stacked[name][k].numpy() for name in self.names]
+            results.append((weights, int(sizes[k]), {"loss": loss_values[k], "accuracy": accuracy_values[k],
+                                                     "samples_per_sec": samples_per_sec / num_clients}))
+        print(f"[Vectorized] {num_clients} clients x {epochs} epoch(s): {int(totals.sum())} samples in "
+              f"{elapsed:.2f}s ({samples_per_sec:.0f} samples/s)", flush=True)
+        return results
@@ -9,7 +9,7 @@ const PLOTS_URL = "http://localhost:8000/plots";
 
 export default function AnalyticsPanel() {
     const navigate = useNavigate();
-    const [status, setStatus] = useState({ fedavg: false, fedprox: false, comparison: false });
+    const [status, setStatus] = useState({ fedavg: false, fedprox: false, fedbuff: false, comparison: false });
     const [loading, setLoading] = useState(false);
     const [generating, setGenerating] = useState(false);
     const [refreshKey, setRefreshKey] = useState(Date.now()); // Force image reload
@@ -60,9 +60,10 @@ export default function AnalyticsPanel() {
 
             <AppShell.Main>
                 <Container size="xl">
-                    <SimpleGrid cols={3} mb="xl">
+                    <SimpleGrid cols={4} mb="xl">
                         <StatusCard title="FedAvg (Baseline)" ready={status.fedavg} />
                         <StatusCard title="FedProx (Adaptation)" ready={status.fedprox} />
+                        <StatusCard title="FedBuff (Async)" ready={status.fedbuff} />
                         <StatusCard title="Comparison" ready={status.comparison} />
                     </SimpleGrid>
 
@@ -74,6 +75,9 @@ export default function AnalyticsPanel() {
                             <Tabs.Tab value="fedprox" disabled={!status.fedprox} leftSection={<IconChartBar size={16} />}>
                                 FedProx Results
                             </Tabs.Tab>
+                            <Tabs.Tab value="fedbuff" disabled={!status.fedbuff} leftSection={<IconChartBar size={16} />}>
+                                FedBuff Results
+                            </Tabs.Tab>
                             <Tabs.Tab value="comparison" disabled={!status.comparison} color="purple" leftSection={<IconChartBar size={16} />}>
                                 Comparative Analysis
                             </Tabs.Tab>
@@ -87,6 +91,10 @@ export default function AnalyticsPanel() {
                             <PlotGallery algo="fedprox" refreshKey={refreshKey} />
                         </Tabs.Panel>
 
+                        <Tabs.Panel value="fedbuff">
+                            <PlotGallery algo="fedbuff" refreshKey={refreshKey} />
+                        </Tabs.Panel>
+
                         <Tabs.Panel value="comparison">
                             <ComparisonGallery refreshKey={refreshKey} />
                         </Tabs.Panel>
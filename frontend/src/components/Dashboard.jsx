@@ -57,6 +57,15 @@ export default function Dashboard() {
                         const last = data[data.length - 1];
                         setRound(last.round);
                     }
+                } else if (message.type === "metrics_append") {
+                    const entries = message.data;
+                    // A re-evaluated round replaces it and everything after it.
+                    setMetrics(prev => entries.reduce(
+                        (acc, entry) => [...acc.filter(m => m.round < entry.round), entry], prev));
+
+                    if (entries.length > 0) {
+                        setRound(entries[entries.length - 1].round);
+                    }
                 } else if (message.type === "log") {
                     setLogs(prev => [...prev.slice(-30), message.data]);
                 }
@@ -191,7 +200,8 @@ export default function Dashboard() {
                                 label="Learning Algorithm"
                                 data={[
                                     { value: 'fedavg', label: 'FedAvg (Baseline)' },
-                                    { value: 'fedprox', label: 'FedProx (Domain Adaptation)' }
+                                    { value: 'fedprox', label: 'FedProx (Domain Adaptation)' },
+                                    { value: 'fedbuff', label: 'FedBuff (Async Buffered)' }
                                 ]}
                                 value={algo}
                                 onChange={handleAlgoChange}